@@ -0,0 +1,144 @@
+"""
+Benchmark complessivo del carving: velocità, memoria e accuratezza.
+
+Genera un'immagine sintetica riproducibile (vedi synthetic.py) con file di
+ogni tipo a offset casuali o allineati, rumore, zone di zeri e file
+frammentati, la scansiona con il motore e riporta MB/s, picco di memoria
+(RSS) e precisione/richiamo rispetto ai file piantati, in totale e per tipo.
+
+L'immagine è un file sparso: con --size 100G occupa sul disco solo i file
+piantati e il rumore intorno. Con --keep l'immagine e la sua verità di
+riferimento (IMMAGINE.json) restano su disco e con --image vengono
+riutilizzate senza rigenerarle. La scansione gira in un processo separato,
+così il picco di memoria misurato è solo quello del motore. Con --mode mmap
+comprende anche le pagine dell'immagine lette attraverso le mappature: fino
+a due finestre di readers.DEFAULT_MAP_WINDOW (128 MB), non l'intera immagine.
+
+Uso: python benchmarks/bench_carving.py [--size 1G] [--files N] [--align BYTES] [--fragmented FRAZIONE]
+                                        [--zero-runs FRAZIONE] [--noise KB] [--types jpg,png,...]
+                                        [--workers N] [--mode auto|stream|mmap] [--scan-align BYTES]
+                                        [--seed N] [--keep IMMAGINE | --image IMMAGINE]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import GENERATORS, build_image, load_manifest, save_manifest, score
+
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text):
+    """'512M', '100G', '4096' -> byte."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def peak_rss():
+    """Picco di memoria in byte di questo processo e dei suoi figli, oppure None (es. su Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux: KB, macOS: byte
+
+
+def carve_in_child(image, output_dir, options):
+    """Eseguita nel processo separato: restituisce i file recuperati, il tempo, il picco di memoria e i byte saltati."""
+    from recoverflow import Carver
+
+    carver = Carver(image, output_dir, journal=False, **options)
+    start = time.perf_counter()
+    records = carver.carve()
+    elapsed = time.perf_counter() - start
+    return [(r.offset, r.size, r.file_type) for r in records], elapsed, peak_rss(), carver.stats.skipped
+
+
+def run_scan(image, output_dir, options):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(carve_in_child, image, output_dir, options).result()
+
+
+def report(size, planted, records, elapsed, rss, skipped):
+    result = score(planted, records)
+    print(f"Scansione: {size / 1e6 / elapsed:.1f} MB/s, {elapsed:.2f} s, "
+          f"picco di memoria {'n/d' if rss is None else f'{rss / 1e6:.0f} MB'}, "
+          f"saltati {skipped / 1e6:.0f} MB")
+    print(f"{'tipo':<6} {'piantati':>9} {'esatti':>7} {'richiamo':>9}")
+    for file_type, (expected, hit) in result["per_type"].items():
+        if expected:
+            print(f"{file_type:<6} {expected:>9} {hit:>7} {hit / expected:>9.1%}")
+    print(f"Totale: {len(records)} file recuperati, {result['exact']} esatti, "
+          f"{result['false_positives']} falsi positivi")
+    print(f"Precisione {result['precision']:.1%}, richiamo {result['recall']:.1%}; "
+          f"file frammentati: {result['fragmented']}, di cui {result['fragmented_started']} "
+          f"trovati e {result['fragmented_exact']} ricomposti esatti")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="1G",
+                        help="dimensione dell'immagine, es. 512M o 100G (default 1G)")
+    parser.add_argument("--files", type=int, default=200, help="file piantati (default 200)")
+    parser.add_argument("--align", type=int, default=0,
+                        help="allineamento dei file piantati in byte, 0 per offset casuali (default 0)")
+    parser.add_argument("--fragmented", type=float, default=0.1,
+                        help="frazione dei file divisi in due frammenti (default 0.1)")
+    parser.add_argument("--zero-runs", type=float, default=0.2,
+                        help="frazione dei file preceduti da una zona di zeri (default 0.2)")
+    parser.add_argument("--noise", type=int, default=256, help="KB di rumore prima di ogni file (default 256)")
+    parser.add_argument("--types", default=",".join(GENERATORS),
+                        help=f"tipi di file da piantare (default {','.join(GENERATORS)})")
+    parser.add_argument("--workers", type=int, default=1, help="processi della scansione (default 1)")
+    parser.add_argument("--mode", default="auto", help="modalità di lettura (default auto)")
+    parser.add_argument("--scan-align", type=int, default=0,
+                        help="cerca gli header solo a multipli di questo valore (default 0)")
+    parser.add_argument("--seed", type=int, default=1)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--keep", metavar="IMMAGINE", help="salva qui l'immagine generata e la sua verità")
+    group.add_argument("--image", metavar="IMMAGINE", help="usa un'immagine già generata con --keep")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        if args.image:
+            image = args.image
+            planted = load_manifest(image + ".json")
+        else:
+            image = args.keep or os.path.join(tmp, "disk.img")
+            options = {"size": args.size, "count": args.files, "alignment": args.align,
+                       "types": args.types.split(","), "noise": args.noise * 1024,
+                       "zero_runs": args.zero_runs, "fragmented": args.fragmented}
+            start = time.perf_counter()
+            planted = build_image(image, seed=args.seed, **options)
+            save_manifest(image + ".json", planted, args.seed, **options)
+            print(f"Immagine generata in {time.perf_counter() - start:.1f} s")
+        size = os.path.getsize(image)
+        st = os.stat(image)
+        allocated = st.st_blocks * 512 if hasattr(st, "st_blocks") else size
+        print(f"Immagine: {size / 1e9:.2f} GB, di cui {allocated / 1e9:.2f} GB allocati, {len(planted)} file")
+
+        output_dir = os.path.join(tmp, "recuperati")
+        os.mkdir(output_dir)
+        options = {"workers": args.workers, "scan_mode": args.mode, "alignment": args.scan_align}
+        records, elapsed, rss, skipped = run_scan(image, output_dir, options)
+        report(size, planted, records, elapsed, rss, skipped)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
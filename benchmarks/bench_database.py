@@ -0,0 +1,95 @@
+"""
+Benchmark del database delle firme.
+
+Genera database JSON con un numero crescente di firme (header casuali di
+4-16 byte, una parte con byte qualsiasi e una parte con un offset, come
+'ftyp' negli MP4) e per ognuno misura il caricamento senza indice in cache
+(convalida e compilazione), il caricamento con l'indice già in cache e la
+velocità della ricerca degli header su un buffer casuale. Ogni caricamento
+gira in un interprete nuovo, come all'avvio del programma. Misura lo stesso
+per il database fornito con il programma (signatures/extra_formats.json).
+
+Uso: python benchmarks/bench_database.py [--size MB] [--seed N]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from recoverflow import SIGNATURE_MATCHER, load_signatures
+
+CATALOG_SIZES = (8, 50, 200, 500, 1000)
+
+
+def build_database(path, size, rng):
+    """Database con 'size' firme sintetiche: un quarto con byte qualsiasi, un ottavo con un offset."""
+    signatures = {}
+    for i in range(size):
+        header = [f"{rng.randrange(1, 256):02X}" for _ in range(rng.randrange(4, 17))]
+        if i % 4 == 0:
+            header[rng.randrange(2, len(header) - 1)] = "??"
+        entry = {"header": " ".join(header), "max_size": "1M"}
+        if i % 8 == 0:
+            entry["header_offset"] = rng.choice((4, 8, 257, 512))
+        signatures[f"sig{i}"] = entry
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"format": "recoverflow-signatures", "version": 1, "signatures": signatures}, f)
+
+
+def load_time(path, cache_dir):
+    """Secondi spesi da load_signatures() in un interprete appena avviato."""
+    code = ("import sys, time; sys.path.insert(0, sys.argv[1]); from recoverflow import load_signatures; "
+            "start = time.perf_counter(); load_signatures(sys.argv[2], cache_dir=sys.argv[3]); "
+            "print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, "-c", code, ROOT, path, cache_dir],
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout)
+
+
+def scan_speed(matcher, data):
+    start = time.perf_counter()
+    hits = sum(1 for _ in matcher.scan(data))
+    return len(data) / (time.perf_counter() - start) / 1e6, hits
+
+
+def report(label, path, data, tmp):
+    cache_dir = os.path.join(tmp, "cache-" + label)
+    cold = load_time(path, cache_dir)
+    warm = load_time(path, cache_dir)
+    matcher = load_signatures(path, cache_dir=cache_dir)
+    speed, hits = scan_speed(matcher, data)
+    print(f"{label:<10} {len(matcher.signatures):>6} {cold * 1000:>10.1f} {warm * 1000:>10.1f} {speed:>8.1f} {hits:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=64, help="dimensione del buffer in MB (default 64)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = rng.randbytes(args.size * 1024 * 1024)
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        print(f"{'database':<10} {'firme':>6} {'freddo ms':>10} {'cache ms':>10} {'MB/s':>8} {'hit':>6}")
+        speed, hits = scan_speed(SIGNATURE_MATCHER, data)
+        print(f"{'predefin.':<10} {len(SIGNATURE_MATCHER.signatures):>6} {'-':>10} {'-':>10} {speed:>8.1f} {hits:>6}")
+        report("fornito", os.path.join(ROOT, "signatures", "extra_formats.json"), data, tmp)
+        for size in CATALOG_SIZES:
+            path = os.path.join(tmp, f"db{size}.json")
+            build_database(path, size, rng)
+            report("casuale", path, data, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark della deduplicazione dei file recuperati.
+
+1. Indice: tempo di claim() per un contenuto nuovo e per una copia con
+   10 mila, 100 mila e 1 milione di file nell'indice (SQLite su disco).
+2. Scansione: un'immagine sintetica (vedi synthetic.py) in cui una parte
+   dei file sono copie di file precedenti, scansionata senza deduplicazione,
+   con le copie saltate e con le copie collegate; per ognuna tempo, file,
+   byte occupati nella cartella di output e se tutti i contenuti piantati
+   sono stati recuperati. Infine una seconda scansione della stessa immagine
+   nella stessa cartella, dove ogni file è già presente.
+
+Uso: python benchmarks/bench_dedup.py [--size 512M] [--files N] [--duplicates FRAZIONE]
+                                      [--index-sizes 10000,100000,1000000] [--seed N]
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recoverflow import Carver, DedupIndex
+from synthetic import build_image
+
+from bench_carving import parse_size
+
+# Copie cercate nell'indice per misurare il tempo di una ricerca riuscita
+LOOKUPS = 1000
+
+
+def bench_index(tmp, sizes, rng):
+    print(f"{'file indice':>12} {'nuovo µs':>9} {'copia µs':>9} {'MB su disco':>12}")
+    output_dir = os.path.join(tmp, "indice")
+    os.mkdir(output_dir)
+    # File veri per le ricerche riuscite: una copia conta solo se il suo file esiste
+    present = []
+    for i in range(LOOKUPS):
+        path = os.path.join(output_dir, f"presente_{i}")
+        with open(path, "wb") as f:
+            f.write(b"x")
+        present.append((hashlib.sha256(str(i).encode()).digest(), path))
+    with DedupIndex(output_dir) as index:
+        for digest, path in present:
+            index.claim(digest, 1, path)
+        count = 0
+        for size in sizes:
+            start = time.perf_counter()
+            for i in range(count, size):
+                index.claim(rng.randbytes(32), rng.randrange(1, 1 << 30), os.path.join(output_dir, f"f{i}"))
+            insert = (time.perf_counter() - start) / max(size - count, 1)
+            count = size
+            start = time.perf_counter()
+            for digest, path in present:
+                assert index.claim(digest, 1, path + ".copia") == path
+            lookup = (time.perf_counter() - start) / LOOKUPS
+            on_disk = sum(os.path.getsize(index.path + suffix) for suffix in ("", "-wal")
+                          if os.path.exists(index.path + suffix))
+            print(f"{size:>12} {insert * 1e6:>9.1f} {lookup * 1e6:>9.1f} {on_disk / 1e6:>12.1f}")
+
+
+def used_bytes(output_dir):
+    """Byte occupati dai file recuperati: un file collegato più volte conta una volta sola."""
+    inodes = {}
+    for entry in os.scandir(output_dir):
+        if not entry.name.startswith("."):
+            st = entry.stat()
+            inodes[(st.st_dev, st.st_ino)] = st.st_size
+    return sum(inodes.values())
+
+
+def scan(image, output_dir, planted_digests, **options):
+    os.makedirs(output_dir, exist_ok=True)
+    # Con il registro le scansioni successive nella stessa cartella non riusano i nomi dei file
+    carver = Carver(image, output_dir, resume=False, **options)
+    start = time.perf_counter()
+    records = carver.carve()
+    elapsed = time.perf_counter() - start
+    found = set()
+    for entry in os.scandir(output_dir):
+        if not entry.name.startswith("."):
+            with open(entry.path, "rb") as f:
+                found.add(hashlib.sha256(f.read()).digest())
+    return records, carver.stats, elapsed, used_bytes(output_dir), planted_digests <= found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="512M",
+                        help="dimensione dell'immagine, es. 512M o 4G (default 512M)")
+    parser.add_argument("--files", type=int, default=300, help="file piantati (default 300)")
+    parser.add_argument("--duplicates", type=float, default=0.5,
+                        help="frazione dei file che sono copie di file precedenti (default 0.5)")
+    parser.add_argument("--index-sizes", default="10000,100000,1000000",
+                        help="file nell'indice a cui misurare claim() (default 10000,100000,1000000)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        bench_index(tmp, [int(n) for n in args.index_sizes.split(",")], random.Random(args.seed))
+
+        image = os.path.join(tmp, "disk.img")
+        planted = build_image(image, args.size, args.files, args.seed, fragmented=0.0,
+                              duplicates=args.duplicates)
+        digests = set()
+        with open(image, "rb") as f:
+            for p in planted:
+                f.seek(p.offset)
+                digests.add(hashlib.sha256(f.read(p.size)).digest())
+        print(f"\nImmagine: {args.size / 1e6:.0f} MB, {len(planted)} file, {len(digests)} contenuti diversi")
+        print(f"{'duplicati':<14} {'s':>6} {'file':>6} {'copie':>6} {'MB occupati':>12}  tutti i contenuti")
+        for label, mode, output in (("off", "off", "off"), ("skip", "skip", "skip"), ("link", "link", "link"),
+                                    ("skip, di nuovo", "skip", "skip")):
+            records, stats, elapsed, used, complete = scan(image, os.path.join(tmp, output), digests, dedup=mode)
+            print(f"{label:<14} {elapsed:>6.2f} {len(records):>6} {sum(stats.duplicates.values()):>6} "
+                  f"{used / 1e6:>12.1f}  {'sì' if complete else 'NO'}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
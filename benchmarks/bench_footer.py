@@ -0,0 +1,109 @@
+"""
+Benchmark della ricerca del footer su file grandi (JPG, PDF, DOCX).
+
+"Prima": il vecchio ciclo che legge 4 KB alla volta, li accoda a file_data
+e cerca il footer in tutto file_data a ogni giro (costo quadratico).
+"Dopo": Carver.footer_end, che esamina ogni byte una sola volta.
+Raddoppiando la dimensione del file il tempo del vecchio ciclo quadruplica,
+quello nuovo raddoppia.
+
+I PDF di prova contengono un aggiornamento incrementale (due %%EOF) e i DOCX
+un archivio annidato con il suo record finale: la colonna "esatto" indica se
+la dimensione trovata coincide con quella reale del file (i file oltre
+max_size, es. 20 MB per i JPG, vengono scartati).
+
+Uso: python benchmarks/bench_footer.py [--sizes 1,2,4,8] [--legacy-max MB]
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recoverflow import FILE_SIGNATURES, BlockReader, Carver
+
+
+def payload(size):
+    """Dati casuali senza byte 0xFF: nessun footer JPEG per caso, come nei dati compressi di un JPEG."""
+    return os.urandom(size).replace(b"\xff", b"\xfe")
+
+
+def make_jpg(size):
+    return b"\xff\xd8\xff\xe0" + payload(size) + b"\xff\xd9"
+
+
+def make_pdf(size):
+    half = size // 2
+    return b"%PDF-1.7\n" + payload(half) + b"\n%%EOF\n" + payload(size - half) + b"\n%%EOF"
+
+
+def make_docx(size):
+    # Un archivio annidato (non compresso) a metà: il suo record finale non chiude il file
+    inner = b"PK\x05\x06" + struct.pack("<HHHHIIH", 0, 0, 1, 1, 46, 1000, 0)
+    body = b"PK\x03\x04" + payload(size // 2) + inner + payload(size - size // 2)
+    cd = b"PK\x01\x02" + payload(42)
+    eocd = b"PK\x05\x06" + struct.pack("<HHHHIIH", 0, 0, 1, 1, len(cd), len(body), 5) + b"nota."
+    return body + cd + eocd
+
+
+GENERATORS = {"jpg": make_jpg, "pdf": make_pdf, "docx": make_docx}
+
+
+def legacy_footer(f, header_pos, sigs, chunk_size=4096):
+    """Il vecchio ciclo di ScanWorker.run: rilegge tutto file_data dopo ogni lettura."""
+    f.seek(header_pos)
+    file_data = bytearray(f.read(chunk_size))
+    while sigs["footer"] not in file_data:
+        if len(file_data) > sigs["max_size"]:
+            return None
+        next_chunk = f.read(chunk_size)
+        if not next_chunk:
+            return None
+        file_data.extend(next_chunk)
+    return file_data.find(sigs["footer"]) + len(sigs["footer"])
+
+
+def new_footer(f, header_pos, file_type, carver):
+    reader = BlockReader(f, os.fstat(f.fileno()).st_size)
+    limit = min(header_pos + FILE_SIGNATURES[file_type]["max_size"], reader.size)
+    end = carver.footer_end(reader, header_pos, limit, file_type)
+    return None if end is None else end - header_pos
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,2,4,8", help="dimensioni dei file in MB (default 1,2,4,8)")
+    parser.add_argument("--legacy-max", type=int, default=8,
+                        help="dimensione massima in MB per il vecchio ciclo, che è quadratico (default 8)")
+    args = parser.parse_args()
+
+    print(f"{'tipo':<5} {'MB':>4} {'prima s':>9} {'esatto':>7} {'dopo s':>8} {'esatto':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        carver = Carver(os.devnull, tmp)
+        for file_type, generate in GENERATORS.items():
+            for size_mb in (int(s) for s in args.sizes.split(",")):
+                data = generate(size_mb * 1024 * 1024)
+                path = os.path.join(tmp, f"{file_type}.img")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(4096) + data + os.urandom(4096))
+                with open(path, "rb", buffering=0) as f:
+                    if size_mb <= args.legacy_max:
+                        old, old_time = timed(legacy_footer, f, 4096, FILE_SIGNATURES[file_type])
+                        old_cols = f"{old_time:>9.3f} {str(old == len(data)):>7}"
+                    else:
+                        old_cols = f"{'-':>9} {'-':>7}"
+                    new, new_time = timed(new_footer, f, 4096, file_type, carver)
+                print(f"{file_type:<5} {size_mb:>4} {old_cols} {new_time:>8.3f} {str(new == len(data)):>7}")
+
+
+if __name__ == "__main__":
+    main()
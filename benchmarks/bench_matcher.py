@@ -0,0 +1,87 @@
+"""
+Benchmark del riconoscitore multi-firma.
+
+Confronta il vecchio ciclo (un 'find' per ogni tipo di file) con
+SignatureMatcher su un buffer casuale, facendo crescere il catalogo da
+8 a diverse centinaia di firme. Il throughput del matcher deve restare
+praticamente costante, quello del vecchio ciclo cala con il numero di firme.
+Fino a matcher.FIND_MAX_SIGNATURES firme (le 8 predefinite comprese) il
+matcher usa anch'esso un 'find' per firma e deve andare come il vecchio ciclo.
+
+Uso: python benchmarks/bench_matcher.py [--size MB] [--seed N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recoverflow import FILE_SIGNATURES, SignatureMatcher
+
+CATALOG_SIZES = (8, 25, 50, 100, 200, 400)
+
+
+def build_catalog(size, rng):
+    """Le firme reali più firme sintetiche (4-12 byte casuali) fino a 'size' voci."""
+    catalog = dict(FILE_SIGNATURES)
+    while len(catalog) < size:
+        header = bytes(rng.randrange(256) for _ in range(rng.randrange(4, 13)))
+        catalog[f"sig{len(catalog)}"] = {"header": header, "footer": None, "max_size": 1 << 20}
+    return catalog
+
+
+def build_buffer(size, catalog, rng):
+    """Buffer casuale con un header di ogni tipo del catalogo piantato in posizione casuale."""
+    data = bytearray(os.urandom(size))
+    for sigs in catalog.values():
+        pos = rng.randrange(size - len(sigs["header"]))
+        data[pos:pos + len(sigs["header"])] = sigs["header"]
+    return bytes(data)
+
+
+def legacy_scan(data, catalog):
+    """Il vecchio approccio: una ricerca completa del buffer per ogni firma."""
+    hits = 0
+    for sigs in catalog.values():
+        pos = data.find(sigs["header"])
+        while pos != -1:
+            hits += 1
+            pos = data.find(sigs["header"], pos + 1)
+    return hits
+
+
+def matcher_scan(data, matcher):
+    return sum(1 for _ in matcher.scan(data))
+
+
+def measure(func, data, *args):
+    start = time.perf_counter()
+    hits = func(data, *args)
+    elapsed = time.perf_counter() - start
+    return hits, len(data) / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=64, help="dimensione del buffer in MB (default 64)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'firme':>6} {'vecchio MB/s':>13} {'matcher MB/s':>13} {'hit':>6}")
+    for size in CATALOG_SIZES:
+        rng = random.Random(args.seed)
+        catalog = build_catalog(size, rng)
+        data = build_buffer(args.size * 1024 * 1024, catalog, rng)
+        matcher = SignatureMatcher(catalog)
+
+        legacy_hits, legacy_speed = measure(legacy_scan, data, catalog)
+        hits, speed = measure(matcher_scan, data, matcher)
+        if hits != legacy_hits:
+            print(f"ATTENZIONE: {hits} hit dal matcher contro {legacy_hits} del vecchio ciclo")
+        print(f"{size:>6} {legacy_speed:>13.1f} {speed:>13.1f} {hits:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark della scrittura asincrona dei file recuperati.
+
+Scansiona un'immagine densa di JPEG piccoli (migliaia di file) scrivendo i
+file nel thread della scansione (0 thread di scrittura, come prima) e con
+un numero crescente di thread di scrittura. Per simulare un disco di output
+lento (chiavetta USB, cartella di rete) ogni file può costare una latenza
+aggiuntiva, che con la scrittura asincrona non blocca più la scansione.
+
+Uso: python benchmarks/bench_output.py [--files N] [--latency MS] [--threads 0,1,4,8]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recoverflow import Carver, FileWriter
+
+
+def build_image(path, count, seed):
+    """JPEG da 4-32 KB uno dietro l'altro, separati da poco rumore."""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        for _ in range(count):
+            f.write(os.urandom(rng.randrange(512, 4096)))
+            body = os.urandom(rng.randrange(4 * 1024, 32 * 1024)).replace(b"\xff", b"\xfe")
+            f.write(b"\xff\xd8\xff\xe0" + body + b"\xff\xd9")
+
+
+def slow_output(latency):
+    """Aggiunge a ogni file scritto una latenza, come su un disco di output lento."""
+    write = FileWriter._write
+
+    def delayed(self, *args):
+        time.sleep(latency)
+        write(self, *args)
+    FileWriter._write = delayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=3000, help="JPEG nell'immagine (default 3000)")
+    parser.add_argument("--latency", type=float, default=2, help="latenza aggiunta per file in ms (default 2)")
+    parser.add_argument("--threads", default="0,1,4,8", help="thread di scrittura da provare (default 0,1,4,8)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.latency:
+        slow_output(args.latency / 1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "disk.img")
+        build_image(path, args.files, args.seed)
+        size = os.path.getsize(path)
+        print(f"Immagine: {size / 1e6:.1f} MB, {args.files} JPEG, latenza per file {args.latency} ms")
+        print(f"{'thread':>6} {'MB/s':>8} {'file/s':>8} {'secondi':>8}")
+        for threads in (int(t) for t in args.threads.split(",")):
+            output_dir = os.path.join(tmp, f"out{threads}")
+            os.mkdir(output_dir)
+            start = time.perf_counter()
+            records = Carver(path, output_dir, writer_threads=threads).carve()
+            elapsed = time.perf_counter() - start
+            print(f"{threads:>6} {size / elapsed / 1e6:>8.1f} {len(records) / elapsed:>8.0f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark delle letture in coda (QueuedReader) a sorgente fredda.
+
+Scrive un file di dati casuali (oppure usa --image, anche un dispositivo
+come /dev/nvme0n1 o un loop device) e lo legge tutto con: il vecchio ciclo
+di ScanWorker (read da 4 KB, una lettura alla volta), BlockReader (blocchi
+da 4 MB, una lettura alla volta) e QueuedReader con 1-32 letture in coda,
+con e senza O_DIRECT. Prima di ogni lettura le pagine del file vengono tolte
+dalla cache del sistema (posix_fadvise DONTNEED, senza bisogno di root),
+così si misura il disco e non la memoria; --warm lascia la cache com'è.
+Infine una scansione completa di carving a blocchi, in coda e in coda con
+O_DIRECT. La banda cresce con la profondità della coda finché il disco ha
+canali liberi: su un SSD NVMe da qualche GB/s una lettura alla volta ne
+usa una frazione. Se la cartella temporanea è in memoria (tmpfs) il file
+generato non misura nessun disco: in quel caso si usa --image.
+
+Uso: python benchmarks/bench_queued.py [--size 2G] [--image PERCORSO] [--block-size MB] [--warm]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recoverflow import BlockReader, QueuedReader, carve
+from recoverflow.engine import _source_size
+
+from bench_carving import parse_size
+from bench_reader import build_image
+
+QUEUE_DEPTHS = (1, 4, 8, 16, 32)
+
+
+def drop_cache(path):
+    """Toglie dalla cache del sistema le pagine di 'path' (dove posix_fadvise esiste)."""
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)  # Solo le pagine già scritte sul disco possono essere tolte
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def legacy_read(path, size):
+    """Il vecchio ciclo di ScanWorker: read da 4 KB bufferizzate, una alla volta."""
+    with open(path, "rb") as f:
+        while f.read(4096):
+            pass
+
+
+def block_read(path, size, block_size):
+    with open(path, "rb", buffering=0) as f:
+        for base, window in BlockReader(f, size, block_size):
+            pass
+
+
+def queued_read(path, size, block_size, queue_depth, direct):
+    with open(path, "rb", buffering=0) as f:
+        reader = QueuedReader(f, size, block_size, queue_depth=queue_depth, direct=direct)
+        try:
+            if direct and not reader.direct:
+                return "O_DIRECT non supportato"
+            for base, window in reader:
+                pass
+        finally:
+            reader.close()
+
+
+def full_scan(path, size, scan_mode, direct=False):
+    with tempfile.TemporaryDirectory() as output_dir:
+        carve(path, output_dir, scan_mode=scan_mode, direct=direct)
+
+
+def measure(label, path, size, warm, func, *args):
+    if not warm:
+        drop_cache(path)
+    start = time.perf_counter()
+    note = func(path, size, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {note}" if note else f"{label:<36} {size / elapsed / 1e6:>8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="2G",
+                        help="dimensione del file generato, es. 512M o 8G (default 2G)")
+    parser.add_argument("--image", help="legge un file o un dispositivo esistente invece di generarne uno")
+    parser.add_argument("--block-size", type=int, default=4, help="dimensione dei blocchi in MB (default 4)")
+    parser.add_argument("--warm", action="store_true", help="non togliere il file dalla cache prima di ogni lettura")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    block_size = args.block_size * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.image
+        if not path:
+            path = os.path.join(tmp, "disk.img")
+            build_image(path, args.size, args.seed)
+        with open(path, "rb") as f:
+            size = _source_size(f)
+        print(f"Sorgente: {path}, {size / 1e6:.0f} MB, cache {'calda' if args.warm else 'fredda'}")
+
+        measure("read 4 KB, una alla volta", path, size, args.warm, legacy_read)
+        measure(f"BlockReader, blocchi da {args.block_size} MB", path, size, args.warm, block_read, block_size)
+        for direct in (False, True):
+            for depth in QUEUE_DEPTHS:
+                label = f"QueuedReader, {depth} in coda" + (", O_DIRECT" if direct else "")
+                measure(label, path, size, args.warm, queued_read, block_size, depth, direct)
+        measure("scansione completa (stream)", path, size, args.warm, full_scan, "stream")
+        measure("scansione completa (queued)", path, size, args.warm, full_scan, "queued")
+        measure("scansione completa (queued, O_DIRECT)", path, size, args.warm, full_scan, "queued", True)
+
+
+if __name__ == "__main__":
+    main()
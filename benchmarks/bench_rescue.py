@@ -0,0 +1,138 @@
+"""
+Benchmark della scansione di un disco con settori illeggibili.
+
+Genera un'immagine sintetica (vedi synthetic.py) e simula un disco
+danneggiato: alcuni settori isolati e una zona morta contigua fanno fallire
+con EIO, dopo una latenza come quella di un disco che ritenta, ogni lettura
+che li tocca (lettori a blocchi e in coda, copie del kernel dei file
+recuperati). La scansione viene ripetuta senza letture tolleranti (si ferma
+al primo errore, come il vecchio ScanWorker) e con le letture tolleranti a
+blocchi e in coda; per ognuna riporta tempo, fin dove è arrivata, file
+recuperati (e quanti identici a quelli di una scansione senza errori),
+errori di lettura, byte sostituiti da zeri e byte saltati nella zona morta.
+
+Uso: python benchmarks/bench_rescue.py [--size 512M] [--files N] [--bad-sectors N] [--dead-zone 8M]
+                                       [--latency MS] [--retries N] [--seed N]
+"""
+import argparse
+import bisect
+import errno
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recoverflow import BlockReader, Carver, QueuedReader, output
+from recoverflow.rescue import RESCUE_SECTOR
+from synthetic import build_image
+
+from bench_carving import parse_size
+
+
+def failing_source(bad, latency):
+    """
+    Fa fallire con EIO, dopo 'latency' secondi, le letture che toccano le zone
+    [(offset, lunghezza), ...] di 'bad' (ordinate e disgiunte).
+    """
+    starts = [offset for offset, _ in bad]
+
+    def touches(offset, length):
+        i = bisect.bisect_right(starts, offset + length - 1) - 1
+        return i >= 0 and bad[i][0] + bad[i][1] > offset
+
+    def failing(read):
+        def wrapper(self, view, offset):
+            if touches(offset, len(view)):
+                time.sleep(latency)
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+            return read(self, view, offset)
+        return wrapper
+
+    def failing_copy(method):
+        def wrapper(src_fd, dst_fd, offset, count):
+            if touches(offset, count):
+                time.sleep(latency)
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+            return method(src_fd, dst_fd, offset, count)
+        return wrapper
+
+    BlockReader._read = failing(BlockReader._read)
+    QueuedReader._read = failing(QueuedReader._read)
+    output.KERNEL_COPY_METHODS[:] = [failing_copy(method) for method in output.KERNEL_COPY_METHODS]
+
+
+def digests(records):
+    result = set()
+    for record in records:
+        with open(record.path, "rb") as f:
+            result.add(hashlib.sha256(f.read()).digest())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="512M",
+                        help="dimensione dell'immagine, es. 512M o 4G (default 512M)")
+    parser.add_argument("--files", type=int, default=300, help="file piantati (default 300)")
+    parser.add_argument("--bad-sectors", type=int, default=40, help="settori illeggibili isolati (default 40)")
+    parser.add_argument("--dead-zone", type=parse_size, default="8M",
+                        help="dimensione della zona morta contigua (default 8M)")
+    parser.add_argument("--latency", type=float, default=2, help="latenza di ogni lettura fallita in ms (default 2)")
+    parser.add_argument("--retries", type=int, default=3, help="nuovi tentativi per settore (default 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        image = os.path.join(tmp, "disk.img")
+        build_image(image, args.size, args.files, args.seed)
+
+        def scan(label, **options):
+            output_dir = os.path.join(tmp, label)
+            os.mkdir(output_dir)
+            carver = Carver(image, output_dir, journal=False, retries=args.retries, **options)
+            start = time.perf_counter()
+            error = None
+            try:
+                carver.carve()
+            except OSError as e:
+                error = e
+            return carver, time.perf_counter() - start, error
+
+        clean, elapsed, _ = scan("pulita", scan_mode="stream")
+        reference = digests(clean.records)
+
+        rng = random.Random(args.seed)
+        dead = rng.randrange(args.size // 4, args.size // 2) // RESCUE_SECTOR * RESCUE_SECTOR
+        bad = [(dead, args.dead_zone)]
+        for _ in range(args.bad_sectors):
+            bad.append((rng.randrange(args.size // RESCUE_SECTOR) * RESCUE_SECTOR, RESCUE_SECTOR))
+        bad.sort()
+        failing_source(bad, args.latency / 1000)
+
+        print(f"Immagine: {args.size / 1e6:.0f} MB, {args.files} file, {args.bad_sectors} settori illeggibili "
+              f"e una zona morta di {args.dead_zone / 1e6:.0f} MB, {args.latency:g} ms per lettura fallita")
+        print(f"{'scansione':<28} {'s':>6} {'arrivata':>9} {'file':>6} {'identici':>9} {'errori':>7} "
+              f"{'KB azzerati':>12} {'MB saltati':>11}")
+        print(f"{'senza errori':<28} {elapsed:>6.2f} {'100%':>9} {len(clean.records):>6} {len(reference):>9}")
+        for label, options in (("senza letture tolleranti", {"rescue": False, "scan_mode": "stream"}),
+                               ("tolleranti, a blocchi", {"scan_mode": "stream"}),
+                               ("tolleranti, in coda", {"scan_mode": "queued"})):
+            carver, elapsed, error = scan(label, **options)
+            stats = carver.stats
+            reached = f"{stats.percent}%" if error is None else f"{stats.percent}% (EIO)"
+            print(f"{label:<28} {elapsed:>6.2f} {reached:>9} {len(carver.records):>6} "
+                  f"{len(reference & digests(carver.records)):>9} {stats.read_errors:>7} "
+                  f"{stats.unreadable / 1024:>12.1f} {stats.unread / 1e6:>11.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
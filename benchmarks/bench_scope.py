@@ -0,0 +1,106 @@
+"""
+Benchmark della scansione limitata allo spazio non allocato o a una partizione.
+
+Genera un'immagine con tabella delle partizioni (GPT o MBR) e tre file
+system FAT32, exFAT e NTFS pieni di file attivi e di file cancellati (vedi
+volume_image.py), oppure usa --image (ad esempio l'immagine di una
+chiavetta o di un disco formattato con mkfs, o un loop device). Elenca le
+partizioni riconosciute e ripete la scansione: completa, solo nello spazio
+non allocato, su una sola partizione e nello spazio non allocato di quella
+partizione. Per ognuna riporta tempo, file trovati, file cancellati e attivi
+tra quelli piantati, byte esclusi, tempo risparmiato rispetto alla
+scansione completa e la stima che ne dà la scansione stessa (alla sua
+velocità media: è per difetto quando lo spazio non allocato è quasi tutto
+vuoto e viene saltato). La scansione dello spazio non allocato deve trovare
+tutti i file cancellati e nessuno dei file attivi, che si possono copiare
+dal file system.
+
+Uso: python benchmarks/bench_scope.py [--size 1G] [--scheme gpt|mbr] [--fill 0.7] [--partition N]
+                                      [--workers N] [--image PERCORSO] [--seed N]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recoverflow import Carver
+from recoverflow.engine import _source_size
+from recoverflow.volumes import format_partition, read_partitions
+from volume_image import build_volume_image
+
+from bench_carving import parse_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="1G",
+                        help="dimensione dell'immagine generata, es. 512M o 4G (default 1G)")
+    parser.add_argument("--scheme", choices=("gpt", "mbr"), default="gpt",
+                        help="tabella delle partizioni dell'immagine generata (default gpt)")
+    parser.add_argument("--fill", type=float, default=0.7,
+                        help="frazione dei cluster di ogni file system occupata da dati (default 0.7)")
+    parser.add_argument("--partition", type=int, default=2, help="partizione scandita da sola (default 2)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processi per la scansione parallela; con più di 1 si aggiunge la scansione "
+                             "parallela dello spazio non allocato (default 1)")
+    parser.add_argument("--image", help="usa un file o un dispositivo esistente invece di generare l'immagine")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        image = args.image
+        planted = []
+        if not image:
+            image = os.path.join(tmp, "disk.img")
+            start = time.perf_counter()
+            _, planted = build_volume_image(image, args.size, args.seed, args.scheme, args.fill)
+            deleted = sum(1 for item in planted if not item.live)
+            print(f"Immagine {args.scheme.upper()}: {args.size / 1e6:.0f} MB, {len(planted)} file piantati, "
+                  f"{deleted} cancellati ({time.perf_counter() - start:.1f} s per generarla)")
+        with open(image, "rb", buffering=0) as f:
+            size = _source_size(f)
+            start = time.perf_counter()
+            partitions = read_partitions(f, size)
+            elapsed = time.perf_counter() - start
+        for partition in partitions:
+            print(f"  {format_partition(partition)}")
+        print(f"  (tabella e file system letti in {elapsed * 1000:.0f} ms)")
+        live = {item.offset for item in planted if item.live}
+        deleted = {item.offset for item in planted if not item.live}
+
+        print(f"{'scansione':<36} {'s':>7} {'file':>6} {'cancellati':>11} {'attivi':>7} {'MB esclusi':>11} "
+              f"{'s risparmiati':>14} {'stima':>6}")
+        scans = [("completa", {}),
+                 ("spazio non allocato", {"unallocated": True}),
+                 (f"partizione {args.partition}", {"partition": args.partition}),
+                 (f"partizione {args.partition}, non allocato", {"partition": args.partition, "unallocated": True})]
+        if args.workers > 1:
+            scans.append((f"spazio non allocato, {args.workers} processi",
+                          {"unallocated": True, "workers": args.workers, "region_size": 64 * 1024 * 1024}))
+        for number, (label, options) in enumerate(scans):
+            output_dir = os.path.join(tmp, f"scansione{number}")
+            os.mkdir(output_dir)
+            carver = Carver(image, output_dir, journal=False, **options)
+            start = time.perf_counter()
+            records = carver.carve()
+            elapsed = time.perf_counter() - start
+            if not number:
+                full = elapsed
+            found = {record.offset for record in records}
+            stats = carver.stats
+            print(f"{label:<36} {elapsed:>7.2f} {len(records):>6} "
+                  f"{f'{len(found & deleted)}/{len(deleted)}' if planted else '-':>11} "
+                  f"{len(found & live) if planted else '-':>7} {stats.excluded / 1e6:>11.1f} "
+                  f"{full - elapsed:>14.2f} {stats.saved:>6.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark dei messaggi e dell'avanzamento inviati alla GUI.
+
+Scansiona un'immagine densa di JPEG piccoli (molti header, quindi molti
+messaggi) con un consumatore in un altro thread che fa la parte della GUI:
+riceve ogni evento da una coda, come un segnale Qt tra thread, e tiene
+il log in memoria. Confronta la scansione senza consumatore, con un evento
+per ogni messaggio e per ogni avanzamento (come prima) e con
+ThrottledReporter, riportando la velocità della scansione, gli eventi
+consegnati e le righe tenute nel log.
+
+Se PySide6 è installato viene usata anche la GUI vera: un QThread che
+emette i segnali verso un QTextEdit illimitato oppure verso il
+QPlainTextEdit limitato di RecoveryWindow (piattaforma Qt "offscreen").
+
+Ogni configurazione viene eseguita più volte e vale il tempo migliore.
+
+Uso: python benchmarks/bench_signals.py [--files N] [--repeat N] [--seed N]
+"""
+import argparse
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recoverflow import Carver, ThrottledReporter
+
+MAX_LOG_LINES = 5000
+
+
+def build_image(path, count, seed):
+    """JPEG da 2-8 KB uno dietro l'altro, separati da poco rumore."""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        for _ in range(count):
+            f.write(os.urandom(rng.randrange(128, 1024)))
+            body = os.urandom(rng.randrange(2 * 1024, 8 * 1024)).replace(b"\xff", b"\xfe")
+            f.write(b"\xff\xd8\xff\xe0" + body + b"\xff\xd9")
+
+
+class FakeGui:
+    """Thread che consuma gli eventi come il ciclo degli eventi della GUI."""
+
+    def __init__(self, capped):
+        self.events = queue.SimpleQueue()
+        self.delivered = 0
+        self.lines = []
+        self.capped = capped
+        self.thread = threading.Thread(target=self._run)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self.delivered += 1
+            kind, payload = event
+            if kind == "log":
+                self.lines.extend(payload)
+                if self.capped and len(self.lines) > MAX_LOG_LINES:
+                    del self.lines[:len(self.lines) - MAX_LOG_LINES]
+
+    def close(self):
+        self.events.put(None)
+        self.thread.join()
+
+
+def simulated_scan(path, output_dir, mode):
+    """Scansione con una GUI simulata: mode è None (nessuna GUI), "eventi" o "raggruppati"."""
+    if mode is None:
+        start = time.perf_counter()
+        Carver(path, output_dir, journal=False).carve()
+        return time.perf_counter() - start, 0, 0
+    gui = FakeGui(capped=mode == "raggruppati")
+    if mode == "eventi":
+        log = lambda message: gui.events.put(("log", [message]))
+        progress = lambda done: gui.events.put(("progress", done))
+        reporter = None
+    else:
+        reporter = ThrottledReporter(lambda lines: gui.events.put(("log", lines)),
+                                     lambda done: gui.events.put(("progress", done)))
+        log, progress = reporter.log, reporter.progress
+    start = time.perf_counter()
+    Carver(path, output_dir, journal=False, log=log, progress=progress).carve()
+    if reporter is not None:
+        reporter.flush()
+    gui.close()  # Il tempo comprende la consegna di tutti gli eventi
+    return time.perf_counter() - start, gui.delivered, len(gui.lines)
+
+
+def qt_scan(path, output_dir, batched):
+    """Scansione con la GUI vera: segnali per ogni evento e QTextEdit, oppure ScanWorker."""
+    from PySide6.QtCore import QThread, Signal
+    from PySide6.QtWidgets import QApplication, QPlainTextEdit, QProgressBar, QTextEdit
+
+    app = QApplication.instance() or QApplication([])
+    bar = QProgressBar()
+    if batched:
+        from recovery_app import ScanWorker
+        worker = ScanWorker(path, output_dir)
+        worker.carver.use_journal = False
+        log_area = QPlainTextEdit()
+        log_area.setMaximumBlockCount(MAX_LOG_LINES)
+        worker.log_batch.connect(lambda lines: log_area.appendPlainText("\n".join(lines)))
+        worker.stats_update.connect(lambda stats: bar.setValue(stats.percent))
+    else:
+        class LegacyWorker(QThread):
+            progress_update = Signal(str)
+            progress_percentage = Signal(int)
+
+            def run(self):
+                self.carver.carve()
+
+        worker = LegacyWorker()
+        worker.carver = Carver(path, output_dir, journal=False, log=worker.progress_update.emit,
+                               progress=lambda done: worker.progress_percentage.emit(done * 100 // worker.carver.size))
+        log_area = QTextEdit()
+        worker.progress_update.connect(log_area.append)
+        worker.progress_percentage.connect(bar.setValue)
+    worker.finished.connect(app.quit)
+    start = time.perf_counter()
+    worker.start()
+    app.exec()
+    worker.wait()
+    app.processEvents()
+    return time.perf_counter() - start, log_area.document().blockCount()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000, help="JPEG nell'immagine (default 20000)")
+    parser.add_argument("--repeat", type=int, default=3, help="esecuzioni per configurazione (default 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "disk.img")
+        build_image(path, args.files, args.seed)
+        size = os.path.getsize(path)
+        print(f"Immagine: {size / 1e6:.1f} MB, {args.files} JPEG")
+        print(f"{'GUI simulata':<16} {'MB/s':>8} {'secondi':>8} {'eventi':>8} {'righe log':>10}")
+        for mode in (None, "eventi", "raggruppati"):
+            runs = []
+            for run in range(args.repeat):
+                output_dir = os.path.join(tmp, f"out-{mode}-{run}")
+                os.mkdir(output_dir)
+                runs.append(simulated_scan(path, output_dir, mode))
+            elapsed, delivered, lines = min(runs)
+            print(f"{mode or 'nessuna':<16} {size / elapsed / 1e6:>8.1f} {elapsed:>8.2f} {delivered:>8} {lines:>10}")
+
+        try:
+            import PySide6  # noqa: F401
+        except ImportError:
+            print("PySide6 non installato: confronto con la GUI vera saltato.")
+            return
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        print(f"{'GUI Qt':<16} {'MB/s':>8} {'secondi':>8} {'righe log':>10}")
+        for batched in (False, True):
+            output_dir = os.path.join(tmp, f"qt-{batched}")
+            os.mkdir(output_dir)
+            elapsed, lines = qt_scan(path, output_dir, batched)
+            label = "raggruppati" if batched else "un segnale"
+            print(f"{label:<16} {size / elapsed / 1e6:>8.1f} {elapsed:>8.2f} {lines:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark del calcolo della dimensione dei file senza footer (MP4, MP3, WAV, DOC).
+
+Genera un'immagine con file strutturalmente validi di ogni tipo, separati da
+rumore casuale che contiene anche header isolati (falsi positivi), e la
+scansiona due volte: "prima" i file senza footer terminano al primo header
+successivo o a max_size, "dopo" la dimensione viene calcolata dalla struttura.
+Riporta i byte letti per trovare la fine dei file, i byte scritti, il tempo e
+quanti file sono stati recuperati con la dimensione esatta.
+
+Uso: python benchmarks/bench_sizing.py [--files N] [--seed N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recoverflow import FILE_SIGNATURES, Carver, SourceReader
+
+
+def make_wav(rng):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(os.urandom(rng.randrange(64 * 1024, 2 * 1024 * 1024) & ~3))
+    return out.getvalue()
+
+
+def make_mp4(rng):
+    ftyp = struct.pack(">I4s4sI4s4s", 0x18, b"ftyp", b"mp42", 0, b"mp42", b"isom")
+    moov = os.urandom(rng.randrange(1024, 64 * 1024))
+    mdat = os.urandom(rng.randrange(256 * 1024, 4 * 1024 * 1024))
+    return (ftyp + struct.pack(">I4s", 8 + len(moov), b"moov") + moov
+            + struct.pack(">I4s", 8 + len(mdat), b"mdat") + mdat)
+
+
+def make_mp3(rng):
+    tag = bytes(rng.randrange(1024, 64 * 1024))
+    size = len(tag)
+    syncsafe = bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F])
+    frames = []
+    for _ in range(rng.randrange(500, 5000)):
+        padding = rng.randrange(2)
+        # MPEG-1 Layer III, 128 kbit/s, 44100 Hz: 417 byte + padding
+        frames.append(bytes([0xFF, 0xFB, 0x90 | padding << 1, 0x64]) + os.urandom(413 + padding))
+    return b"ID3\x03\x00\x00" + syncsafe + tag + b"".join(frames) + b"TAG" + bytes(125)
+
+
+def make_doc(rng):
+    """File OLE versione 3 (settori da 512 byte) con una FAT di un solo settore."""
+    sectors = rng.randrange(16, 127)  # Settori dati, tutti in un'unica catena
+    header = bytearray(512)
+    header[0:8] = FILE_SIGNATURES["doc"]["header"]
+    struct.pack_into("<HHHH", header, 0x18, 0x3E, 3, 0xFFFE, 9)
+    struct.pack_into("<III", header, 0x2C, 1, 1, 0)  # Settori FAT, primo settore della directory
+    struct.pack_into("<II", header, 0x44, 0xFFFFFFFE, 0)  # Nessun settore DIFAT
+    header[0x4C:0x200] = b"\xff" * (0x200 - 0x4C)
+    struct.pack_into("<I", header, 0x4C, 0)  # La FAT è nel settore 0
+    fat = [0xFFFFFFFD] + list(range(2, sectors + 1)) + [0xFFFFFFFE]
+    fat += [0xFFFFFFFF] * (128 - len(fat))
+    return bytes(header) + struct.pack("<128I", *fat) + os.urandom(sectors * 512)
+
+
+GENERATORS = {"wav": make_wav, "mp4": make_mp4, "mp3": make_mp3, "doc": make_doc}
+
+
+def build_image(path, count, seed):
+    """Restituisce l'elenco (offset, dimensione, tipo) dei file piantati nell'immagine."""
+    rng = random.Random(seed)
+    planted = []
+    with open(path, "wb") as f:
+        for i in range(count):
+            gap = bytearray(os.urandom(rng.randrange(256 * 1024, 2 * 1024 * 1024)))
+            # Un header isolato nel rumore: un falso positivo
+            header = FILE_SIGNATURES[rng.choice(list(GENERATORS))]["header"]
+            pos = rng.randrange(len(gap) // 2)
+            gap[pos:pos + len(header)] = header
+            f.write(gap)
+            file_type = list(GENERATORS)[i % len(GENERATORS)]
+            data = GENERATORS[file_type](rng)
+            planted.append((f.tell(), len(data), file_type))
+            f.write(data)
+        f.write(os.urandom(1024 * 1024))
+    return planted
+
+
+@contextlib.contextmanager
+def without_resolvers():
+    """Il comportamento precedente: nessun calcolo della dimensione dalla struttura."""
+    saved = {t: s.pop("resolver") for t, s in FILE_SIGNATURES.items() if "resolver" in s}
+    try:
+        yield
+    finally:
+        for file_type, resolver in saved.items():
+            FILE_SIGNATURES[file_type]["resolver"] = resolver
+
+
+@contextlib.contextmanager
+def counting_reads(counter):
+    """Conta i byte letti con read_at (ricerca della fine dei file)."""
+    original = SourceReader.read_at
+
+    def read_at(self, offset, size):
+        view = original(self, offset, size)
+        counter[0] += len(view)
+        return view
+    SourceReader.read_at = read_at
+    try:
+        yield
+    finally:
+        SourceReader.read_at = original
+
+
+def run(path, planted):
+    counter = [0]
+    with tempfile.TemporaryDirectory() as output_dir, counting_reads(counter):
+        start = time.perf_counter()
+        records = Carver(path, output_dir, scan_mode="stream").carve()
+        elapsed = time.perf_counter() - start
+    exact = len(set(planted) & {(r.offset, r.size, r.file_type) for r in records})
+    return counter[0], sum(r.size for r in records), elapsed, exact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=40, help="file piantati nell'immagine (default 40)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "disk.img")
+        planted = build_image(path, args.files, args.seed)
+        print(f"Immagine: {os.path.getsize(path) / 1e6:.1f} MB, {len(planted)} file senza footer")
+        print(f"{'':<6} {'MB letti':>10} {'MB scritti':>11} {'secondi':>8} {'esatti':>7}")
+        with without_resolvers():
+            read, written, elapsed, exact = run(path, planted)
+        print(f"{'prima':<6} {read / 1e6:>10.1f} {written / 1e6:>11.1f} {elapsed:>8.2f} {exact:>7}")
+        read, written, elapsed, exact = run(path, planted)
+        print(f"{'dopo':<6} {read / 1e6:>10.1f} {written / 1e6:>11.1f} {elapsed:>8.2f} {exact:>7}")
+        print(f"File piantati: {sum(size for _, size, _ in planted) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
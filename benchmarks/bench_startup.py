@@ -0,0 +1,58 @@
+"""
+Benchmark del tempo di avvio.
+
+Misura in un processo nuovo il tempo di 'import recoverflow', di
+'python -m recoverflow --help' e, per confronto, di 'import recovery_app'
+(che carica PySide6). Controlla anche che la riga di comando non importi
+PySide6.
+
+Uso: python benchmarks/bench_startup.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = (
+    ("python -c pass", ["-c", "pass"]),
+    ("import recoverflow", ["-c", "import recoverflow"]),
+    ("python -m recoverflow --help", ["-m", "recoverflow", "--help"]),
+    ("import recovery_app (GUI)", ["-c", "import recovery_app"]),
+)
+
+
+def measure(args, runs):
+    """Tempo mediano in ms per avviare un interprete con 'args', o None se il comando fallisce."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="avvii per ogni caso (default 10)")
+    args = parser.parse_args()
+
+    check = "import sys, recoverflow.cli; sys.exit('PySide6' in sys.modules)"
+    if subprocess.run([sys.executable, "-c", check], cwd=ROOT).returncode != 0:
+        print("ATTENZIONE: la riga di comando importa PySide6")
+
+    print(f"{'comando':<30} {'ms':>8}")
+    for label, case in CASES:
+        elapsed = measure(case, args.runs)
+        print(f"{label:<30} {'errore' if elapsed is None else f'{elapsed:>8.1f}':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark dei controlli strutturali (validators) sui falsi positivi.
+
+Genera un'immagine sintetica (vedi synthetic.py) con file validi ed esche:
+header isolati nel rumore, come quelli che compaiono per caso dentro altri
+file. La scansiona due volte, senza e con i controlli, e per ognuna riporta
+tempo, file e byte scritti, header scartati per tipo e precisione/richiamo
+rispetto ai file piantati. Senza controlli un'esca diventa un file di
+spazzatura che arriva fino al primo footer (a volte quello di un file vero,
+che va perso) o fino a max_size.
+
+Uso: python benchmarks/bench_validators.py [--size 512M] [--files N] [--decoys FRAZIONE] [--seed N]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recoverflow import Carver
+from recoverflow.stats import format_counts
+from synthetic import build_image, score
+
+from bench_carving import parse_size
+
+
+def scan(image, output_dir, validate):
+    os.mkdir(output_dir)
+    carver = Carver(image, output_dir, journal=False, validate=validate)
+    start = time.perf_counter()
+    records = carver.carve()
+    elapsed = time.perf_counter() - start
+    written = sum(entry.stat().st_size for entry in os.scandir(output_dir))
+    return records, carver.stats, elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="512M",
+                        help="dimensione dell'immagine, es. 512M o 4G (default 512M)")
+    parser.add_argument("--files", type=int, default=200, help="file piantati (default 200)")
+    parser.add_argument("--decoys", type=float, default=0.5,
+                        help="frazione dei file preceduti da un'esca (default 0.5)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="recoverflow-bench-")
+    try:
+        image = os.path.join(tmp, "disk.img")
+        planted = build_image(image, args.size, args.files, args.seed, fragmented=0.0, decoys=args.decoys)
+        print(f"Immagine: {args.size / 1e6:.0f} MB, {len(planted)} file, esche nel {args.decoys:.0%} dei casi")
+        print(f"{'controlli':<10} {'s':>6} {'file':>6} {'MB scritti':>11} {'precisione':>11} {'richiamo':>9}  scartati")
+        results = {}
+        for validate in (False, True):
+            label = "sì" if validate else "no"
+            records, stats, elapsed, written = scan(image, os.path.join(tmp, f"out-{label}"), validate)
+            result = score(planted, [(r.offset, r.size, r.file_type) for r in records])
+            results[validate] = written
+            print(f"{label:<10} {elapsed:>6.2f} {len(records):>6} {written / 1e6:>11.1f} "
+                  f"{result['precision']:>11.1%} {result['recall']:>9.1%}  {format_counts(stats.rejected) or '-'}")
+        if results[False]:
+            print(f"Byte scritti con i controlli: {1 - results[True] / results[False]:.1%} in meno")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Immagini disco sintetiche e riproducibili per i benchmark del carving.
+
+build_image() scrive un file sparso della dimensione richiesta con file
+strutturalmente validi di ogni tipo riconosciuto (JPG, PNG, PDF, MP4, MP3,
+WAV, DOC, DOCX) a offset casuali o allineati, rumore casuale prima di ogni
+file, zone scritte con zeri e, se richiesto, file frammentati in due parti
+separate da altro rumore, esche (header isolati nel rumore, come quelli
+che compaiono per caso dentro altri file) e copie identiche di file già
+piantati, come le cache e le vecchie copie su un disco vero. Tutto il resto dell'immagine resta un buco del
+file sparso: un'immagine da 100 GB occupa sul disco solo i byte scritti.
+
+Lo stesso seme produce la stessa immagine, byte per byte. La verità di
+riferimento (PlantedFile) si può salvare accanto all'immagine in JSON con
+save_manifest() e rileggere con load_manifest().
+"""
+import io
+import json
+import random
+import struct
+import wave
+import zipfile
+import zlib
+from collections import namedtuple
+
+KB = 1024
+MB = 1024 * KB
+
+# Un file piantato: offset e dimensione totale, tipo e frammenti [(offset, lunghezza), ...]
+PlantedFile = namedtuple("PlantedFile", "offset size file_type fragments")
+
+# --- GENERATORI: un file valido di circa 'size' byte ---
+
+def _payload(rng, size):
+    """Dati casuali senza byte 0xFF: nessun footer JPEG per caso, come nei dati compressi."""
+    return rng.randbytes(size).replace(b"\xff", b"\xfe")
+
+def _entropy(rng, size, restart):
+    """
+    Dati compressi JPEG: ogni 0xFF è seguito dal riempimento 0x00 e, con
+    'restart', un marcatore RST0-RST7 chiude un intervallo ogni 'restart' byte circa.
+    """
+    if not restart:
+        return rng.randbytes(size).replace(b"\xff", b"\xff\x00")
+    intervals = []
+    for index in range(max(1, size // restart)):
+        if index:
+            intervals.append(bytes([0xFF, 0xD0 + (index - 1) % 8]))
+        intervals.append(rng.randbytes(rng.randrange(restart // 2, restart * 3 // 2)).replace(b"\xff", b"\xff\x00"))
+    return b"".join(intervals)
+
+def make_jpg(rng, size):
+    def segment(marker, data):
+        return bytes([0xFF, marker]) + struct.pack(">H", len(data) + 2) + data
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    dqt = b"\x00" + bytes(rng.randrange(1, 100) for _ in range(64))
+    sof0 = (struct.pack(">BHHB", 8, rng.randrange(16, 4096), rng.randrange(16, 4096), 3)
+            + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01")
+    dht = b"\x00" + bytes([0, 1, 5, 1, 1, 1, 1, 1, 1] + [0] * 7) + bytes(range(12))
+    sos = b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00"
+    # Metà dei file con un intervallo di restart (DRI) e i marcatori RST nei dati
+    restart = rng.choice((0, rng.randrange(256, 2 * KB)))
+    dri = segment(0xDD, struct.pack(">H", rng.randrange(1, 64))) if restart else b""
+    return (b"\xff\xd8" + segment(0xE0, app0) + segment(0xDB, dqt) + segment(0xC0, sof0) + segment(0xC4, dht)
+            + dri + segment(0xDA, sos) + _entropy(rng, size, restart) + b"\xff\xd9")
+
+def make_png(rng, size):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", rng.randrange(16, 4096), rng.randrange(16, 4096), 8, 2, 0, 0, 0)
+    # L'ultimo chunk è IEND con il suo CRC fisso: coincide con il footer
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", _payload(rng, size))
+            + b"\x00\x00\x00\x00IEND\xaeB`\x82")
+
+def make_pdf(rng, size):
+    def trailer(xref_pos):
+        return (b"\nxref\n0 1\n0000000000 65535 f \ntrailer\n<< /Size 1 /Root 1 0 R >>\nstartxref\n"
+                + str(xref_pos).encode() + b"\n%%EOF\n")
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+    # Con un aggiornamento incrementale su due: due %%EOF, vale l'ultimo
+    if rng.random() < 0.5:
+        body = head + _payload(rng, size)
+        return body + trailer(len(body) + 1)
+    half = size // 2
+    body = head.replace(b"1.4", b"1.7") + _payload(rng, half)
+    body += trailer(len(body) + 1)
+    body += b"3 0 obj\n<< >>\nendobj\n" + _payload(rng, size - half)
+    return body + trailer(len(body) + 1)
+
+def make_mp4(rng, size):
+    ftyp = struct.pack(">I4s4sI4s4s", 0x18, b"ftyp", b"mp42", 0, b"mp42", b"isom")
+    moov = rng.randbytes(rng.randrange(1 * KB, 16 * KB))
+    mdat = rng.randbytes(size)
+    return (ftyp + struct.pack(">I4s", 8 + len(moov), b"moov") + moov
+            + struct.pack(">I4s", 8 + len(mdat), b"mdat") + mdat)
+
+def make_mp3(rng, size):
+    tag = bytes(rng.randrange(1 * KB, 16 * KB))
+    length = len(tag)
+    syncsafe = bytes([length >> 21 & 0x7F, length >> 14 & 0x7F, length >> 7 & 0x7F, length & 0x7F])
+    frames = []
+    for _ in range(max(1, size // 418)):
+        padding = rng.randrange(2)
+        # MPEG-1 Layer III, 128 kbit/s, 44100 Hz: 417 byte + padding
+        frames.append(bytes([0xFF, 0xFB, 0x90 | padding << 1, 0x64]) + rng.randbytes(413 + padding))
+    return b"ID3\x03\x00\x00" + syncsafe + tag + b"".join(frames) + b"TAG" + bytes(125)
+
+def make_wav(rng, size):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(rng.randbytes(size & ~3))
+    return out.getvalue()
+
+def make_doc(rng, size):
+    """File OLE versione 3 (settori da 512 byte) con una FAT di un solo settore (al massimo ~64 KB)."""
+    sectors = max(2, min(size // 512, 126))  # Settori dati, tutti in un'unica catena
+    header = bytearray(512)
+    header[0:8] = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+    struct.pack_into("<HHHH", header, 0x18, 0x3E, 3, 0xFFFE, 9)
+    struct.pack_into("<III", header, 0x2C, 1, 1, 0)  # Settori FAT, primo settore della directory
+    struct.pack_into("<II", header, 0x44, 0xFFFFFFFE, 0)  # Nessun settore DIFAT
+    header[0x4C:0x200] = b"\xff" * (0x200 - 0x4C)
+    struct.pack_into("<I", header, 0x4C, 0)  # La FAT è nel settore 0
+    fat = [0xFFFFFFFD] + list(range(2, sectors + 1)) + [0xFFFFFFFE]
+    fat += [0xFFFFFFFF] * (128 - len(fat))
+    return bytes(header) + struct.pack("<128I", *fat) + rng.randbytes(sectors * 512)
+
+DOCX_WORDS = ("il", "la", "di", "che", "documento", "recupero", "file", "disco", "settore", "relazione",
+              "tabella", "anno", "progetto", "dati", "risultati", "capitolo", "pagina", "nota")
+
+def make_docx(rng, size):
+    """Archivio ZIP vero (deflate): tipi di contenuto, un documento di testo e un'immagine di circa 'size' byte."""
+    date_time = (rng.randrange(1990, 2030), rng.randrange(1, 13), rng.randrange(1, 29),
+                 rng.randrange(24), rng.randrange(60), rng.randrange(30) * 2)
+    text = " ".join(rng.choice(DOCX_WORDS) for _ in range(rng.randrange(1000, 20000)))
+    entries = (
+        ("[Content_Types].xml", b'<?xml version="1.0"?><Types><Default Extension="xml"/></Types>'),
+        ("word/document.xml", f"<w:document><w:body><w:p><w:t>{text}</w:t></w:p></w:body></w:document>".encode()),
+        ("word/media/image1.png", rng.randbytes(size)),
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(zipfile.ZipInfo(name, date_time), data, zipfile.ZIP_DEFLATED)
+    return out.getvalue()
+
+GENERATORS = {
+    "jpg": make_jpg, "png": make_png, "pdf": make_pdf, "mp4": make_mp4,
+    "mp3": make_mp3, "wav": make_wav, "doc": make_doc, "docx": make_docx,
+}
+# Dimensioni (minima, massima) del contenuto generato per tipo
+SIZE_RANGES = {
+    "jpg": (16 * KB, 1 * MB), "png": (16 * KB, 1 * MB), "pdf": (32 * KB, 2 * MB), "mp4": (256 * KB, 8 * MB),
+    "mp3": (128 * KB, 4 * MB), "wav": (64 * KB, 4 * MB), "doc": (4 * KB, 63 * KB), "docx": (16 * KB, 2 * MB),
+}
+
+# Esche: un header seguito da byte che ingannano il solo header (e il calcolo
+# della dimensione per i RIFF), ma non i controlli strutturali (validators)
+DECOYS = {
+    "jpg": lambda rng: b"\xff\xd8\xff" + rng.randbytes(61),
+    "png": lambda rng: b"\x89PNG\r\n\x1a\n" + rng.randbytes(56),
+    "pdf": lambda rng: b"%PDF-" + rng.randbytes(59),
+    "wav": lambda rng: b"RIFF" + struct.pack("<I", rng.randrange(64 * KB, 4 * MB)) + b"WAVELIST" + rng.randbytes(48),
+    "docx": lambda rng: b"PK\x03\x04" + rng.randbytes(60),
+}
+
+# File precedenti tra cui scegliere quelli da copiare (con 'duplicates')
+MAX_COPY_SOURCES = 32
+
+# --- IMMAGINE ---
+
+def _align_up(value, alignment):
+    return value + (-value % alignment) if alignment > 1 else value
+
+def build_image(path, size, count, seed, alignment=0, types=None, noise=256 * KB,
+                zero_runs=0.2, fragmented=0.0, decoys=0.0, duplicates=0.0):
+    """
+    Scrive in 'path' un'immagine sparsa di 'size' byte con 'count' file e
+    restituisce la lista dei PlantedFile in ordine di offset.
+
+    L'immagine è divisa in 'count' spazi uguali, uno per file: ogni file
+    inizia dopo fino a 'noise' byte di rumore e, con probabilità 'zero_runs',
+    una zona di zeri. Con 'alignment' i file (e i frammenti) iniziano a
+    multipli di quel valore. Con probabilità 'fragmented' un file viene
+    diviso in due frammenti separati da rumore; con probabilità 'decoys'
+    il rumore prima di un file contiene un'esca (DECOYS) di un tipo a caso,
+    che non fa parte della verità di riferimento; con probabilità
+    'duplicates' un file è la copia identica di uno dei MAX_COPY_SOURCES
+    file precedenti più piccoli di 2 MB. I file vengono accorciati
+    per entrare nel loro spazio e omessi se non c'è posto nemmeno per la
+    dimensione minima del tipo.
+    """
+    rng = random.Random(seed)
+    types = list(types or GENERATORS)
+    slot = size // max(count, 1)
+    planted = []
+    copies = []  # (tipo, dati) degli ultimi file piantati, per le copie
+    with open(path, "wb") as f:
+        f.truncate(size)
+        for i in range(count):
+            slot_start, slot_end = i * slot, (i + 1) * slot
+            pos = slot_start
+            gap = rng.randrange(noise + 1) if noise else 0
+            f.seek(pos)
+            f.write(rng.randbytes(gap))
+            if decoys and gap >= 128 and rng.random() < decoys:
+                f.seek(pos + rng.randrange(gap - 64))
+                f.write(DECOYS[rng.choice(sorted(DECOYS))](rng))
+                f.seek(pos + gap)
+            pos += gap
+            if rng.random() < zero_runs:
+                zeros = rng.randrange(64 * KB, max(64 * KB, min(8 * MB, slot // 4)) + 1)
+                f.write(bytes(zeros))
+                pos += zeros
+            pos = _align_up(pos, alignment)
+
+            file_type = types[i % len(types)]
+            low, high = SIZE_RANGES[file_type]
+            room = slot_end - pos - 2 * noise - 64 * KB  # Spazio per il rumore tra i frammenti e le strutture
+            if room < low:
+                continue
+            fitting = [copy for copy in copies if len(copy[1]) <= room]
+            if duplicates and fitting and rng.random() < duplicates:
+                file_type, data = rng.choice(fitting)
+            else:
+                data = GENERATORS[file_type](rng, rng.randrange(low, min(high, room) + 1))
+                if len(data) <= 2 * MB:
+                    copies = (copies + [(file_type, data)])[-MAX_COPY_SOURCES:]
+
+            fragments = [(pos, len(data))]
+            if rng.random() < fragmented and len(data) >= 2 * KB:
+                split = _align_up(rng.randrange(len(data) // 4, 3 * len(data) // 4), max(alignment, 512))
+                split = min(split, len(data) - 1)
+                second = _align_up(pos + split + rng.randrange(4 * KB, noise + 8 * KB), alignment)
+                fragments = [(pos, split), (second, len(data) - split)]
+            if fragments[-1][0] + fragments[-1][1] > slot_end:
+                continue
+            written = 0
+            for index, (offset, length) in enumerate(fragments):
+                if index:
+                    f.seek(fragments[index - 1][0] + fragments[index - 1][1])
+                    f.write(rng.randbytes(offset - f.tell()))
+                f.seek(offset)
+                f.write(data[written:written + length])
+                written += length
+            planted.append(PlantedFile(pos, len(data), file_type, fragments))
+    return planted
+
+def save_manifest(path, planted, seed, **options):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "options": options, "files": [list(p) for p in planted]}, f)
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return [PlantedFile(offset, size, file_type, [tuple(fragment) for fragment in fragments])
+            for offset, size, file_type, fragments in manifest["files"]]
+
+# --- CONFRONTO CON LA VERITÀ DI RIFERIMENTO ---
+
+def score(planted, records):
+    """
+    Confronta i file recuperati (offset, dimensione, tipo) con quelli piantati.
+    Un file è recuperato correttamente se offset, dimensione e tipo coincidono
+    con un file non frammentato. Restituisce un dizionario con precisione,
+    richiamo, conteggi per tipo e i file frammentati trovati: solo l'inizio
+    oppure ricomposti (offset e dimensione totale coincidono).
+    """
+    contiguous = {(p.offset, p.size, p.file_type) for p in planted if len(p.fragments) == 1}
+    fragmented = {p.offset for p in planted if len(p.fragments) > 1}
+    found = {(offset, size, file_type) for offset, size, file_type in records}
+    exact = contiguous & found
+    per_type = {}
+    for file_type in GENERATORS:
+        expected = sum(1 for item in contiguous if item[2] == file_type)
+        hit = sum(1 for item in exact if item[2] == file_type)
+        per_type[file_type] = (expected, hit)
+    return {
+        "precision": len(exact) / len(found) if found else 1.0,
+        "recall": len(exact) / len(contiguous) if contiguous else 1.0,
+        "exact": len(exact),
+        "false_positives": len(found) - len(exact) - len(fragmented & {r[0] for r in found}),
+        "fragmented": len(fragmented),
+        "fragmented_started": len(fragmented & {r[0] for r in found}),
+        "fragmented_exact": sum(1 for p in planted if len(p.fragments) > 1
+                                and (p.offset, p.size, p.file_type) in found),
+        "per_type": per_type,
+    }
@@ -0,0 +1,419 @@
+"""
+Immagini disco sintetiche con tabella delle partizioni e file system.
+
+build_volume_image() scrive un file sparso con una tabella GPT (oppure MBR,
+con l'ultima partizione logica dentro una partizione estesa) e tre
+partizioni formattate FAT32, exFAT e NTFS, più uno spazio libero fuori
+dalle partizioni alla fine del disco. In ogni file system vengono scritti
+file validi (vedi synthetic.GENERATORS) e altri dati occupati (rumore
+casuale): i file "attivi" hanno i cluster segnati come occupati nella FAT,
+nella bitmap di allocazione di exFAT o nel $Bitmap di NTFS e una voce nella
+directory; i file "cancellati" restano sul disco in cluster liberi, con la
+voce di directory (o il record della MFT) segnata come cancellata. Alcuni
+file cancellati finiscono anche nello spazio fuori dalle partizioni.
+
+Senza mkfs a disposizione i file system sono scritti qui, con le strutture
+che servono a un lettore: settori di avvio, FAT, bitmap, directory radice,
+record della MFT con le liste delle run. Lo stesso seme produce la stessa
+immagine, byte per byte.
+"""
+import random
+import struct
+import uuid
+import zlib
+from array import array
+from collections import namedtuple
+
+from synthetic import GENERATORS, KB, MB, SIZE_RANGES
+
+SECTOR = 512
+# Inizio della prima partizione, come i partizionatori moderni
+FIRST_PARTITION = 1 * MB
+# Parte del disco lasciata fuori dalle partizioni, alla fine
+TAIL_SPACE = 1 / 16
+
+# Un file piantato: offset e dimensione, tipo, se è ancora presente nel file system
+# (False = cancellato) e numero della partizione (0 = fuori dalle partizioni)
+VolumeFile = namedtuple("VolumeFile", "offset size file_type live partition")
+
+GPT_BASIC_DATA = uuid.UUID("ebd0a0a2-b9e5-4433-87c0-68b6b72699c7")
+
+# --- CONTENUTO DEI FILE SYSTEM ---
+
+def _fill(rng, first, count, cluster_size, fill, types):
+    """
+    Sceglie cosa scrivere nei cluster [first, first + count): una sequenza di
+    (cluster, cluster occupati, dati, tipo del file o None per il rumore, attivo)
+    finché i dati occupano circa 'fill' dei cluster. Il resto resta libero e vuoto.
+    """
+    items = []
+    cluster = first
+    end = first + count
+    while cluster - first < count * fill:
+        choice = rng.random()
+        if choice < 0.3:
+            data, file_type, live = rng.randbytes(rng.randrange(64 * KB, 2 * MB)), None, True
+        else:
+            file_type = rng.choice(types)
+            low, high = SIZE_RANGES[file_type]
+            data, live = GENERATORS[file_type](rng, rng.randrange(low, min(high, 1 * MB))), choice < 0.75
+        clusters = -(-len(data) // cluster_size)
+        if cluster + clusters > end:
+            break
+        items.append((cluster, clusters, data, file_type, live))
+        # Qualche cluster libero tra un file e l'altro, come su un disco usato
+        cluster += clusters + rng.randrange(0, 8)
+    return items
+
+def _write_items(f, items, heap, cluster_first, cluster_size, partition, planted):
+    for cluster, _, data, file_type, live in items:
+        offset = heap + (cluster - cluster_first) * cluster_size
+        f.seek(offset)
+        f.write(data)
+        if file_type is not None:
+            planted.append(VolumeFile(offset, len(data), file_type, live, partition))
+
+def _files(items):
+    """(numero, cluster, dimensione, tipo, attivo) dei file, numerati da 1."""
+    return [(number, cluster, len(data), file_type, live)
+            for number, (cluster, _, data, file_type, live) in enumerate(
+                (item for item in items if item[3] is not None), 1)]
+
+def _fat_chain(fat, first, count):
+    for cluster in range(first, first + count - 1):
+        fat[cluster] = cluster + 1
+    fat[first + count - 1] = 0x0FFFFFFF
+
+# --- FAT32 ---
+
+def write_fat32(f, start, size, rng, fill, types, partition, planted):
+    sectors = size // SECTOR
+    per_cluster = 8
+    while per_cluster > 1 and (sectors // per_cluster) < 70000:
+        per_cluster //= 2  # Almeno 65525 cluster, altrimenti non sarebbe FAT32
+    cluster_size = per_cluster * SECTOR
+    reserved = 32
+    fat_sectors = -(-(sectors // per_cluster + 2) * 4 // SECTOR)
+    data_sector = reserved + 2 * fat_sectors
+    count = (sectors - data_sector) // per_cluster
+    heap = start + data_sector * SECTOR
+
+    items = _fill(rng, 2 + 4, count - 4, cluster_size, fill, types)
+    files = _files(items)
+    root_clusters = 4  # La directory radice: i cluster 2-5
+    fat = array("I", bytes(4 * (count + 2)))
+    fat[0], fat[1] = 0x0FFFFFF8, 0x0FFFFFFF
+    _fat_chain(fat, 2, root_clusters)
+    for cluster, clusters, _, _, live in items:
+        if live:
+            _fat_chain(fat, cluster, clusters)
+
+    boot = bytearray(SECTOR)
+    boot[0:3] = b"\xeb\x58\x90"
+    boot[3:11] = b"MSWIN4.1"
+    struct.pack_into("<HBHBHHBHHHII", boot, 11, SECTOR, per_cluster, reserved, 2, 0, 0, 0xF8, 0, 63, 255,
+                     start // SECTOR, sectors)
+    struct.pack_into("<IHHIHH", boot, 36, fat_sectors, 0, 0, 2, 1, 6)
+    struct.pack_into("<BBBI11s8s", boot, 64, 0x80, 0, 0x29, rng.getrandbits(32), b"NO NAME    ", b"FAT32   ")
+    boot[510:512] = b"\x55\xaa"
+    fsinfo = bytearray(SECTOR)
+    struct.pack_into("<I", fsinfo, 0, 0x41615252)
+    struct.pack_into("<III", fsinfo, 484, 0x61417272, 0xFFFFFFFF, 0xFFFFFFFF)
+    fsinfo[510:512] = b"\x55\xaa"
+
+    root = bytearray(root_clusters * cluster_size)
+    for i, (number, cluster, length, file_type, live) in enumerate(files[:len(root) // 32 - 1]):
+        name = f"FILE{number:04}".encode() + file_type[:3].upper().ljust(3).encode()
+        if not live:
+            name = b"\xe5" + name[1:]
+        struct.pack_into("<11sB8xH4xHI", root, 32 * i, name, 0x20, cluster >> 16, cluster & 0xFFFF, length)
+
+    for sector, data in ((0, boot), (1, fsinfo), (6, boot), (7, fsinfo)):
+        f.seek(start + sector * SECTOR)
+        f.write(data)
+    for copy in range(2):
+        f.seek(start + (reserved + copy * fat_sectors) * SECTOR)
+        f.write(fat.tobytes())
+    f.seek(heap)
+    f.write(root)
+    _write_items(f, items, heap, 2, cluster_size, partition, planted)
+
+# --- exFAT ---
+
+def _exfat_checksum(entries):
+    checksum = 0
+    for i, byte in enumerate(entries):
+        if i in (2, 3):
+            continue
+        checksum = ((checksum >> 1) | (checksum << 15 & 0x8000)) + byte & 0xFFFF
+    return checksum
+
+def _exfat_name_hash(name):
+    checksum = 0
+    for byte in name.upper().encode("utf-16-le"):
+        checksum = ((checksum >> 1) | (checksum << 15 & 0x8000)) + byte & 0xFFFF
+    return checksum
+
+def _exfat_file_entries(name, cluster, length, live):
+    """Voci di directory di un file (file, stream extension, nome) con i cluster contigui."""
+    encoded = name.encode("utf-16-le")
+    entries = bytearray(96)
+    struct.pack_into("<BBHH", entries, 0, 0x85, 2, 0, 0x20)
+    struct.pack_into("<BBBBHQII", entries, 32, 0xC0, 0x03, 0, len(name), _exfat_name_hash(name), length, 0,
+                     cluster)
+    struct.pack_into("<Q", entries, 56, length)
+    struct.pack_into("<BB30s", entries, 64, 0xC1, 0, encoded)
+    struct.pack_into("<H", entries, 2, _exfat_checksum(entries))
+    if not live:
+        for pos in range(0, 96, 32):
+            entries[pos] &= 0x7F  # Voci cancellate: bit "in uso" spento
+    return bytes(entries)
+
+def write_exfat(f, start, size, rng, fill, types, partition, planted):
+    sectors = size // SECTOR
+    cluster_shift = 3
+    cluster_size = SECTOR << cluster_shift
+    fat_offset = 128
+    fat_length = -(-(sectors // (1 << cluster_shift) + 2) * 4 // SECTOR)
+    heap_offset = fat_offset + fat_length
+    heap_offset += -heap_offset % (1 << cluster_shift)
+    count = (sectors - heap_offset) >> cluster_shift
+    heap = start + heap_offset * SECTOR
+
+    bitmap_clusters = -(-count // 8 // cluster_size) or 1
+    root_cluster = 2 + bitmap_clusters
+    root_clusters = 8
+    items = _fill(rng, root_cluster + root_clusters, count - bitmap_clusters - root_clusters, cluster_size, fill,
+                  types)
+    files = _files(items)
+
+    fat = array("I", bytes(4 * (count + 2)))
+    fat[0], fat[1] = 0xFFFFFFF8, 0xFFFFFFFF
+    _fat_chain(fat, 2, bitmap_clusters)
+    _fat_chain(fat, root_cluster, root_clusters)
+    for cluster in (2 + bitmap_clusters - 1, root_cluster + root_clusters - 1):
+        fat[cluster] = 0xFFFFFFFF
+    used = bytearray(-(-count // 8))
+    allocated = [(2, bitmap_clusters), (root_cluster, root_clusters)]
+    allocated += [(cluster, clusters) for cluster, clusters, _, _, live in items if live]
+    for cluster, clusters in allocated:
+        for c in range(cluster - 2, cluster - 2 + clusters):
+            used[c >> 3] |= 1 << (c & 7)
+
+    boot = bytearray(SECTOR)
+    boot[0:3] = b"\xeb\x76\x90"
+    boot[3:11] = b"EXFAT   "
+    struct.pack_into("<QQIIIIIIHHBBBB", boot, 64, start // SECTOR, sectors, fat_offset, fat_length, heap_offset,
+                     count, root_cluster, rng.getrandbits(32), 0x0100, 0, 9, cluster_shift, 1, 0x80)
+    boot[510:512] = b"\x55\xaa"
+
+    root = bytearray(root_clusters * cluster_size)
+    struct.pack_into("<B19xIQ", root, 0, 0x81, 2, len(used))
+    pos = 32
+    for number, cluster, length, file_type, live in files:
+        if pos + 96 > len(root):
+            break
+        root[pos:pos + 96] = _exfat_file_entries(f"file{number:04}.{file_type}"[:15], cluster, length, live)
+        pos += 96
+
+    f.seek(start)
+    f.write(boot)
+    f.seek(start + fat_offset * SECTOR)
+    f.write(fat.tobytes())
+    f.seek(heap)
+    f.write(used)
+    f.seek(heap + (root_cluster - 2) * cluster_size)
+    f.write(root)
+    _write_items(f, items, heap, 2, cluster_size, partition, planted)
+
+# --- NTFS ---
+
+MFT_RECORD = 1024
+SYSTEM_RECORDS = 16
+
+def _ntfs_runs(runs):
+    """Lista delle run [(LCN, cluster), ...] codificata come in un attributo non residente."""
+    out = bytearray()
+    previous = 0
+    for lcn, count in runs:
+        length = count.to_bytes((count.bit_length() + 8) // 8, "little")
+        delta = lcn - previous
+        offset = delta.to_bytes((delta.bit_length() + 8) // 8 or 1, "little", signed=True)
+        out += bytes([len(offset) << 4 | len(length)]) + length + offset
+        previous = lcn
+    return bytes(out + b"\x00")
+
+def _ntfs_record(number, in_use, attributes):
+    """Record della MFT con gli attributi e le correzioni della sequenza di aggiornamento."""
+    record = bytearray(MFT_RECORD)
+    body = b"".join(attributes) + b"\xff\xff\xff\xff\x00\x00\x00\x00"
+    struct.pack_into("<4sHHQHHHHII", record, 0, b"FILE", 48, 3, 0, 1, 1, 56, 1 if in_use else 0,
+                     56 + len(body), MFT_RECORD)
+    struct.pack_into("<I", record, 44, number)
+    record[56:56 + len(body)] = body
+    usn = b"\x01\x00"
+    record[48:50] = usn
+    for i in (1, 2):
+        record[48 + 2 * i:50 + 2 * i] = record[i * 512 - 2:i * 512]
+        record[i * 512 - 2:i * 512] = usn
+    return bytes(record)
+
+def _ntfs_data(runs, length, cluster_size):
+    """Attributo $DATA non residente."""
+    encoded = _ntfs_runs(runs)
+    clusters = sum(count for _, count in runs)
+    attribute = bytearray(64) + encoded
+    attribute += bytes(-len(attribute) % 8)
+    struct.pack_into("<IIBBHHHQQHHIQQQ", attribute, 0, 0x80, len(attribute), 1, 0, 64, 0, 1, 0, clusters - 1,
+                     64, 0, 0, clusters * cluster_size, length, length)
+    return bytes(attribute)
+
+def _ntfs_file_name(name, length):
+    """Attributo $FILE_NAME residente nella directory radice (record 5)."""
+    encoded = name.encode("utf-16-le")
+    value = struct.pack("<Q32xQQIIBB", 5 | 5 << 48, length, length, 0x20, 0, len(name), 1) + encoded
+    attribute = bytearray(24) + value
+    attribute += bytes(-len(attribute) % 8)
+    struct.pack_into("<IIBBHHHIHBx", attribute, 0, 0x30, len(attribute), 0, 0, 0, 0, 2, len(value), 24, 1)
+    return bytes(attribute)
+
+def write_ntfs(f, start, size, rng, fill, types, partition, planted):
+    sectors = size // SECTOR - 1  # L'ultimo settore ospita la copia del settore di avvio
+    per_cluster = 8
+    cluster_size = per_cluster * SECTOR
+    count = sectors // per_cluster
+    mft_lcn = 16
+    bitmap_length = -(-count // 8)
+    bitmap_clusters = -(-bitmap_length // cluster_size)
+    # $Bitmap in due run, per provare la lettura della lista delle run
+    first_half = -(-bitmap_clusters // 2)
+    mft_records_max = SYSTEM_RECORDS + 4096
+    mft_clusters = mft_records_max * MFT_RECORD // cluster_size
+    bitmap_runs = [(mft_lcn + mft_clusters + 64, first_half)]
+    if bitmap_clusters > first_half:
+        bitmap_runs.append((mft_lcn + mft_clusters + 128 + first_half, bitmap_clusters - first_half))
+    data_first = max(lcn + n for lcn, n in bitmap_runs) + 16
+    items = _fill(rng, data_first, count - data_first, cluster_size, fill, types)
+    files = _files(items)[:mft_records_max - SYSTEM_RECORDS]
+
+    used = bytearray(bitmap_clusters * cluster_size)
+    allocated = [(0, 1), (mft_lcn, mft_clusters)] + bitmap_runs
+    allocated += [(cluster, clusters) for cluster, clusters, _, _, live in items if live]
+    for cluster, clusters in allocated:
+        for c in range(cluster, cluster + clusters):
+            used[c >> 3] |= 1 << (c & 7)
+
+    records = [_ntfs_record(number, True, []) for number in range(SYSTEM_RECORDS)]
+    records[0] = _ntfs_record(0, True, [_ntfs_data([(mft_lcn, mft_clusters)], mft_records_max * MFT_RECORD,
+                                                   cluster_size)])
+    records[6] = _ntfs_record(6, True, [_ntfs_file_name("$Bitmap", bitmap_length),
+                                        _ntfs_data(bitmap_runs, bitmap_length, cluster_size)])
+    for number, cluster, length, file_type, live in files:
+        clusters = -(-length // cluster_size)
+        records.append(_ntfs_record(SYSTEM_RECORDS + number - 1, live,
+                                    [_ntfs_file_name(f"file{number:04}.{file_type}", length),
+                                     _ntfs_data([(cluster, clusters)], length, cluster_size)]))
+
+    boot = bytearray(SECTOR)
+    boot[0:3] = b"\xeb\x52\x90"
+    boot[3:11] = b"NTFS    "
+    struct.pack_into("<HBH5xB2xHHI4x4xQQQbxxxbxxxQ", boot, 11, SECTOR, per_cluster, 0, 0xF8, 63, 255,
+                     start // SECTOR, sectors, mft_lcn, mft_lcn + mft_clusters // 2, -10, 1, rng.getrandbits(64))
+    boot[510:512] = b"\x55\xaa"
+
+    for offset in (start, start + sectors * SECTOR):
+        f.seek(offset)
+        f.write(boot)
+    f.seek(start + mft_lcn * cluster_size)
+    f.write(b"".join(records))
+    pos = 0
+    for lcn, clusters in bitmap_runs:
+        f.seek(start + lcn * cluster_size)
+        f.write(used[pos:pos + clusters * cluster_size])
+        pos += clusters * cluster_size
+    _write_items(f, items, start, 0, cluster_size, partition, planted)
+
+FORMATTERS = (("FAT32", write_fat32, 0x0C), ("exFAT", write_exfat, 0x07), ("NTFS", write_ntfs, 0x07))
+
+# --- TABELLA DELLE PARTIZIONI ---
+
+def _mbr_entry(kind, first, count):
+    return struct.pack("<B3sB3sII", 0, b"\xfe\xff\xff", kind, b"\xfe\xff\xff", first, min(count, 0xFFFFFFFF))
+
+def _write_mbr(f, partitions):
+    """MBR con le prime partizioni primarie e l'ultima logica, in una partizione estesa."""
+    sector = bytearray(SECTOR)
+    entries = [_mbr_entry(kind, start // SECTOR, size // SECTOR) for start, size, kind in partitions[:-1]]
+    start, size, kind = partitions[-1]
+    extended = start - FIRST_PARTITION
+    entries.append(_mbr_entry(0x0F, extended // SECTOR, (size + FIRST_PARTITION) // SECTOR))
+    for i, entry in enumerate(entries):
+        sector[446 + 16 * i:462 + 16 * i] = entry
+    sector[510:512] = b"\x55\xaa"
+    ebr = bytearray(SECTOR)
+    ebr[446:462] = _mbr_entry(kind, FIRST_PARTITION // SECTOR, size // SECTOR)
+    ebr[510:512] = b"\x55\xaa"
+    f.seek(0)
+    f.write(sector)
+    f.seek(extended)
+    f.write(ebr)
+
+def _write_gpt(f, disk_size, partitions, rng):
+    last = disk_size // SECTOR - 1
+    entries = bytearray(128 * 128)
+    for i, (start, size, _) in enumerate(partitions):
+        struct.pack_into("<16s16sQQQ72s", entries, 128 * i, GPT_BASIC_DATA.bytes_le, rng.randbytes(16),
+                         start // SECTOR, (start + size) // SECTOR - 1, 0,
+                         f"Dati {i + 1}".encode("utf-16-le"))
+    disk_guid = rng.randbytes(16)
+
+    def header(current, backup, entries_lba):
+        data = bytearray(92)
+        struct.pack_into("<8sIIIIQQQQ16sQIII", data, 0, b"EFI PART", 0x00010000, 92, 0, 0, current, backup, 34,
+                         last - 33, disk_guid, entries_lba, 128, 128, zlib.crc32(entries))
+        struct.pack_into("<I", data, 16, zlib.crc32(data))
+        return bytes(data) + bytes(SECTOR - 92)
+
+    protective = bytearray(SECTOR)
+    protective[446:462] = _mbr_entry(0xEE, 1, last)
+    protective[510:512] = b"\x55\xaa"
+    for offset, data in ((0, protective), (SECTOR, header(1, last, 2)), (2 * SECTOR, entries),
+                         ((last - 32) * SECTOR, entries), (last * SECTOR, header(last, 1, last - 32))):
+        f.seek(offset)
+        f.write(data)
+
+def build_volume_image(path, size, seed, scheme="gpt", fill=0.7, types=None, tail_files=8):
+    """
+    Scrive l'immagine in 'path' e restituisce (partizioni, file piantati):
+    le partizioni come (inizio, dimensione, file system), i file come VolumeFile.
+    """
+    rng = random.Random(seed)
+    types = sorted(types or ("jpg", "png", "pdf", "docx"))
+    usable = int(size * (1 - TAIL_SPACE)) - FIRST_PARTITION
+    part_size = (usable // len(FORMATTERS) - FIRST_PARTITION) // MB * MB
+    planted = []
+    partitions = []
+    with open(path, "wb") as f:
+        f.truncate(size)
+        start = FIRST_PARTITION
+        for number, (name, formatter, kind) in enumerate(FORMATTERS, 1):
+            formatter(f, start, part_size, rng, fill, types, number, planted)
+            partitions.append((start, part_size, kind, name))
+            start += part_size + FIRST_PARTITION  # Lo spazio per l'EBR della partizione logica
+        if scheme == "gpt":
+            _write_gpt(f, size, [p[:3] for p in partitions], rng)
+        else:
+            _write_mbr(f, [p[:3] for p in partitions])
+        # File cancellati di un vecchio partizionamento, fuori dalle partizioni
+        tail = start
+        for _ in range(tail_files):
+            file_type = rng.choice(types)
+            data = GENERATORS[file_type](rng, rng.randrange(SIZE_RANGES[file_type][0], 256 * KB))
+            tail += rng.randrange(1, 64) * 4 * KB
+            if tail + len(data) > size - 64 * KB:
+                break
+            f.seek(tail)
+            f.write(data)
+            planted.append(VolumeFile(tail, len(data), file_type, False, 0))
+            tail += len(data)
+    return [(start, part_size, name) for start, part_size, _, name in partitions], planted
@@ -0,0 +1,50 @@
+"""
+RecoverFlow: motore di file carving utilizzabile senza interfaccia grafica.
+
+Il pacchetto non dipende da PySide6: la GUI (recovery_app.py) e la riga di
+comando (python -m recoverflow) usano lo stesso motore.
+
+    from recoverflow import carve
+    records = carve("disco.img", "recuperati", workers=4)
+"""
+from .database import DATABASE_FORMAT, DATABASE_VERSION, default_cache_dir, load_signatures, parse_pattern
+from .dedup import DEDUP_INDEX_NAME, DEDUP_MODES, DedupIndex
+from .engine import (
+    DEFAULT_REGION_SIZE, FILE_NAME_PATTERN, CarvedFile, Carver, CarvingError, carve
+)
+from .index import INDEX_NAME, ScanIndex
+from .journal import JOURNAL_NAME, ScanJournal
+from .matcher import SIGNATURE_MATCHER, SignatureMatcher
+from .output import DEFAULT_WRITE_BACKLOG, DEFAULT_WRITER_THREADS, FileWriter
+from .profiling import (
+    INSTRUMENTATION_NAME, PROFILE_NAME, SNAPSHOT_INTERVAL, Instrumentation, SamplingProfiler, write_diagnostics
+)
+from .readers import (
+    DEFAULT_BLOCK_SIZE, DEFAULT_MAP_WINDOW, DEFAULT_QUEUE_DEPTH, MAX_BLOCK_SIZE, MIN_BLOCK_SIZE, SCAN_MODES,
+    SECTOR_SIZE, BlockReader, MappedReader, QueuedReader, SourceReader, open_reader
+)
+from .rescue import DEFAULT_RETRIES, ERROR_MAP_NAME, SectorRescue, load_error_map, write_error_map
+from .signatures import FILE_SIGNATURES, MAX_HEADER_LEN
+from .stats import REPORT_INTERVAL, ScanStats, ThrottledReporter, format_counts, format_duration
+from .validators import VALIDATORS
+from .volumes import (
+    Partition, ScanScope, detect_filesystem, format_partition, partition_ranges, read_partitions, unallocated_scope
+)
+
+__all__ = [
+    "carve", "Carver", "CarvedFile", "CarvingError", "DEFAULT_REGION_SIZE", "FILE_NAME_PATTERN",
+    "SignatureMatcher", "SIGNATURE_MATCHER", "FILE_SIGNATURES", "MAX_HEADER_LEN",
+    "load_signatures", "parse_pattern", "default_cache_dir", "DATABASE_FORMAT", "DATABASE_VERSION", "VALIDATORS",
+    "SourceReader", "BlockReader", "QueuedReader", "MappedReader", "open_reader",
+    "FileWriter", "DEFAULT_WRITER_THREADS", "DEFAULT_WRITE_BACKLOG", "ScanJournal", "JOURNAL_NAME",
+    "ScanIndex", "INDEX_NAME",
+    "SectorRescue", "ERROR_MAP_NAME", "DEFAULT_RETRIES", "load_error_map", "write_error_map",
+    "Partition", "ScanScope", "read_partitions", "detect_filesystem", "unallocated_scope", "partition_ranges",
+    "format_partition",
+    "DedupIndex", "DEDUP_INDEX_NAME", "DEDUP_MODES",
+    "ScanStats", "ThrottledReporter", "REPORT_INTERVAL", "format_counts", "format_duration",
+    "Instrumentation", "SamplingProfiler", "write_diagnostics", "INSTRUMENTATION_NAME", "PROFILE_NAME",
+    "SNAPSHOT_INTERVAL",
+    "DEFAULT_BLOCK_SIZE", "MIN_BLOCK_SIZE", "MAX_BLOCK_SIZE", "DEFAULT_MAP_WINDOW", "DEFAULT_QUEUE_DEPTH",
+    "SCAN_MODES", "SECTOR_SIZE",
+]
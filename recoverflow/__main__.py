@@ -0,0 +1,7 @@
+"""Permette di avviare la riga di comando con 'python -m recoverflow'."""
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
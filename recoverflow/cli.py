@@ -0,0 +1,320 @@
+"""
+Riga di comando di RecoverFlow: esegue il carving senza interfaccia grafica.
+
+Uso: python -m recoverflow SORGENTE CARTELLA_OUTPUT [--workers N] [--block-size MB]
+                           [--mode auto|stream|queued|mmap] [--queue-depth N] [--direct]
+                           [--retries N] [--no-rescue] [--unallocated] [--partition N]
+                           [--region-size MB] [--writer-threads N]
+                           [--align BYTES] [--no-resume] [--no-skip-empty] [--instrument]
+                           [--snapshot-interval S] [--profile] [--signatures FILE] [--no-validate]
+                           [--dedup off|skip|link] [--no-reassemble]
+                           [--index-only | --from-index INDICE [--types TIPI]] [--quiet]
+       python -m recoverflow SORGENTE --list-partitions
+
+Se CARTELLA_OUTPUT contiene il registro di una scansione interrotta della
+stessa sorgente, la scansione riprende da dove si era fermata.
+
+I dischi fisici vengono letti con più letture in coda (--mode queued):
+--queue-depth blocchi restano in lettura mentre il precedente viene
+esaminato, perché un SSD NVMe raggiunge la sua banda solo con molte letture
+in corso. Con --direct la sorgente viene letta con O_DIRECT, senza passare
+dalla cache del sistema (anche le immagini disco, in modalità queued).
+
+Un settore illeggibile non ferma la scansione: viene ritentato --retries
+volte con attese crescenti e poi sostituito da zeri; dopo due settori
+illeggibili di fila la zona danneggiata viene saltata a passi crescenti.
+Zone illeggibili e saltate finiscono in CARTELLA_OUTPUT/
+recoverflow_errors.map, nel formato delle mapfile di GNU ddrescue.
+--no-rescue ferma la scansione al primo errore di lettura.
+
+Con --unallocated gli header vengono cercati solo nello spazio non
+allocato: fuori dalle partizioni (MBR o GPT) e nei cluster liberi dei file
+system FAT12/16/32, exFAT e NTFS; i file ancora presenti si copiano dal file
+system. Le partizioni con un file system non riconosciuto vengono scandite
+per intero. --partition N limita la scansione alla partizione N (con
+--unallocated, ai suoi cluster liberi); --list-partitions elenca le
+partizioni della sorgente con i loro numeri.
+
+Con --signatures le firme di un database JSON (vedi recoverflow.database)
+si aggiungono a quelle predefinite; il database viene compilato una volta
+sola e l'indice riusato finché il file non cambia.
+
+Prima di recuperare un file i controlli strutturali della sua firma (es.
+segmenti JPEG, CRC dei chunk PNG) scartano i falsi positivi; --no-validate
+li disattiva.
+
+I file JPEG e ZIP (DOCX, XLSX...) divisi in due frammenti dal file system
+vengono ricomposti cercando il secondo frammento; --no-reassemble li
+recupera contigui come gli altri file.
+
+Con --index-only la sorgente viene letta una volta sola e i file trovati
+non vengono salvati ma elencati in CARTELLA_OUTPUT/.recoverflow_index;
+--from-index INDICE salva poi i file dell'indice (anche solo i tipi di
+--types, anche in un'altra cartella) leggendo dalla sorgente solo i loro
+byte, senza scansionarla di nuovo.
+
+Con --dedup skip i file con un contenuto già recuperato (anche da scansioni
+precedenti nella stessa CARTELLA_OUTPUT) non vengono salvati, con --dedup
+link diventano collegamenti fisici al primo; l'indice degli hash è in
+CARTELLA_OUTPUT/.recoverflow_hashes.sqlite.
+
+Con --instrument i tempi di ogni fase vengono scritti in CARTELLA_OUTPUT/
+recoverflow_instrumentation.jsonl (un'istantanea ogni --snapshot-interval
+secondi e il riepilogo finale); con --profile il profilo a campionamento
+in CARTELLA_OUTPUT/recoverflow_profile.txt.
+
+Codici di uscita: 0 scansione completata, 1 errore, 130 interrotta (Ctrl+C).
+"""
+import argparse
+import os
+import sys
+
+from .database import load_signatures
+from .dedup import DEDUP_MODES
+from .engine import DEFAULT_REGION_SIZE, Carver, CarvingError, _source_size
+from .index import INDEX_NAME
+from .output import DEFAULT_WRITER_THREADS
+from .profiling import (
+    INSTRUMENTATION_NAME, SNAPSHOT_INTERVAL, Instrumentation, SamplingProfiler, write_diagnostics
+)
+from .readers import (
+    DEFAULT_BLOCK_SIZE, DEFAULT_QUEUE_DEPTH, MAX_BLOCK_SIZE, MIN_BLOCK_SIZE, QUEUED_READS, SCAN_MODES
+)
+from .rescue import DEFAULT_RETRIES, ERROR_MAP_NAME
+from .stats import format_counts, format_duration
+from .volumes import format_partition, read_partitions
+
+MB = 1024 * 1024
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_INTERRUPTED = 130
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="recoverflow",
+        description="Recupera i file da un disco o da un'immagine disco tramite file carving."
+    )
+    parser.add_argument("source", help="disco fisico (es. /dev/sdb, \\\\.\\PhysicalDrive1) o immagine disco")
+    parser.add_argument("output_dir", nargs="?", help="cartella in cui salvare i file recuperati")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processi per la scansione parallela (default 1)")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE // MB,
+                        help=f"dimensione dei blocchi letti in MB, tra {MIN_BLOCK_SIZE // MB} e "
+                             f"{MAX_BLOCK_SIZE // MB} (default {DEFAULT_BLOCK_SIZE // MB})")
+    parser.add_argument("--mode", choices=SCAN_MODES, default="auto",
+                        help="modalità di lettura: mmap per i file regolari, letture in coda per i dischi "
+                             "(default auto)")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH, metavar="N",
+                        help=f"letture di un blocco in corso insieme in modalità queued "
+                             f"(default {DEFAULT_QUEUE_DEPTH})")
+    parser.add_argument("--direct", action="store_true",
+                        help="legge la sorgente con O_DIRECT, senza la cache del sistema (modalità queued)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, metavar="N",
+                        help=f"nuovi tentativi su un settore illeggibile prima di sostituirlo con zeri "
+                             f"(default {DEFAULT_RETRIES})")
+    parser.add_argument("--no-rescue", dest="rescue", action="store_false",
+                        help=f"ferma la scansione al primo errore di lettura invece di saltare i settori "
+                             f"illeggibili e registrarli in {ERROR_MAP_NAME}")
+    parser.add_argument("--unallocated", action="store_true",
+                        help="cerca i file solo nello spazio non allocato: fuori dalle partizioni e nei cluster "
+                             "liberi dei file system FAT, exFAT e NTFS")
+    parser.add_argument("--partition", type=int, metavar="N",
+                        help="scansiona solo la partizione N (vedi --list-partitions)")
+    parser.add_argument("--list-partitions", action="store_true",
+                        help="elenca partizioni e file system della sorgente ed esce")
+    parser.add_argument("--region-size", type=int, default=DEFAULT_REGION_SIZE // MB,
+                        help=f"dimensione delle regioni in MB nella scansione parallela "
+                             f"(default {DEFAULT_REGION_SIZE // MB})")
+    parser.add_argument("--writer-threads", type=int, default=DEFAULT_WRITER_THREADS,
+                        help=f"thread che scrivono i file recuperati, 0 per scrivere nel thread della "
+                             f"scansione (default {DEFAULT_WRITER_THREADS})")
+    parser.add_argument("--align", type=int, default=0, metavar="BYTES",
+                        help="cerca gli header solo agli offset multipli di BYTES, es. 512 (settore) o 4096 "
+                             "(cluster); 0 per cercarli a ogni byte (default 0)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="ricomincia da capo invece di riprendere una scansione interrotta")
+    parser.add_argument("--no-skip-empty", dest="skip_empty", action="store_false",
+                        help="cerca gli header anche nelle zone vuote (tutte zero o un solo byte ripetuto)")
+    parser.add_argument("--instrument", action="store_true",
+                        help=f"misura tempi, byte e latenza di ogni fase e li scrive in {INSTRUMENTATION_NAME}")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL, metavar="S",
+                        help=f"secondi tra due istantanee della strumentazione (default {SNAPSHOT_INTERVAL:g})")
+    parser.add_argument("--profile", action="store_true",
+                        help="registra un profilo a campionamento della scansione nella cartella di output")
+    parser.add_argument("--signatures", metavar="FILE",
+                        help="database JSON di firme da aggiungere a quelle predefinite")
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="recupera i file senza i controlli strutturali che scartano i falsi positivi")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="off",
+                        help="copie di file già recuperati: off le salva, skip le salta, link le collega "
+                             "al primo file con un hard link (default off)")
+    parser.add_argument("--no-reassemble", dest="reassemble", action="store_false",
+                        help="non ricomporre i file JPEG e ZIP divisi in due frammenti")
+    extract = parser.add_mutually_exclusive_group()
+    extract.add_argument("--index-only", action="store_true",
+                         help=f"non salvare i file trovati, elencali nell'indice {INDEX_NAME} della "
+                              f"cartella di output per estrarli in seguito con --from-index")
+    extract.add_argument("--from-index", metavar="INDICE",
+                         help="salva i file elencati nell'indice (il file o la cartella di output della "
+                              "scansione con --index-only) invece di scansionare la sorgente")
+    parser.add_argument("--types", metavar="TIPI",
+                        help="con --from-index, salva solo i file di questi tipi, es. jpg,png,pdf")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="mostra solo il riepilogo finale")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.list_partitions:
+        return list_partitions(args.source)
+    if args.output_dir is None:
+        print("ERRORE: manca la cartella di output.", file=sys.stderr)
+        return EXIT_ERROR
+    if not MIN_BLOCK_SIZE // MB <= args.block_size <= MAX_BLOCK_SIZE // MB:
+        print(f"ERRORE: --block-size deve essere tra {MIN_BLOCK_SIZE // MB} e {MAX_BLOCK_SIZE // MB} MB.",
+              file=sys.stderr)
+        return EXIT_ERROR
+    if args.region_size < 1:
+        print("ERRORE: --region-size deve essere almeno 1 MB.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.queue_depth < 1:
+        print("ERRORE: --queue-depth deve essere almeno 1.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.retries < 0:
+        print("ERRORE: --retries non può essere negativo.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.mode == "queued" and not QUEUED_READS:
+        print("ERRORE: --mode queued richiede os.preadv, non disponibile su questo sistema.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.direct and args.mode not in ("auto", "queued"):
+        print("ERRORE: --direct si usa solo con --mode auto o queued.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.align < 0:
+        print("ERRORE: --align non può essere negativo.", file=sys.stderr)
+        return EXIT_ERROR
+    if args.partition is not None and args.partition < 1:
+        print("ERRORE: le partizioni sono numerate da 1 (vedi --list-partitions).", file=sys.stderr)
+        return EXIT_ERROR
+    if args.types and not args.from_index:
+        print("ERRORE: --types si usa solo con --from-index.", file=sys.stderr)
+        return EXIT_ERROR
+    types = {name.strip() for name in args.types.split(",") if name.strip()} if args.types else None
+    signatures = None
+    if args.signatures:
+        try:
+            signatures = load_signatures(args.signatures)
+        except (OSError, ValueError) as e:
+            print(f"ERRORE: database delle firme non valido: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    # Messaggi e avanzamento vanno su stderr, stdout resta al riepilogo finale
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    last_percent = -1
+
+    def progress(done):
+        nonlocal last_percent
+        stats = carver.stats
+        if stats.percent != last_percent:
+            last_percent = stats.percent
+            log(f"Avanzamento: {stats.percent}% ({stats.rate / MB:.0f} MB/s, "
+                f"tempo rimanente {format_duration(stats.eta)})")
+
+    carver = Carver(args.source, args.output_dir, args.block_size * MB, args.mode,
+                    workers=args.workers, region_size=args.region_size * MB,
+                    writer_threads=args.writer_threads, log=log, progress=progress, resume=args.resume,
+                    skip_empty=args.skip_empty, alignment=args.align, signatures=signatures,
+                    validate=args.validate, dedup=args.dedup, reassemble=args.reassemble,
+                    index_only=args.index_only, queue_depth=args.queue_depth, direct=args.direct,
+                    rescue=args.rescue, retries=args.retries, unallocated=args.unallocated,
+                    partition=args.partition,
+                    instruments=Instrumentation(os.path.join(args.output_dir, INSTRUMENTATION_NAME),
+                                                args.snapshot_interval) if args.instrument else None)
+    profiler = SamplingProfiler() if args.profile else None
+    if signatures is not None:
+        log(f"Firme caricate da {args.signatures}: {len(signatures.signatures)} tipi di file.")
+    if args.from_index:
+        log(f"Estrazione dei file dell'indice {args.from_index} da {args.source}...")
+    else:
+        log(f"Avvio scansione su {args.source}...")
+    try:
+        if profiler is not None:
+            profiler.start()
+        records = carver.extract_index(args.from_index, types) if args.from_index else carver.carve()
+    except KeyboardInterrupt:
+        carver.stop()
+        if args.from_index:
+            print(f"Estrazione interrotta dall'utente. Salvati {len(carver.records)} file.", file=sys.stderr)
+        else:
+            found = "Trovati" if args.index_only else "Recuperati"
+            print(f"Scansione interrotta dall'utente. {found} {len(carver.records)} file: "
+                  f"rilancia lo stesso comando per riprenderla.", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except CarvingError as e:
+        print(f"ERRORE: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except PermissionError:
+        print("ERRORE: Permesso negato. Esegui il comando come amministratore/root.", file=sys.stderr)
+        return EXIT_ERROR
+    except FileNotFoundError:
+        print(f"ERRORE: Disco '{args.source}' non trovato.", file=sys.stderr)
+        return EXIT_ERROR
+    except OSError as e:
+        print(f"ERRORE di lettura: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if os.path.isdir(args.output_dir):
+            for path in write_diagnostics(args.output_dir, carver.stats, carver.instruments, profiler):
+                log(f"Diagnostica salvata in {path}")
+        elif profiler is not None:
+            profiler.stop()  # La cartella di output non è stata creata (es. sorgente mancante): niente da salvare
+    counts = f" ({format_counts(carver.stats.recovered)})" if records else ""
+    if args.index_only:
+        print(f"Scansione completata. Trovati {len(records)} file{counts}, elencati in "
+              f"{os.path.join(args.output_dir, INDEX_NAME)}: salvali con --from-index.")
+    elif args.from_index:
+        print(f"Estrazione completata. Salvati {len(records)} file{counts} in {args.output_dir}.")
+    else:
+        print(f"Scansione completata. Trovati {len(records)} file{counts} in {args.output_dir}.")
+    if carver.stats.duplicates:
+        action = "non salvate" if args.dedup == "skip" else "collegate al primo file"
+        print(f"Copie di file già recuperati, {action}: {format_counts(carver.stats.duplicates)}.")
+    if carver.stats.reassembled:
+        print(f"File frammentati ricomposti: {format_counts(carver.stats.reassembled)}.")
+    if carver.stats.fragmented:
+        print(f"File frammentati non ricomponibili, recuperati contigui: {format_counts(carver.stats.fragmented)}.")
+    if carver.stats.rejected:
+        print(f"Scartati dai controlli strutturali: {format_counts(carver.stats.rejected)}.")
+    if carver.stats.excluded:
+        print(f"Spazio escluso ({carver.scope.description}): {carver.stats.excluded / MB:.0f} MB su "
+              f"{carver.size / MB:.0f} MB (circa {format_duration(carver.stats.saved)} risparmiati).")
+    if carver.stats.skipped:
+        print(f"Zone vuote saltate: {carver.stats.skipped / MB:.0f} MB su {carver.size / MB:.0f} MB.")
+    if carver.stats.bad_ranges:
+        print(f"Settori illeggibili: {carver.stats.unreadable} byte sostituiti da zeri, "
+              f"{carver.stats.unread} byte saltati nelle zone danneggiate "
+              f"({carver.stats.read_errors} errori di lettura); "
+              f"mappa in {os.path.join(args.output_dir, ERROR_MAP_NAME)}.")
+    return EXIT_OK
+
+def list_partitions(source):
+    """Stampa le partizioni della sorgente con i numeri da usare con --partition."""
+    try:
+        with open(source, "rb", buffering=0) as f:
+            partitions = read_partitions(f, _source_size(f))
+    except PermissionError:
+        print("ERRORE: Permesso negato. Esegui il comando come amministratore/root.", file=sys.stderr)
+        return EXIT_ERROR
+    except FileNotFoundError:
+        print(f"ERRORE: Disco '{source}' non trovato.", file=sys.stderr)
+        return EXIT_ERROR
+    except OSError as e:
+        print(f"ERRORE di lettura: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    if not partitions:
+        print("Nessuna tabella delle partizioni né file system riconosciuto.")
+    for partition in partitions:
+        print(format_partition(partition))
+    return EXIT_OK
@@ -0,0 +1,243 @@
+"""
+Database delle firme in un file JSON: formato, caricamento e indice compilato in cache.
+
+Il file aggiunge firme a quelle predefinite (FILE_SIGNATURES) o le sostituisce:
+
+    {
+        "format": "recoverflow-signatures",
+        "version": 1,
+        "signatures": {
+            "gif": {"header": "'GIF8' ?? 'a'", "footer": "00 3B", "max_size": "20M"},
+            "tar": {"header": "'ustar'", "header_offset": 257, "max_size": "4G"},
+            "wav": null
+        }
+    }
+
+Gli header sono sequenze di byte esadecimali ("FF D8"), testo tra apici
+singoli ('ftyp'), byte qualsiasi ("??") e mezzi byte qualsiasi ("3?", "?F");
+'header_mask' aggiunge una maschera esplicita lunga quanto l'header (i bit a
+0 possono valere qualsiasi cosa). I primi due byte dell'header devono essere
+fissi. Le altre chiavi sono quelle di FILE_SIGNATURES: 'footer' (solo byte
+fissi), 'max_size' (byte, oppure "512K", "20M", "4G"), 'resolver',
+'footer_resolver', 'last_footer', più 'header_offset' (distanza dell'header
+dall'inizio del file), 'validator' (vedi validators.VALIDATORS),
+'fragments' (ricomposizione dei file frammentati, vedi
+fragments.REASSEMBLERS; richiede il footer) ed 'extension' (estensione dei
+file recuperati, se diversa dal nome). Una firma
+a null toglie quella predefinita con lo stesso nome. Un header che può
+finire con un byte zero impedisce di saltare i buchi dei file sparsi
+(SignatureMatcher.holes_safe): meglio togliere gli zeri finali dall'header.
+
+load_signatures() compila il database una volta sola: l'indice (firme già
+convalidate ed espressione regolare del SignatureMatcher) viene salvato nella
+cartella di cache con il nome dato dall'hash del file, e viene riusato
+finché il file non cambia.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from .matcher import SignatureMatcher
+from .signatures import FILE_SIGNATURES
+from .sizing import FOOTER_RESOLVERS, SIZE_RESOLVERS
+from .fragments import REASSEMBLERS
+from .validators import VALIDATORS
+
+DATABASE_FORMAT = "recoverflow-signatures"
+DATABASE_VERSION = 1
+# Da cambiare quando cambia il contenuto dell'indice: gli indici vecchi vengono ricompilati
+INDEX_VERSION = 1
+
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_KEYS = {"header", "header_mask", "header_offset", "footer", "max_size", "resolver", "footer_resolver",
+         "last_footer", "validator", "fragments", "extension"}
+_PATTERN_TOKEN = re.compile(r"\s*(?:'([^']*)'|([0-9A-Fa-f?]{2}))")
+# Chiavi dell'indice che contengono byte (salvate in esadecimale)
+_BYTES_KEYS = ("header", "header_mask", "footer")
+
+def parse_pattern(text):
+    """"'GIF8' ?? 'a'" -> (header, maschera oppure None se tutti i byte sono fissi)."""
+    header = bytearray()
+    mask = bytearray()
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _PATTERN_TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError(f"sequenza di byte non valida da '{text[pos:].strip()}'")
+        literal, byte = match.groups()
+        if literal is not None:
+            data = literal.encode("latin-1")
+            header += data
+            mask += b"\xff" * len(data)
+        else:
+            high, low = byte
+            header.append(int(byte.replace("?", "0"), 16))
+            mask.append((0xF0 if high != "?" else 0) | (0x0F if low != "?" else 0))
+        pos = match.end()
+    return bytes(header), (bytes(mask) if mask.count(0xFF) != len(mask) else None)
+
+def parse_size(value):
+    """20971520, "20M", "4G" -> byte."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        text = value.strip().upper().rstrip("B")
+        try:
+            if text and text[-1] in SIZE_UNITS:
+                return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+            return int(text)
+        except ValueError:
+            pass
+    raise ValueError(f"dimensione non valida: {value!r}")
+
+def parse_entry(entry):
+    """Convalida una firma del file e la converte nel formato di FILE_SIGNATURES."""
+    if not isinstance(entry, dict):
+        raise ValueError("la firma deve essere un oggetto")
+    unknown = set(entry) - _KEYS
+    if unknown:
+        raise ValueError(f"chiavi sconosciute: {', '.join(sorted(unknown))}")
+    if "header" not in entry or "max_size" not in entry:
+        raise ValueError("'header' e 'max_size' sono obbligatori")
+    header, mask = parse_pattern(entry["header"])
+    if "header_mask" in entry:
+        explicit, _ = parse_pattern(entry["header_mask"])
+        if len(explicit) != len(header):
+            raise ValueError("'header_mask' deve essere lunga quanto l'header")
+        mask = bytes(a & b for a, b in zip(mask or b"\xff" * len(header), explicit))
+    if len(header) < 2 or (mask is not None and mask[:2] != b"\xff\xff"):
+        raise ValueError("i primi due byte dell'header devono essere fissi")
+    sigs = {"header": header, "footer": None, "max_size": parse_size(entry["max_size"])}
+    if mask is not None:
+        sigs["header_mask"] = mask
+    if entry.get("footer"):
+        footer, footer_mask = parse_pattern(entry["footer"])
+        if footer_mask is not None:
+            raise ValueError("il footer non può contenere byte qualsiasi")
+        sigs["footer"] = footer
+    offset = entry.get("header_offset", 0)
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise ValueError("'header_offset' deve essere un intero non negativo")
+    if offset:
+        sigs["header_offset"] = offset
+    for key, registry in (("resolver", SIZE_RESOLVERS), ("footer_resolver", FOOTER_RESOLVERS),
+                          ("validator", VALIDATORS), ("fragments", REASSEMBLERS)):
+        if entry.get(key) is not None:
+            if entry[key] not in registry:
+                raise ValueError(f"'{key}' sconosciuto: {entry[key]} (disponibili: {', '.join(registry) or '-'})")
+            sigs[key] = entry[key]
+    if "fragments" in sigs and not sigs["footer"]:
+        raise ValueError("'fragments' richiede il footer")
+    if entry.get("last_footer"):
+        sigs["last_footer"] = True
+    if entry.get("extension") is not None:
+        extension = entry["extension"]
+        if not isinstance(extension, str) or not extension.isalnum():
+            raise ValueError(f"estensione non valida: {extension!r}")
+        sigs["extension"] = extension
+    if sigs["max_size"] <= 0:
+        raise ValueError("'max_size' deve essere positivo")
+    return sigs
+
+def parse_database(data, name="database"):
+    """Contenuto JSON di un database -> firme predefinite più quelle del database."""
+    try:
+        database = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"{name}: JSON non valido: {e}") from None
+    if not isinstance(database, dict) or database.get("format") != DATABASE_FORMAT:
+        raise ValueError(f"{name}: non è un database di firme ('format' deve essere \"{DATABASE_FORMAT}\")")
+    if database.get("version") != DATABASE_VERSION:
+        raise ValueError(f"{name}: versione {database.get('version')} non supportata (attesa {DATABASE_VERSION})")
+    entries = database.get("signatures")
+    if not isinstance(entries, dict):
+        raise ValueError(f"{name}: 'signatures' deve essere un oggetto")
+    signatures = dict(FILE_SIGNATURES)
+    for file_type, entry in entries.items():
+        if entry is None:
+            signatures.pop(file_type, None)
+            continue
+        if not re.fullmatch(r"[A-Za-z0-9_]+", file_type):
+            raise ValueError(f"{name}: nome di firma non valido: {file_type!r} (solo lettere, cifre e _)")
+        try:
+            signatures[file_type] = parse_entry(entry)
+        except ValueError as e:
+            raise ValueError(f"{name}: firma '{file_type}': {e}") from None
+    return signatures
+
+def default_cache_dir():
+    """Cartella degli indici compilati: RECOVERFLOW_CACHE_DIR, altrimenti la cache dell'utente."""
+    if os.environ.get("RECOVERFLOW_CACHE_DIR"):
+        return os.environ["RECOVERFLOW_CACHE_DIR"]
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "recoverflow")
+
+def _index_key(data):
+    # Anche le firme predefinite fanno parte dell'indice: una nuova versione lo invalida
+    digest = hashlib.sha256(data)
+    digest.update(f"{INDEX_VERSION}:{FILE_SIGNATURES!r}".encode())
+    return digest.hexdigest()
+
+def _encode(signatures):
+    return {file_type: {key: value.hex() if key in _BYTES_KEYS and value is not None else value
+                        for key, value in sigs.items()}
+            for file_type, sigs in signatures.items()}
+
+def _decode(signatures):
+    return {file_type: {key: bytes.fromhex(value) if key in _BYTES_KEYS and value is not None else value
+                        for key, value in sigs.items()}
+            for file_type, sigs in signatures.items()}
+
+def _read_index(path, key):
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("key") == key:
+            return SignatureMatcher(_decode(index["signatures"]), pattern=index["pattern"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # Indice assente o illeggibile: viene ricompilato
+    return None
+
+def _write_index(path, key, matcher):
+    # Scrittura atomica: un altro processo non legge mai un indice a metà
+    index = {"key": key, "signatures": _encode(matcher.signatures), "pattern": matcher.pattern}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    except OSError:
+        return  # Cache non scrivibile: l'indice viene ricompilato al prossimo avvio
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        # Il file temporaneo non deve restare nella cache: a ogni avvio fallito se ne aggiungerebbe un altro
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def load_signatures(path, cache_dir=None):
+    """
+    Carica il database in 'path' e restituisce il SignatureMatcher delle firme
+    predefinite più quelle del database, da passare a Carver(signatures=...).
+    Solleva ValueError se il database non è valido, OSError se non è leggibile.
+    Con cache_dir=False l'indice non viene né letto né salvato.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    key = _index_key(data)
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    index_path = os.path.join(cache_dir, f"signatures-{key[:32]}.json") if cache_dir is not False else None
+    if index_path is not None:
+        matcher = _read_index(index_path, key)
+        if matcher is not None:
+            return matcher
+    matcher = SignatureMatcher(parse_database(data, os.path.basename(path)))
+    if index_path is not None:
+        _write_index(index_path, key, matcher)
+    return matcher
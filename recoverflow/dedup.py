@@ -0,0 +1,163 @@
+"""Indice dei contenuti già recuperati: lo stesso file non viene salvato due volte."""
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+DEDUP_INDEX_NAME = ".recoverflow_hashes.sqlite"
+# "off": ogni copia viene salvata; "skip": le copie non vengono salvate;
+# "link": le copie diventano collegamenti fisici (hard link) al primo file
+DEDUP_MODES = ("off", "skip", "link")
+# Byte letti per volta quando si calcola l'hash di un file già scritto
+HASH_CHUNK_SIZE = 1024 * 1024
+
+@contextmanager
+def _sqlite_errors():
+    # Per chi scrive i file un indice non scrivibile è un errore di I/O come gli altri
+    import sqlite3
+    try:
+        yield
+    except sqlite3.Error as e:
+        raise OSError(f"indice dei duplicati: {e}") from None
+
+def file_digest(path):
+    """SHA-256 del contenuto del file 'path'."""
+    digest = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+class DedupIndex:
+    """
+    Indice persistente SHA-256 -> file recuperato, in un database SQLite
+    nella cartella di output (DEDUP_INDEX_NAME): resta valido tra una
+    scansione e l'altra, anche di sorgenti diverse salvate nella stessa
+    cartella. Ogni ricerca è una lettura della chiave primaria, quindi il
+    costo cresce appena con il numero di file (milioni di righe).
+
+    claim() registra il contenuto di un nuovo file oppure restituisce il
+    file che lo contiene già. Un file dell'indice che non esiste più o ha
+    cambiato dimensione (eliminato o sostituito dall'utente) non conta: il
+    suo posto passa al nuovo file. L'indice è usato da un solo processo
+    (quello principale) ma da più thread di scrittura: con reserve() un
+    contenuto resta riservato al file che lo sta scrivendo, e chi ne trova
+    un'altra copia intanto attende che sia completo.
+    """
+
+    def __init__(self, output_dir, mode="skip"):
+        import sqlite3  # Importato solo qui: serve solo con la deduplicazione attiva
+
+        if mode not in DEDUP_MODES or mode == "off":
+            raise ValueError(f"Modalità di deduplicazione non valida: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.path = os.path.join(output_dir, DEDUP_INDEX_NAME)
+        self._lock = threading.Lock()
+        self._writing = set()  # Contenuti riservati da reserve() i cui file non sono ancora scritti
+        self._written = threading.Condition(self._lock)
+        with _sqlite_errors():
+            # Autocommit: ogni claim() è una transazione breve; WAL senza fsync a ogni commit
+            self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS files "
+                             "(digest BLOB PRIMARY KEY, size INTEGER NOT NULL, name TEXT NOT NULL) WITHOUT ROWID")
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_name ON files (name)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        with self._lock, _sqlite_errors():
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def claim(self, digest, size, path):
+        """
+        Se un file con questo contenuto è già stato recuperato restituisce il
+        suo percorso; altrimenti registra 'path' come file del contenuto e
+        restituisce None.
+        """
+        with self.reserve(digest, size, path) as existing:
+            return existing
+
+    @contextmanager
+    def reserve(self, digest, size, path):
+        """
+        Come claim(), per un file non ancora scritto: se il contenuto è nuovo
+        resta riservato a 'path' fino alla fine del blocco with, in cui il
+        file va scritto. Una copia cercata nel frattempo attende e trova il
+        file completo invece di non vederlo e prenderne il posto.
+        """
+        existing = self._claim(digest, size, path)
+        if existing is not None:
+            yield existing
+            return
+        try:
+            yield None
+        finally:
+            with self._lock:
+                self._writing.discard(digest)
+                self._written.notify_all()
+
+    def _claim(self, digest, size, path):
+        name = os.path.relpath(path, self.output_dir)
+        with self._lock, _sqlite_errors():
+            while digest in self._writing:
+                self._written.wait()
+            # Le copie (il caso da rendere veloce) richiedono solo una lettura
+            existing = self._lookup(digest, name)
+            if existing is not None:
+                return existing
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._lookup(digest, name)  # Un altro processo può averlo appena registrato
+                if existing is not None:
+                    return existing
+                # Un altro contenuto registrato con lo stesso nome è di un file ormai sostituito
+                self._db.execute("DELETE FROM files WHERE name = ?", (name,))
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (digest, size, name))
+            finally:
+                self._db.execute("COMMIT")
+            self._writing.add(digest)
+        return None
+
+    def forget(self, path):
+        """Toglie dall'indice il file 'path' (non salvato o eliminato)."""
+        with self._lock, _sqlite_errors():
+            self._db.execute("DELETE FROM files WHERE name = ?", (os.path.relpath(path, self.output_dir),))
+
+    def link(self, existing, path):
+        """
+        Con la modalità "link" crea 'path' come collegamento fisico a
+        'existing' e restituisce True; False con "skip" o se il file system
+        non supporta i collegamenti (es. FAT32, exFAT).
+        """
+        if self.mode != "link":
+            return False
+        try:
+            os.link(existing, path)
+        except OSError:
+            return False
+        return True
+
+    def _lookup(self, digest, name):
+        row = self._db.execute("SELECT size, name FROM files WHERE digest = ?", (digest,)).fetchone()
+        if row is not None and row[1] != name and self._present(*row):
+            return os.path.join(self.output_dir, row[1])
+        return None
+
+    def _present(self, size, name):
+        try:
+            return os.stat(os.path.join(self.output_dir, name)).st_size == size
+        except OSError:
+            return False
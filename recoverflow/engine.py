@@ -0,0 +1,1016 @@
+"""Motore di carving: scansione sequenziale e parallela della sorgente."""
+import bisect
+import os
+import queue
+import re
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import partial
+
+from .dedup import DedupIndex, file_digest
+from .fragments import REASSEMBLERS
+from .index import INDEX_AT_LIMIT, INDEX_NAME, INDEX_REASSEMBLED, INDEX_VALIDATED, ScanIndex, index_path
+from .journal import ScanJournal
+from .matcher import SIGNATURE_MATCHER, SignatureMatcher
+from .output import DEFAULT_WRITER_THREADS, FileWriter
+from .profiling import Instrumentation
+from .readers import DEFAULT_BLOCK_SIZE, DEFAULT_MAP_WINDOW, DEFAULT_QUEUE_DEPTH, EXTRACT_CHUNK_SIZE, open_reader
+from .rescue import DEFAULT_RETRIES, ERROR_MAP_NAME, SectorRescue, load_error_map, write_error_map
+from .sizing import FOOTER_RESOLVERS, SIZE_RESOLVERS
+from .sparse import HoleFinder, uniform_runs
+from .stats import ScanStats
+from .validators import VALIDATORS
+from .volumes import ScanScope, format_partition, partition_ranges, read_partitions, unallocated_scope
+
+# --- MOTORE DI CARVING ---
+# Un file recuperato: posizione e dimensione nella sorgente, tipo e percorso del file salvato;
+# per i file ricomposti 'fragments' elenca le parti [(offset, lunghezza), ...] nella sorgente
+CarvedFile = namedtuple("CarvedFile", "offset size file_type path fragments", defaults=(None,))
+
+FILE_NAME_PATTERN = "recuperato_{n}.{file_type}"
+# Dimensione delle regioni in cui viene divisa la sorgente nella scansione parallela
+DEFAULT_REGION_SIZE = 256 * 1024 * 1024
+# File temporanei delle regioni e delle riscansioni della scansione parallela (vedi _carve_region e _rescan)
+REGION_PART_PATTERN = re.compile(r"\.(?:regione|riscansione)\d+_\d+\..+\.part")
+# Fase non misurata (strumentazione spenta)
+_NO_STAGE = nullcontext()
+
+class CarvingError(Exception):
+    """Errore che impedisce di avviare o completare la scansione."""
+
+def _source_size(f):
+    """Dimensione della sorgente, calcolata spostandosi alla fine (funziona anche sui dischi fisici)."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+class Carver:
+    """
+    Motore di carving indipendente dalla GUI: gira nel thread di ScanWorker
+    oppure, nella scansione parallela, in un processo separato per ogni regione.
+    Messaggi e avanzamento (byte analizzati) vengono passati alle funzioni
+    'log' e 'progress'; 'stats' raccoglie gli stessi dati in forma strutturata.
+    """
+
+    def __init__(self, disk_path, output_dir, block_size=DEFAULT_BLOCK_SIZE, scan_mode="auto",
+                 map_window=DEFAULT_MAP_WINDOW, workers=1, region_size=DEFAULT_REGION_SIZE,
+                 writer_threads=DEFAULT_WRITER_THREADS, log=None, progress=None, should_stop=None,
+                 name_pattern=FILE_NAME_PATTERN, journal=True, resume=True, skip_empty=True,
+                 alignment=0, instruments=None, signatures=None, validate=True, dedup="off", reassemble=True,
+                 index_only=False, queue_depth=DEFAULT_QUEUE_DEPTH, direct=False, rescue=True,
+                 retries=DEFAULT_RETRIES, unallocated=False, partition=None, scope=None):
+        self.disk_path = disk_path
+        self.output_dir = output_dir
+        self.block_size = block_size
+        self.scan_mode = scan_mode  # "auto", "stream" (letture a blocchi), "queued" (letture in coda) o "mmap"
+        self.map_window = map_window
+        self.queue_depth = queue_depth  # Letture di un blocco in corso insieme in modalità "queued"
+        self.direct = direct  # Letture con O_DIRECT, senza la cache del sistema (modalità "queued")
+        # Settori illeggibili sostituiti da zeri dopo 'retries' tentativi (vedi rescue) invece di fermare
+        # la scansione; non vale in modalità mmap
+        self.rescue = rescue
+        self.retries = retries
+        # Header cercati solo nello spazio non allocato e/o in una partizione (numero da 1), vedi volumes;
+        # 'scope' è la ScanScope già calcolata (quella passata alle regioni della scansione parallela)
+        self.unallocated = unallocated
+        self.partition = partition
+        self.scope = scope
+        self.workers = max(1, workers)
+        if region_size < 1:
+            raise CarvingError("La dimensione delle regioni deve essere positiva.")
+        self.region_size = region_size
+        self.writer_threads = writer_threads  # 0 = scrittura sincrona dei file recuperati
+        self.writer = None
+        self._holes = None  # HoleFinder della sorgente aperta da carve_range
+        self.log = log or (lambda message: None)
+        self.progress = progress or (lambda done: None)
+        self.should_stop = should_stop
+        self.name_pattern = name_pattern
+        self.use_journal = journal  # Registro nella cartella di output per riprendere la scansione
+        self.resume = resume  # Riprende la scansione registrata invece di iniziarne una nuova
+        self.skip_empty = skip_empty  # Salta zone uniformi e buchi dei file sparsi
+        self.alignment = alignment  # Header cercati solo a multipli di 'alignment' byte (0 = ovunque)
+        self.validate = validate  # Controlli strutturali (validators) prima di recuperare i file
+        self.reassemble = reassemble  # Ricomposizione dei file frammentati (vedi fragments.REASSEMBLERS)
+        self.dedup = dedup  # Copie dello stesso contenuto: "off", "skip" o "link" (vedi dedup.DEDUP_MODES)
+        self.hashes = None  # DedupIndex della cartella di output, aperto da carve()
+        self.index_only = index_only  # Solo l'indice dei file trovati (vedi index), senza salvarli
+        self.index = None  # ScanIndex scritto dalla scansione con index_only
+        self.journal = None
+        self.next_number = 1  # Numero del prossimo file nel nome (es. recuperato_1)
+        self.size = 0
+        self.records = []  # CarvedFile, in ordine di offset
+        self.stats = ScanStats()  # Avanzamento, byte saltati, header e file per tipo
+        self.instruments = instruments  # profiling.Instrumentation, oppure None
+        # Firme cercate: quelle predefinite, un dizionario come FILE_SIGNATURES
+        # oppure un SignatureMatcher già compilato (es. da database.load_signatures)
+        if signatures is None:
+            signatures = SIGNATURE_MATCHER
+        elif not isinstance(signatures, SignatureMatcher):
+            signatures = SignatureMatcher(signatures)
+        self.matcher = signatures
+        self.signatures = signatures.signatures
+        # Estensione dei file salvati per tipo (per l'estrazione, quelle dell'indice)
+        self.extensions = {name: sigs.get("extension", name) for name, sigs in self.signatures.items()}
+        self.is_running = True
+        self._rescans = 0
+
+    def stop(self):
+        self.is_running = False
+
+    def stopped(self):
+        if self.is_running and self.should_stop is not None and self.should_stop():
+            self.is_running = False  # Una volta fermata la scansione resta ferma (serve al registro)
+        return not self.is_running
+
+    def carve(self):
+        """
+        Scansiona l'intera sorgente e restituisce la lista dei file recuperati.
+        Se la cartella di output contiene il registro di una scansione
+        interrotta della stessa sorgente, la scansione riprende da lì. Con
+        index_only i file non vengono salvati ma elencati nell'indice
+        (INDEX_NAME nella cartella di output), che riprende allo stesso modo.
+        """
+        self.size = self._open_source()
+        self._open_output()
+        self.stats = ScanStats(self.size)
+        self._open_scope()
+        if not self.index_only:
+            self._open_hashes()
+        try:
+            start = self._open_index() if self.index_only else self._open_journal()
+            if start is None:
+                return self.records
+            self._remove_region_parts()
+            self.stats.done = self.stats.resumed_from = start
+            if self.scope is not None:
+                self.stats.excluded = self.size - start - self.scope.covered(start, self.size)
+            try:
+                stop = self._carve_from(start)
+                if self.scope is not None:
+                    self.stats.saved = self._time_saved(start, stop)
+            finally:
+                self._save_error_map(resumed=start > 0)
+        finally:
+            if self.hashes is not None:
+                self.hashes.close()
+        return self.records
+
+    def _open_source(self):
+        with open(self.disk_path, "rb") as f:
+            size = _source_size(f)
+        if size == 0:
+            raise CarvingError("Impossibile determinare la dimensione del disco.")
+        return size
+
+    def _open_output(self):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+        except OSError as e:
+            raise CarvingError(f"Impossibile creare la cartella di output: {e}") from None
+
+    def _open_scope(self):
+        """
+        Con 'unallocated' o 'partition' legge partizioni e file system della
+        sorgente (vedi volumes) e limita la scansione alle zone scelte.
+        """
+        if self.scope is not None or not (self.unallocated or self.partition is not None):
+            return
+        with open(self.disk_path, "rb", buffering=0) as f:
+            partitions = read_partitions(f, self.size)
+            for partition in partitions:
+                self.log(format_partition(partition))
+            if self.partition is not None:
+                chosen = next((p for p in partitions if p.number == self.partition), None)
+                if chosen is None:
+                    raise CarvingError(f"Partizione {self.partition} non trovata: la sorgente ne ha "
+                                       f"{len(partitions)}.")
+                description = f"partizione {chosen.number}" + (", spazio non allocato" if self.unallocated else "")
+                self.scope = ScanScope(partition_ranges(chosen, self.unallocated, self.log), description)
+            elif partitions:
+                self.scope = unallocated_scope(f, self.size, partitions, self.log)
+            else:
+                self.log("Nessuna tabella delle partizioni né file system riconosciuto: scansione completa.")
+                return
+        covered = self.scope.covered(0, self.size)
+        self.log(f"Scansione limitata a: {self.scope.description}, {covered / 1024**2:.0f} MB su "
+                 f"{self.size / 1024**2:.0f} MB in {len(self.scope.ranges)} zone.")
+
+    def _open_hashes(self):
+        if self.dedup != "off":
+            try:
+                self.hashes = DedupIndex(self.output_dir, self.dedup)
+            except OSError as e:
+                raise CarvingError(f"Impossibile aprire l'indice dei duplicati: {e}") from None
+
+    def _carve_from(self, start):
+        """
+        Scansiona da 'start' alla fine della sorgente e aggiorna il registro (o
+        l'indice). Restituisce l'offset a cui la scansione si è fermata.
+        """
+        register = self.index if self.index_only else self.journal
+        try:
+            if self.workers > 1 and self.size - start > self.region_size:
+                stop = self.carve_parallel(start)
+            else:
+                stop = self.carve_range(start, self.size)
+            if register is not None:
+                if self.stopped():
+                    register.checkpoint(stop, force=True)
+                else:
+                    register.finish()
+        finally:
+            if register is not None:
+                register.close()
+        return stop
+
+    def _time_saved(self, start, stop):
+        """
+        Stima dei secondi che sarebbero serviti a scandire i byte esclusi tra
+        'start' e 'stop', alla velocità media della scansione limitata.
+        """
+        scanned = self.scope.covered(start, stop)
+        return (stop - start - scanned) * self.stats.elapsed / scanned if scanned > 0 else 0.0
+
+    def _remove_region_parts(self):
+        """Elimina i file temporanei lasciati da una scansione parallela interrotta da un crash."""
+        try:
+            names = [name for name in os.listdir(self.output_dir) if REGION_PART_PATTERN.fullmatch(name)]
+        except OSError:
+            return
+        for name in names:
+            _remove_quietly(os.path.join(self.output_dir, name))
+        if names:
+            self.log(f"Eliminati {len(names)} file temporanei di una scansione parallela interrotta.")
+
+    def _open_journal(self):
+        """
+        Prepara il registro della scansione. Restituisce l'offset da cui
+        scansionare, oppure None se la scansione registrata è già completa.
+        """
+        if not self.use_journal:
+            return 0
+        self.journal = ScanJournal(self.output_dir, self.disk_path, self.size)
+        state = self.journal.load() if self.resume else None
+        if state is None:
+            if self.resume and self.journal.exists():
+                self.log("Il registro nella cartella di output è di un'altra scansione: ne inizio una nuova.")
+            # I nuovi file non sovrascrivono quelli di scansioni precedenti
+            self.next_number = _highest_file_number(self.output_dir, self.name_pattern) + 1
+            self.journal.start(self.next_number)
+            return 0
+
+        self.next_number = state.first_number
+        for offset, size, file_type, name, number, fragments in sorted(state.files, key=lambda f: (f[0], f[3])):
+            path = os.path.join(self.output_dir, name)
+            if offset >= state.cursor and not state.done:
+                _remove_quietly(path)  # Oltre l'ultimo checkpoint: verrà recuperato di nuovo
+                if self.hashes is not None:
+                    self.hashes.forget(path)
+                continue
+            fragments = [tuple(fragment) for fragment in fragments] if fragments else None
+            self.records.append(CarvedFile(offset, size, file_type, path, fragments))
+            self.stats.recovered[file_type] += 1
+            self.next_number = max(self.next_number, number + 1)
+        if state.done:
+            self.log(f"La scansione di questa sorgente è già completa: {len(self.records)} file recuperati.")
+            return None
+        self.journal.resume()
+        self.log(f"Ripresa della scansione dalla posizione {state.cursor} "
+                 f"({len(self.records)} file già recuperati).")
+        return state.cursor
+
+    def _open_index(self):
+        """
+        Prepara l'indice della scansione con index_only. Restituisce l'offset
+        da cui scansionare, oppure None se l'indice è già completo.
+        """
+        self.index = ScanIndex(os.path.join(self.output_dir, INDEX_NAME))
+        state = self.index.load() if self.resume else None
+        if state is not None and (state.source, state.size, state.extensions) != (self.disk_path, self.size,
+                                                                                  self.extensions):
+            state = None
+        if state is None:
+            if self.resume and self.index.exists():
+                self.log("L'indice nella cartella di output è di un'altra scansione: ne inizio uno nuovo.")
+            self.index.start(self.disk_path, self.size, self.extensions)
+            return 0
+
+        for entry in self.index.entries(None if state.done else state.cursor):
+            self.records.append(CarvedFile(entry.offset, entry.size, entry.file_type, None, entry.fragments))
+            self.stats.recovered[entry.file_type] += 1
+        if state.done:
+            self.log(f"L'indice di questa sorgente è già completo: {len(self.records)} file trovati.")
+            return None
+        self.index.resume(state.cursor)
+        self.log(f"Ripresa dell'indice dalla posizione {state.cursor} ({len(self.records)} file già trovati).")
+        return state.cursor
+
+    def extract_index(self, path, types=None):
+        """
+        Salva i file elencati nell'indice 'path' (il file, oppure la cartella
+        di output della scansione con index_only), solo quelli dei tipi
+        'types' se indicati. Dalla sorgente vengono letti soltanto i loro
+        byte, in ordine di offset. Restituisce la lista dei file salvati.
+        """
+        index = ScanIndex(index_path(path))
+        state = index.load()
+        if state is None:
+            raise CarvingError(f"Indice non trovato o non valido: {path}")
+        self.size = self._open_source()
+        if self.size != state.size:
+            raise CarvingError(f"L'indice è di una sorgente di {state.size} byte, questa ne ha {self.size}.")
+        self._open_output()
+        unknown = set(types or ()) - state.extensions.keys()
+        if unknown:
+            raise CarvingError(f"Tipi non presenti nell'indice: {', '.join(sorted(unknown))}")
+        if not state.done:
+            self.log(f"Indice incompleto: la scansione si è fermata alla posizione {state.cursor}.")
+        self.extensions = state.extensions
+
+        def selected():
+            for entry in index.entries(None if state.done else state.cursor):
+                if types is None or entry.file_type in types:
+                    yield entry
+
+        self.stats = ScanStats(sum(entry.size for entry in selected()))
+        self.next_number = _highest_file_number(self.output_dir, self.name_pattern) + 1
+        self._open_hashes()
+        try:
+            sectors = self._sector_rescue()
+            self.writer = FileWriter(self.disk_path, self.size, self.writer_threads, log=self.log,
+                                     instruments=self.instruments, dedup=self.hashes, rescue=sectors)
+            try:
+                done = 0
+                for entry in selected():
+                    if self.stopped():
+                        break
+                    self.save_file(entry.offset, entry.size, entry.file_type, entry.fragments)
+                    done += entry.size
+                    self._report_progress(done)
+            finally:
+                self.writer.close()
+                self._collect_errors(sectors)
+                self._save_error_map()
+            self._drop_unsaved()
+        finally:
+            if self.hashes is not None:
+                self.hashes.close()
+        return self.records
+
+    def carve_range(self, start, end=None, stop_when=None):
+        """Apre la sorgente e scansiona gli header che iniziano in [start, end)."""
+        # buffering=0: readinto scrive direttamente nei buffer del lettore, senza copie intermedie
+        # (in modalità mmap il file serve solo per la mappatura)
+        with open(self.disk_path, "rb", buffering=0) as f:
+            size = _source_size(f)
+            # Lo stesso SectorRescue per la scansione e per i thread che scrivono i file
+            sectors = self._sector_rescue()
+            reader = open_reader(f, size, self.scan_mode, self.block_size, self.map_window,
+                                 self.matcher.max_header_len, self.queue_depth, self.direct, sectors)
+            # I file trovati vengono scritti in background; all'uscita (anche dopo
+            # stop() o un errore) si attende la scrittura di quelli già accodati
+            self.writer = FileWriter(self.disk_path, size, self.writer_threads, log=self.log,
+                                     instruments=self.instruments, dedup=self.hashes, rescue=sectors)
+            self._holes = HoleFinder(f, size) if self.skip_empty and self.matcher.holes_safe else None
+            try:
+                stop = self.scan(reader, start, size if end is None else end, stop_when)
+            finally:
+                reader.close()
+                self.writer.close()
+                self._collect_errors(sectors)
+        self._drop_unsaved()
+        return stop
+
+    def _sector_rescue(self):
+        return SectorRescue(self.retries, log=self.log) if self.rescue else None
+
+    def _collect_errors(self, sectors):
+        if sectors is not None:
+            self.stats.read_errors += sectors.errors
+            self.stats.bad_ranges.extend(sectors.ranges)
+
+    def _save_error_map(self, resumed=False):
+        """
+        Se ci sono state zone illeggibili le scrive nella mappa degli errori
+        della cartella di output (con quelle già registrate se la scansione è
+        ripresa).
+        """
+        if not self.stats.bad_ranges:
+            return
+        path = os.path.join(self.output_dir, ERROR_MAP_NAME)
+        ranges = self.stats.bad_ranges + (load_error_map(path) if resumed else [])
+        try:
+            write_error_map(path, self.size, ranges)
+        except OSError as e:
+            self.log(f"Impossibile salvare la mappa degli errori: {e}")
+            return
+        self.log(f"Mappa degli errori di lettura salvata in {path}")
+
+    def _drop_unsaved(self):
+        """Toglie dai file recuperati quelli non scritti (errori e copie saltate)."""
+        duplicates = self.writer.duplicates
+        if duplicates:
+            self.stats.duplicates.update(record.file_type for record in self.records if record.path in duplicates)
+        # Le copie collegate al primo file restano tra i file recuperati, quelle saltate no
+        dropped = self.writer.failed | (duplicates.keys() if self.dedup == "skip" else set())
+        if dropped:
+            self.stats.recovered.subtract(record.file_type for record in self.records if record.path in dropped)
+            self.records = [record for record in self.records if record.path not in dropped]
+
+    def scan(self, reader, start, end, stop_when=None):
+        """
+        Logica di recupero file (File Carving): cerca gli header che iniziano
+        in [start, end) e recupera i file trovati; i file possono terminare
+        oltre 'end'. Se 'stop_when(header_pos)' è vero la scansione si ferma
+        su quell'header. Restituisce l'offset a cui la scansione si è fermata.
+        """
+        # Offset assoluto da cui accettare nuovi header: tutto ciò che precede
+        # è già stato analizzato o fa parte di un file recuperato
+        cursor = start
+        # Un header che inizia prima di 'end' può terminare fino a max_header_len - 1 byte dopo
+        limit = min(end + self.matcher.max_header_len - 1, reader.size)
+        reader.seek(start)
+        self._skip_hole(reader, start, end)
+        instruments = self.instruments
+        for base, window in reader if instruments is None else instruments.timed_reads(reader):
+            # Gli header prima di 'base' sono già stati esaminati tutti
+            self._checkpoint(max(cursor, base))
+            if self.stopped():
+                return max(cursor, base)
+            if base >= end:
+                return cursor
+            self._report_progress(self.stats.resumed_from + min(reader.position, end) - start)
+            if instruments is not None:
+                instruments.maybe_snapshot()
+
+            # Tutti gli header della finestra, in ordine, con una sola passata
+            window_end = min(len(window), limit - base)
+            headers = self._headers(window, base, max(cursor - base, 0), window_end)
+            if instruments is not None:
+                headers = instruments.timed(headers, "match")
+            for found_pos, found_type in headers:
+                header_pos = base + found_pos
+                if header_pos < cursor:
+                    continue # Dentro un file appena recuperato
+                if header_pos >= end:
+                    return cursor
+                if stop_when is not None and stop_when(header_pos):
+                    return header_pos
+                self.stats.hits[found_type] += 1
+                self.log(f"Trovato potenziale header {found_type.upper()} alla posizione: {header_pos}")
+
+                size = self.extract(reader, header_pos, found_type)
+                if size is None:
+                    if instruments is not None:
+                        instruments.count("discarded")
+                    cursor = header_pos + 1
+                    continue
+                cursor = header_pos + size
+                if cursor > base + window_end:
+                    # Il file continua oltre la finestra: riprendi la lettura dalla sua fine
+                    reader.seek(cursor)
+                    self._skip_hole(reader, cursor, end)
+                    break
+            else:
+                if base + len(window) >= limit:
+                    return cursor
+                self._skip_hole(reader, max(cursor, reader.position), end)
+        return cursor
+
+    def _headers(self, window, base, start, end):
+        """
+        Header in window[start:end] che iniziano dentro le zone da scandire
+        (tutta la finestra se la scansione non è limitata, vedi volumes).
+        """
+        if self.scope is None:
+            yield from self._window_headers(window, base, start, end)
+            return
+        edge = self.matcher.max_header_len - 1
+        for zone_start, zone_end in self.scope.clip(base + start, base + end):
+            # Un header che inizia prima della fine della zona può terminare fino a 'edge' byte dopo
+            for found_pos, found_type in self._window_headers(window, base, zone_start - base,
+                                                              min(zone_end - base + edge, end)):
+                if base + found_pos >= zone_end:
+                    break
+                yield found_pos, found_type
+
+    def _window_headers(self, window, base, start, end):
+        """
+        Header in window[start:end], come SignatureMatcher.scan, ma senza
+        cercarli dentro le zone uniformi: lì non può iniziare nessun header.
+        Vengono scanditi solo i max_header_len - 1 byte ai bordi di ogni zona,
+        per gli header che la attraversano. Con 'alignment' vengono esaminati
+        solo gli offset assoluti allineati (base della finestra: 'base').
+        """
+        matcher = self.matcher
+        if self.alignment > 1:
+            yield from matcher.scan_aligned(window, start, end, self.alignment, base)
+            return
+        if not self.skip_empty:
+            yield from matcher.scan(window, start, end)
+            return
+        pos = start
+        edge = matcher.max_header_len - 1
+        for run_start, run_end in uniform_runs(window, start, end, matcher.header_fills):
+            yield from matcher.scan(window, pos, run_start + edge)
+            pos = run_end - edge
+            self.stats.skipped += pos - run_start
+        yield from matcher.scan(window, pos, end)
+
+    def _skip_hole(self, reader, pos, end):
+        """
+        Se la lettura riprende in 'pos' fuori dalle zone da scandire salta
+        alla zona successiva; se è dentro un buco del file sparso, alla fine
+        del buco.
+        """
+        if pos >= end:
+            return
+        start = pos
+        if self.scope is not None:
+            pos = self.scope.next_start(pos, end)
+        if self._holes is not None and pos < end:
+            target = min(self._holes.data_after(pos) - (self.matcher.max_header_len - 1), end)
+            if target > pos:
+                # I byte fuori dalle zone sono già contati tra quelli esclusi
+                self.stats.skipped += target - pos if self.scope is None else self.scope.covered(pos, target)
+                pos = target
+        if pos > start:
+            reader.seek(pos)
+
+    def extract(self, reader, header_pos, file_type):
+        """
+        Estrae il file che inizia in 'header_pos' e lo salva.
+        Restituisce la dimensione del file salvato, oppure None se è stato scartato.
+        """
+        sigs = self.signatures[file_type]
+        limit = min(header_pos + sigs["max_size"], reader.size)
+
+        # Controllo strutturale dei primi byte: scarta i falsi positivi prima di cercare il footer
+        validator = sigs.get("validator") if self.validate else None
+        if validator:
+            with self._stage("validate"):
+                valid = VALIDATORS[validator](reader, header_pos, limit)
+            if not valid:
+                self.stats.rejected[file_type] += 1
+                self.log(f"Struttura del file {file_type.upper()} non valida, scarto.")
+                return None
+
+        # Se il file ha un footer definito, cercalo
+        if sigs["footer"]:
+            with self._stage("footer"):
+                end = self.footer_end(reader, header_pos, limit, file_type)
+            if end is None:
+                self.log(f"File {file_type.upper()} troppo grande o footer non trovato, scarto.")
+                return None
+            final_size = min(end, reader.size) - header_pos
+            fragments = self.reassembled(reader, header_pos, header_pos + final_size, limit, file_type)
+            if fragments:
+                # La scansione riprende dopo il primo frammento: lo spazio tra i due può contenere altri file
+                self.save_file(header_pos, sum(length for _, length in fragments), file_type, fragments)
+                return fragments[0][1]
+
+        elif sigs.get("resolver"): # Dimensione letta dalla struttura del file
+            with self._stage("resolve"):
+                end = SIZE_RESOLVERS[sigs["resolver"]](reader, header_pos, limit)
+            if end is None:
+                self.log(f"Struttura del file {file_type.upper()} non valida, scarto.")
+                return None
+            if end > limit:
+                self.log(f"File {file_type.upper()} più grande del limite o troncato, recupero i primi {limit - header_pos} byte.")
+                end = limit
+            final_size = end - header_pos
+
+        else: # Logica per file senza footer
+            with self._stage("footerless"):
+                final_size = self.footerless_end(reader, header_pos, limit, file_type) - header_pos
+
+        self.save_file(header_pos, final_size, file_type)
+        return final_size
+
+    def footer_end(self, reader, header_pos, limit, file_type):
+        """
+        Cerca il footer in [header_pos, limit) e restituisce l'offset a cui il
+        file termina, oppure None. Ogni byte viene letto una sola volta: dopo
+        un footer la ricerca riprende dal byte successivo.
+
+        Con 'last_footer' vale l'ultimo footer prima del prossimo header dello
+        stesso tipo (i PDF aggiornati in modo incrementale hanno più %%EOF);
+        con 'footer_resolver' il footer apre un record che fa parte del file
+        (es. il record finale degli archivi ZIP).
+        """
+        sigs = self.signatures[file_type]
+        footer = sigs["footer"]
+        resolver = FOOTER_RESOLVERS.get(sigs.get("footer_resolver"))
+        last = sigs.get("last_footer", False)
+        if last and not sigs.get("header_mask"):
+            offset = sigs.get("header_offset", 0)
+            next_header = reader.find(sigs["header"], header_pos + offset + 1, limit + offset)
+            if next_header != -1:
+                limit = next_header - offset
+        end = fallback = None
+        pos = header_pos
+        while True:
+            footer_pos = reader.find(footer, pos, limit)
+            if footer_pos == -1:
+                return fallback if end is None else end
+            if resolver:
+                footer_end, consistent = resolver(reader, header_pos, footer_pos)
+            else:
+                footer_end, consistent = footer_pos + len(footer), True
+            if fallback is None:
+                fallback = footer_end
+            if consistent:
+                if not last:
+                    return footer_end
+                end = footer_end
+            pos = footer_pos + 1
+
+    def reassembled(self, reader, header_pos, end, limit, file_type):
+        """
+        Per i tipi con la chiave 'fragments': se il file terminato in 'end' è
+        diviso in due frammenti restituisce i frammenti del file ricomposto,
+        altrimenti None (file contiguo, oppure frammentato ma non
+        ricomponibile: viene recuperato contiguo come gli altri).
+        """
+        name = self.signatures[file_type].get("fragments") if self.reassemble else None
+        if not name:
+            return None
+        with self._stage("reassemble"):
+            fragments = REASSEMBLERS[name](reader, header_pos, end, limit)
+        if fragments is None:
+            return None
+        if not fragments:
+            self.stats.fragmented[file_type] += 1
+            self.log(f"File {file_type.upper()} frammentato ma non ricomponibile, recupero la parte contigua.")
+            return None
+        self.stats.reassembled[file_type] += 1
+        parts = ", ".join(f"{offset}+{length}" for offset, length in fragments)
+        self.log(f"File {file_type.upper()} frammentato ricomposto da {len(fragments)} parti: {parts}")
+        return fragments
+
+    def footerless_end(self, reader, header_pos, limit, file_type):
+        """
+        Per i file senza footer: il file termina dove inizia l'header di un
+        altro file, oppure a 'limit' (max_size o fine del disco).
+        """
+        # Cerca altri header, ma non all'inizio (che è il nostro file)
+        pos = header_pos + 1
+        chunk_size = EXTRACT_CHUNK_SIZE
+        while pos < limit:
+            stop = min(pos + chunk_size, limit)
+            # max_header_len - 1 byte in più per gli header che iniziano prima di 'stop'
+            chunk = reader.read_at(pos, stop - pos + self.matcher.max_header_len - 1)
+            other = self.matcher.first(chunk)
+            if other and pos + other[0] < stop:
+                self.log(f"Trovato header di un altro file, termino recupero di {file_type.upper()}.")
+                return pos + other[0] # Trovato un altro file, fermati
+            pos = stop
+            chunk_size = min(2 * chunk_size, reader.block_size - self.matcher.max_header_len)
+        return limit
+
+    def save_file(self, offset, size, file_type, fragments=None):
+        """
+        Accoda il salvataggio in un file dei byte [offset, offset + size) della
+        sorgente, oppure dei 'fragments' [(offset, lunghezza), ...] uno dopo l'altro.
+        Con index_only il file viene soltanto aggiunto all'indice.
+        """
+        if self.index_only:
+            self._add_to_index(CarvedFile(offset, size, file_type, None, fragments))
+            return
+        filename, number = self._next_file_name(self.extensions[file_type])
+        record = CarvedFile(offset, size, file_type, filename, fragments)
+        self.records.append(record)
+        self.stats.recovered[file_type] += 1
+        # Il file entra nel registro solo quando è stato scritto
+        on_saved = partial(self.journal.add_file, record, number) if self.journal is not None else None
+        # 'queue': tempo di attesa quando i thread di scrittura sono indietro
+        with self._stage("queue"):
+            self.writer.submit(offset, size, filename, on_saved, fragments)
+
+    def _add_to_index(self, record):
+        self.records.append(record)
+        self.stats.recovered[record.file_type] += 1
+        if self.index is None:
+            return  # Regione della scansione parallela: l'indice lo scrive il processo principale
+        sigs = self.signatures[record.file_type]
+        flags = INDEX_REASSEMBLED if record.fragments else 0
+        if self.validate and sigs.get("validator"):
+            flags |= INDEX_VALIDATED
+        if not sigs["footer"] and record.offset + record.size == min(record.offset + sigs["max_size"], self.size):
+            flags |= INDEX_AT_LIMIT
+        self.index.add(record, flags)
+
+    def _stage(self, name):
+        return _NO_STAGE if self.instruments is None else self.instruments.stage(name)
+
+    def _report_progress(self, done):
+        self.stats.done = done
+        self.progress(done)
+
+    def _next_file_name(self, file_type):
+        number = self.next_number
+        self.next_number += 1
+        return os.path.join(self.output_dir, self.name_pattern.format(n=number, file_type=file_type)), number
+
+    def _checkpoint(self, pos):
+        """Registra che la scansione può riprendere da 'pos' (solo se non ci sono file prima ancora da scrivere)."""
+        if self.index is not None:
+            self.index.checkpoint(pos)  # I file entrano nell'indice appena trovati
+            return
+        if self.journal is None:
+            return
+        pending = self.writer.pending_offset()
+        self.journal.checkpoint(pos if pending is None else min(pos, pending))
+
+    # --- Scansione parallela ---
+
+    def carve_parallel(self, start=0):
+        """
+        Divide la sorgente da 'start' in poi in regioni di 'region_size' byte e
+        le scansiona in processi separati. Ogni processo legge max_header_len - 1
+        byte oltre la fine della sua regione per gli header a cavallo del confine
+        e porta a termine i file che lo attraversano; i risultati vengono poi
+        uniti per offset assoluto. Restituisce l'offset da cui riprendere la
+        scansione se è stata interrotta, altrimenti la dimensione della sorgente.
+        """
+        # Importati solo qui: costano più di metà del tempo di import del pacchetto
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        regions = [(region_start, min(region_start + self.region_size, self.size))
+                   for region_start in range(start, self.size, self.region_size)]
+        options = {"block_size": self.block_size, "scan_mode": self.scan_mode, "map_window": self.map_window,
+                   "writer_threads": self.writer_threads, "skip_empty": self.skip_empty,
+                   "alignment": self.alignment, "validate": self.validate, "reassemble": self.reassemble,
+                   "index_only": self.index_only, "queue_depth": self.queue_depth, "direct": self.direct,
+                   "rescue": self.rescue, "retries": self.retries, "scope": self.scope}
+        if self.matcher is not SIGNATURE_MATCHER:
+            options["signatures"] = self.matcher
+        if self.instruments is not None:
+            # Ogni processo misura con una sua copia vuota; le misure vengono poi sommate
+            options["instruments"] = Instrumentation()
+        # "spawn": i processi non ereditano i thread della GUI
+        context = multiprocessing.get_context("spawn")
+        events = context.Queue()
+        stop_event = context.Event()
+        done = [0] * len(regions)
+
+        results = [None] * len(regions)
+
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_region_worker,
+                                 initargs=(events, stop_event)) as pool:
+            futures = [pool.submit(_carve_region, self.disk_path, self.output_dir, index, region_start, end, options)
+                       for index, (region_start, end) in enumerate(regions)]
+
+            def result(index):
+                """Risultato della regione 'index', atteso inoltrando messaggi e avanzamento dei processi."""
+                while results[index] is None:
+                    self._pump_events(events, done, timeout=0.1)
+                    if self.stopped():
+                        stop_event.set()
+                    if futures[index].done():
+                        results[index] = futures[index].result()
+                        _, _, stats, instruments = results[index]
+                        self.stats.merge(stats)
+                        if instruments is not None:
+                            self.instruments.merge(instruments)
+                return results[index]
+
+            try:
+                # Le regioni vengono unite appena pronte, in ordine: il registro avanza con loro
+                stop = self._merge_regions(regions, result)
+            except BaseException:
+                stop_event.set()  # Errore o Ctrl+C: gli altri processi si fermano invece di finire le regioni
+                raise
+        self._pump_events(events, done, timeout=0.1)
+        return stop
+
+    def _pump_events(self, events, done, timeout):
+        """Inoltra messaggi e avanzamento dei processi; l'avanzamento è il totale di tutte le regioni."""
+        try:
+            while True:
+                kind, index, payload = events.get(timeout=timeout)
+                timeout = 0
+                if kind == "log":
+                    self.log(payload)
+                else:
+                    done[index] = payload
+                    self._report_progress(self.stats.resumed_from + sum(done))
+        except queue.Empty:
+            pass
+
+    def _merge_regions(self, regions, result):
+        """
+        Unisce i file delle regioni ottenendo lo stesso risultato di una
+        scansione sequenziale. I file che iniziano dentro un file già accettato
+        vengono eliminati; se un file attraversa il confine e termina dentro un
+        file della regione successiva, da lì la regione aveva seguito un'altra
+        strada: la sorgente viene riscandita dalla fine del file finché non si
+        incontra un header che la regione ha esaminato nello stesso stato.
+
+        result(i) restituisce (attendendolo) il risultato della regione i: le
+        regioni vengono unite in ordine appena sono pronte e, dopo ognuna, i
+        file accettati ricevono il nome definitivo e il registro (o l'indice)
+        un checkpoint, così una scansione parallela interrotta da un crash
+        riprende dall'ultima regione unita.
+
+        Se la scansione è stata interrotta, l'unione si ferma al primo punto
+        non più esatto (la prima regione interrotta o una riscansione che non
+        si può fare): i file successivi vengono eliminati e l'offset restituito
+        è quello da cui riprendere. A scansione completa restituisce la
+        dimensione della sorgente.
+        """
+        region_starts = [start for start, _ in regions]
+        record_starts = {}
+
+        def synced(pos):
+            # Vero se la regione che contiene 'pos' vi è arrivata libera, non dentro un suo file
+            index = bisect.bisect_right(region_starts, pos) - 1
+            records = result(index)[0]
+            if index not in record_starts:
+                record_starts[index] = [record.offset for record in records]
+            i = bisect.bisect_right(record_starts[index], pos) - 1
+            if i < 0:
+                return True
+            record = records[i]
+            return record.offset == pos or _record_end(record) <= pos
+
+        register = self.index if self.index_only else self.journal
+        accepted = []
+        cursor = regions[0][0]
+        resume = None  # Offset da cui riprendere la scansione interrotta
+        for index, (_, region_end) in enumerate(regions):
+            records, stop, _, _ = result(index)
+            for record in records:
+                if resume is not None or record.offset < cursor:
+                    # Già coperto da un file precedente, oppure oltre il punto di ripresa
+                    if record.path is not None:
+                        _remove_quietly(record.path)
+                    continue
+                accepted.append(record)
+                cursor = _record_end(record)
+                if cursor < self.size and not synced(cursor):
+                    if not self.stopped():
+                        rescued, cursor = self._rescan(cursor, synced)
+                        accepted.extend(rescued)
+                    if self.stopped():
+                        resume = cursor
+            if stop is not None and resume is None:
+                # Regione interrotta: i suoi risultati sono esatti fino a 'stop'
+                resume = max(cursor, stop)
+            self._accept(accepted)
+            accepted = []
+            if register is not None and resume is None:
+                # Tutti gli header prima della fine della regione (e del file che la attraversa) sono uniti
+                register.checkpoint(max(cursor, region_end))
+        return self.size if resume is None else resume
+
+    def _accept(self, accepted):
+        """Dà ai file accettati il nome definitivo, nell'ordine in cui compaiono sul disco, e li registra."""
+        for record in accepted:
+            if self.index_only:
+                self._add_to_index(record)
+                continue
+            filename, number = self._next_file_name(self.extensions[record.file_type])
+            existing = self._place(record.path, filename)
+            if existing is not None:
+                self.stats.duplicates[record.file_type] += 1
+                if self.dedup == "skip":
+                    self.log(f"DUPLICATO di {existing}: non salvato")
+                    continue
+                self.log(f"DUPLICATO di {existing}: collegato in {filename}")
+            record = record._replace(path=filename)
+            self.records.append(record)
+            self.stats.recovered[record.file_type] += 1
+            if self.journal is not None:
+                self.journal.add_file(record, number)
+
+    def _place(self, part_path, path):
+        """
+        Rinomina il file temporaneo di una regione in 'path'. Con la
+        deduplicazione, se il contenuto è già stato recuperato il file
+        temporaneo viene eliminato (e 'path' collegato al primo file, in
+        modalità "link") e viene restituito il file con lo stesso contenuto.
+        """
+        if self.hashes is not None:
+            existing = self.hashes.claim(file_digest(part_path), os.path.getsize(part_path), path)
+            if existing is not None:
+                if self.dedup == "skip" or self.hashes.link(existing, path):
+                    _remove_quietly(part_path)
+                    return existing
+                self.log(f"Collegamento a {existing} non riuscito: salvo una copia.")
+        os.replace(part_path, path)
+        return None
+
+    def _rescan(self, start, synced):
+        """Scansione sequenziale da 'start' fino al primo header per cui synced() è vero."""
+        self._rescans += 1
+        carver = Carver(self.disk_path, self.output_dir, self.block_size, self.scan_mode, self.map_window,
+                        writer_threads=self.writer_threads, log=self.log, should_stop=self.stopped,
+                        name_pattern=f".riscansione{self._rescans}_{{n}}.{{file_type}}.part", journal=False,
+                        skip_empty=self.skip_empty, alignment=self.alignment, instruments=self.instruments,
+                        signatures=self.matcher, validate=self.validate, reassemble=self.reassemble,
+                        index_only=self.index_only, queue_depth=self.queue_depth, direct=self.direct,
+                        rescue=self.rescue, retries=self.retries, scope=self.scope)
+        stop = carver.carve_range(start, stop_when=synced)
+        self.stats.merge(carver.stats)
+        return carver.records, stop
+
+def _highest_file_number(output_dir, name_pattern):
+    """Numero più alto tra i file già presenti in 'output_dir' con nomi del tipo 'name_pattern'."""
+    pattern = re.compile(re.escape(name_pattern).replace(r"\{n\}", r"(\d+)").replace(r"\{file_type\}", ".*"))
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
+        return 0
+    return max((int(match.group(1)) for match in map(pattern.fullmatch, names) if match), default=0)
+
+def _record_end(record):
+    """Offset a cui la scansione riprende dopo il file: la fine del primo frammento se è ricomposto."""
+    if record.fragments:
+        offset, length = record.fragments[0]
+        return offset + length
+    return record.offset + record.size
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Canali verso il processo principale, impostati all'avvio di ogni processo della scansione parallela
+_region_events = None
+_region_stop = None
+_region_parent = None
+
+def _init_region_worker(events, stop_event):
+    global _region_events, _region_stop, _region_parent
+    _region_events = events
+    _region_stop = stop_event
+    _region_parent = os.getppid()
+
+def _region_should_stop():
+    # Anche se il processo principale è terminato (crash): la ripresa elimina i file temporanei,
+    # un processo orfano continuerebbe a scriverne
+    return _region_stop.is_set() or os.getppid() != _region_parent
+
+def _carve_region(disk_path, output_dir, index, start, end, options):
+    """
+    Scansiona una regione in un processo separato; i file vengono salvati con
+    nomi temporanei. Restituisce i file, l'offset a cui si è fermata se è
+    stata interrotta (altrimenti None), le statistiche e la strumentazione
+    della regione (None se spenta).
+    """
+    carver = Carver(disk_path, output_dir,
+                    log=lambda message: _region_events.put(("log", index, message)),
+                    progress=lambda done: _region_events.put(("progress", index, done)),
+                    should_stop=_region_should_stop,
+                    name_pattern=f".regione{index}_{{n}}.{{file_type}}.part", journal=False, **options)
+    stop = carver.carve_range(start, end)
+    if os.getppid() != _region_parent:
+        # Nessuno riceverà il risultato né assegnerà altre regioni: il processo resterebbe in attesa per sempre
+        os._exit(1)
+    return carver.records, stop if carver.stopped() else None, carver.stats, carver.instruments
+
+def carve(source, output_dir, block_size=DEFAULT_BLOCK_SIZE, scan_mode="auto", map_window=DEFAULT_MAP_WINDOW,
+          workers=1, region_size=DEFAULT_REGION_SIZE, writer_threads=DEFAULT_WRITER_THREADS,
+          log=None, progress=None, should_stop=None, resume=True, skip_empty=True, alignment=0,
+          signatures=None, validate=True, dedup="off", reassemble=True, index_only=False,
+          queue_depth=DEFAULT_QUEUE_DEPTH, direct=False, rescue=True, retries=DEFAULT_RETRIES,
+          unallocated=False, partition=None):
+    """
+    Recupera i file da 'source' (disco fisico o immagine) salvandoli in
+    'output_dir' (creata se non esiste). Restituisce la lista dei CarvedFile recuperati.
+    'log' riceve i messaggi della scansione, 'progress' i byte analizzati.
+    Con resume=False una scansione interrotta non viene ripresa ma ricominciata;
+    con skip_empty=False vengono scandite anche le zone vuote della sorgente.
+    Con 'alignment' (es. 512 o 4096) gli header vengono cercati solo agli
+    offset multipli di quel valore, dove i file system fanno iniziare i file.
+    'signatures' sostituisce le firme predefinite (vedi database.load_signatures).
+    Con validate=False i file vengono recuperati senza i controlli strutturali
+    delle firme (chiave 'validator'). Con dedup="skip" i file con un contenuto
+    già recuperato (anche da scansioni precedenti nella stessa cartella) non
+    vengono salvati, con dedup="link" diventano collegamenti fisici al primo.
+    Con reassemble=False i file JPEG e ZIP divisi in due frammenti non
+    vengono ricomposti (vedi fragments). Con index_only=True i file non
+    vengono salvati ma elencati nell'indice della cartella di output, da cui
+    Carver.extract_index li estrae in seguito senza scansionare di nuovo.
+    In modalità "queued" (scelta da "auto" per i dischi fisici) 'queue_depth'
+    letture di un blocco restano in corso insieme; con direct=True la
+    sorgente viene letta con O_DIRECT, senza passare dalla cache del sistema.
+    I settori illeggibili vengono ritentati 'retries' volte e poi sostituiti
+    da zeri, registrandoli nella mappa degli errori della cartella di output
+    (vedi rescue); con rescue=False il primo errore di lettura ferma la
+    scansione. Con unallocated=True gli header vengono cercati solo nello
+    spazio non allocato (fuori dalle partizioni e nei cluster liberi dei file
+    system FAT, exFAT e NTFS), con 'partition' (numero da 1) solo in quella
+    partizione; insieme, nei cluster liberi della partizione (vedi volumes).
+    """
+    carver = Carver(source, output_dir, block_size, scan_mode, map_window, workers, region_size, writer_threads,
+                    log=log, progress=progress, should_stop=should_stop, resume=resume, skip_empty=skip_empty,
+                    alignment=alignment, signatures=signatures, validate=validate, dedup=dedup,
+                    reassemble=reassemble, index_only=index_only, queue_depth=queue_depth, direct=direct,
+                    rescue=rescue, retries=retries, unallocated=unallocated, partition=partition)
+    return carver.carve()
@@ -0,0 +1,395 @@
+"""
+Ricomposizione dei file divisi in due frammenti (bifragment gap carving).
+
+Un file system che non trova spazio contiguo salva il file in più parti: il
+carving contiguo recupera allora il primo frammento seguito da byte di altri
+file. Quando la ricerca del footer trova la fine di un file JPEG o ZIP, la
+funzione della firma (chiave 'fragments') controlla che il file sia
+coerente fino a lì; se non lo è cerca il secondo frammento e restituisce i
+frammenti [(offset, lunghezza), (offset, lunghezza)] del file ricomposto.
+Restituisce None se il file è contiguo (o non verificabile) e una lista
+vuota se è frammentato ma non ricomponibile: in quel caso viene recuperato
+come prima, contiguo.
+
+I frammenti iniziano e finiscono a multipli di FRAGMENT_SECTOR (i cluster
+dei file system sono multipli del settore) e le ricerche usano solo letture
+mirate: la struttura del file, i footer successivi e la coda del secondo
+frammento, letta all'indietro dal footer.
+
+- JPEG: nei dati compressi 0xFF è seguito solo da 0x00, da un marcatore RST
+  nella sequenza 0-7 (se c'è un intervallo di restart) o da EOI. Il primo
+  byte che viola queste regole (o un settore di zeri) indica il settore in
+  cui finisce il primo frammento; la coda che termina con uno dei footer
+  successivi, risalita fino all'ultimo byte non valido, dà il secondo. La
+  coda deve proseguire la sequenza dei RST e non essere la fine di un altro
+  JPEG che inizia nello spazio tra i due frammenti.
+- ZIP: il record finale dice dove la directory centrale dovrebbe iniziare;
+  la differenza con dove si trova è la lunghezza esatta dello spazio tra i
+  frammenti. Gli header locali elencati nella directory centrale dicono tra
+  quali elementi passa la divisione, e il punto esatto si trova
+  decomprimendo l'elemento diviso e controllandone il CRC.
+"""
+import re
+import struct
+import zlib
+from collections import deque
+
+from .readers import EXTRACT_CHUNK_SIZE
+from .validators import JPEG_STANDALONE
+
+# Granularità dei frammenti: inizio e fine cadono a multipli del settore
+FRAGMENT_SECTOR = 512
+# Coda minima del secondo frammento JPEG (un cluster da 4 KB): una coda più corta
+# può essere rumore che per caso somiglia a dati compressi e termina con 0xFF 0xD9
+JPEG_MIN_TAIL = 8 * FRAGMENT_SECTOR
+# Punti di divisione provati (in settori) prima di quello in cui la decompressione dell'elemento ZIP diviso fallisce
+ZIP_MAX_SPLITS = 256
+
+def _read(reader, pos, size):
+    """Legge [pos, pos + size) anche oltre un blocco; più corto solo a fine disco."""
+    parts = []
+    end = pos + size
+    while pos < end:
+        chunk = bytes(reader.read_at(pos, end - pos))
+        if not chunk:
+            break
+        parts.append(chunk)
+        pos += len(chunk)
+    return b"".join(parts)
+
+def _align_up(value):
+    return value + (-value % FRAGMENT_SECTOR)
+
+# --- JPEG ---
+
+# 0xFF seguito da un byte diverso dal riempimento 0x00: un marcatore nei dati compressi
+_JPEG_MARK = re.compile(rb"\xff[^\x00]")
+# Segmenti ammessi tra le scansioni di un JPEG progressivo
+JPEG_SCAN_SEGMENTS = frozenset([0xC4, 0xCC, 0xDA, 0xDB, 0xDC, 0xDD, 0xFE, *range(0xE0, 0xF0)])
+# SOF dei JPEG progressivi: la coda sarebbe l'ultima scansione, non verificabile da sola
+JPEG_PROGRESSIVE = frozenset([0xC2, 0xC6, 0xCA, 0xCE])
+# SOF55 (JPEG-LS): i dati compressi seguono altre regole
+JPEG_LS = 0xF7
+_ZERO_SECTOR = bytes(FRAGMENT_SECTOR)
+# RST ricordati del primo frammento: basta l'ultimo prima della divisione
+JPEG_RECENT_RST = 16
+
+def _jpeg_marks(chunk, start, stop):
+    """Posizioni e marcatori dei 0xFF seguiti da qualcosa di diverso da 0x00 in chunk[start:stop]."""
+    pos = start
+    while (match := _JPEG_MARK.search(chunk, pos, stop)) is not None:
+        pos = match.start() + 1
+        yield pos - 1, chunk[pos]
+
+def _jpeg_entropy(reader, pos, end, restart, rsts):
+    """
+    Segue i dati compressi da 'pos'. Restituisce ("eoi", fine dell'EOI),
+    ("segment", inizio del segmento successivo), ("break", primo byte non
+    valido) oppure ("end", end). I RST trovati finiscono in 'rsts' come
+    (posizione, indice).
+    """
+    expected = 0
+    while pos < end:
+        chunk = bytes(reader.read_at(pos, end - pos))
+        if len(chunk) < 2:
+            break
+        zeros = chunk.find(_ZERO_SECTOR)
+        for i, marker in _jpeg_marks(chunk, 0, len(chunk) if zeros == -1 else zeros):
+            if marker == 0xFF:  # Riempimento prima di un marcatore
+                continue
+            if 0xD0 <= marker <= 0xD7 and restart and marker - 0xD0 == expected:
+                rsts.append((pos + i, expected))
+                expected = (expected + 1) % 8
+            elif marker == 0xD9:
+                return "eoi", pos + i + 2
+            elif marker in JPEG_SCAN_SEGMENTS:
+                return "segment", pos + i
+            else:
+                return "break", pos + i + 1
+        if zeros != -1:
+            return "break", pos + zeros
+        # L'ultimo byte può essere un 0xFF seguito dal marcatore nel blocco successivo
+        pos += len(chunk) - 1
+    return "end", end
+
+def _walk_jpeg(reader, start, end):
+    """
+    Segue il JPEG da 'start' fino a EOI o a 'end': i segmenti tramite la loro
+    lunghezza, i dati compressi cercando i marcatori. Restituisce (esito,
+    posizione, inizio dei dati, intervallo di restart, progressivo, RST):
+    gli esiti sono quelli di _jpeg_entropy più "header" se i segmenti prima
+    dei dati non sono validi.
+    """
+    pos = start + 2
+    data_start = None
+    restart = 0
+    progressive = False
+    rsts = deque(maxlen=JPEG_RECENT_RST)
+    while pos < end:
+        segment = bytes(reader.read_at(pos, 6))
+        if len(segment) < 2 or segment[0] != 0xFF:
+            kind = "header"
+        elif segment[1] == 0xFF:  # Riempimento prima del marcatore
+            pos += 1
+            continue
+        elif segment[1] in JPEG_STANDALONE:
+            pos += 2
+            continue
+        elif segment[1] == 0xD9:
+            return "eoi", pos + 2, data_start, restart, progressive, rsts
+        elif segment[1] == JPEG_LS:
+            return "end", end, data_start, restart, progressive, rsts
+        elif segment[1] in (0x00, 0xD8) or len(segment) < 4 or segment[2] << 8 | segment[3] < 2:
+            kind = "header"
+        else:
+            marker = segment[1]
+            if marker == 0xDD and len(segment) == 6:
+                restart = segment[4] << 8 | segment[5]
+            progressive = progressive or marker in JPEG_PROGRESSIVE
+            pos += 2 + (segment[2] << 8 | segment[3])
+            if marker != 0xDA:
+                continue
+            if data_start is None:
+                data_start = pos
+            rsts.clear()  # La numerazione dei RST riparte a ogni scansione
+            kind, pos = _jpeg_entropy(reader, pos, end, restart, rsts)
+            if kind == "segment":
+                continue
+            return kind, pos, data_start, restart, progressive, rsts
+        # Segmenti non validi dopo i primi dati compressi: lì finisce il frammento
+        return ("header" if data_start is None else "break"), pos, data_start, restart, progressive, rsts
+    return "end", end, data_start, restart, progressive, rsts
+
+def _jpeg_tail(reader, split, footer_pos, restart, next_rst):
+    """
+    Inizio del secondo frammento che termina con l'EOI in 'footer_pos': il
+    primo settore dopo l'ultimo byte che non può far parte dei dati
+    compressi, cercato all'indietro da 'footer_pos' fino a 'split'. None se
+    la coda è troppo corta o se i suoi RST non proseguono con 'next_rst'.
+    """
+    tail_rsts = []  # (posizione, indice) dei RST della coda, dall'ultimo
+    pos = footer_pos
+    garbage = None
+    while garbage is None and pos > split:
+        chunk_start = max(split, pos - EXTRACT_CHUNK_SIZE)
+        # Un byte in più: la coppia che inizia nell'ultimo byte del blocco precedente
+        chunk = _read(reader, chunk_start, pos - chunk_start + 1)
+        zeros = chunk.rfind(_ZERO_SECTOR)
+        for i, marker in reversed(list(_jpeg_marks(chunk, 0, len(chunk)))):
+            if i < zeros:
+                break
+            if marker == 0xFF:
+                continue
+            later = tail_rsts[-1][1] if tail_rsts else None
+            if 0xD0 <= marker <= 0xD7 and restart and (later is None or (marker - 0xD0 + 1) % 8 == later):
+                tail_rsts.append((chunk_start + i, marker - 0xD0))
+                continue
+            garbage = chunk_start + i + 2
+            break
+        if garbage is None and zeros != -1:
+            garbage = chunk_start + zeros + FRAGMENT_SECTOR
+        pos = chunk_start
+    if garbage is None:
+        return None
+    tail_start = _align_up(garbage)
+    if footer_pos + 2 - tail_start < JPEG_MIN_TAIL:
+        return None
+    first = next((index for rst_pos, index in reversed(tail_rsts) if rst_pos >= tail_start), None)
+    if restart and first is not None and first != next_rst:
+        return None
+    return tail_start
+
+def _other_jpeg_end(reader, gap_start, gap_end, footer_pos):
+    """Vero se l'EOI in 'footer_pos' chiude un altro JPEG che inizia in [gap_start, gap_end)."""
+    pos = gap_start
+    while (other := reader.find(b"\xff\xd8\xff", pos, gap_end)) != -1:
+        kind, end, *_ = _walk_jpeg(reader, other, footer_pos + 2)
+        if kind == "eoi" and end == footer_pos + 2:
+            return True
+        pos = other + 1
+    return False
+
+def jpeg_fragments(reader, start, end, limit):
+    """
+    JPEG terminato in 'end' (dopo il primo EOI trovato): frammenti del file
+    ricomposto, [] se frammentato ma non ricomponibile, None se coerente
+    fino a 'end'. Il secondo frammento termina con uno degli EOI entro 'limit'.
+    """
+    kind, broken, data_start, restart, progressive, rsts = _walk_jpeg(reader, start, end)
+    if kind != "break":
+        return None
+    # Il primo frammento finisce con il settore che precede quello del primo byte estraneo
+    split = start + (broken - start) // FRAGMENT_SECTOR * FRAGMENT_SECTOR
+    if progressive or split <= data_start:
+        return []
+    last_rst = next((index for rst_pos, index in reversed(rsts) if rst_pos < split), -1)
+    footer_pos = end - 2
+    while footer_pos != -1:
+        tail_start = _jpeg_tail(reader, split, footer_pos, restart, (last_rst + 1) % 8)
+        if (tail_start is not None and (split - start) + (footer_pos + 2 - tail_start) <= limit - start
+                and not _other_jpeg_end(reader, split, tail_start, footer_pos)):
+            return [(start, split - start), (tail_start, footer_pos + 2 - tail_start)]
+        footer_pos = reader.find(b"\xff\xd9", footer_pos + 2, limit)
+    return []
+
+# --- ZIP ---
+
+ZIP_LOCAL = struct.Struct("<4sHHHHHIIIHH")
+ZIP_CENTRAL = struct.Struct("<4sHHHHHHIIIHHHHHII")
+ZIP_EOCD = struct.Struct("<4sHHHHIIH")
+ZIP64_MARKER = 0xFFFFFFFF
+# Metodi di cui si sa controllare il contenuto: store e deflate
+ZIP_STORED, ZIP_DEFLATED = 0, 8
+
+def _zip_central(directory, count):
+    """Elementi della directory centrale come (offset, nome, metodo, flag, crc, compressi, originali)."""
+    entries = []
+    pos = 0
+    for _ in range(count):
+        if pos + ZIP_CENTRAL.size > len(directory):
+            return None
+        (signature, _, _, flags, method, _, _, crc, compressed, original, name_len, extra_len, comment_len,
+         _, _, _, offset) = ZIP_CENTRAL.unpack_from(directory, pos)
+        if signature != b"PK\x01\x02":
+            return None
+        name = directory[pos + ZIP_CENTRAL.size:pos + ZIP_CENTRAL.size + name_len]
+        entries.append((offset, name, method, flags, crc, compressed, original))
+        pos += ZIP_CENTRAL.size + name_len + extra_len + comment_len
+    return sorted(entries)
+
+def _zip_local(reader, pos, entry):
+    """Lunghezza dell'header locale di 'entry' se si trova in 'pos', altrimenti None."""
+    _, name, method, *_ = entry
+    head = bytes(reader.read_at(pos, ZIP_LOCAL.size + len(name)))
+    if len(head) < ZIP_LOCAL.size + len(name):
+        return None
+    signature, _, _, local_method, _, _, _, _, _, name_len, extra_len = ZIP_LOCAL.unpack_from(head)
+    if signature != b"PK\x03\x04" or local_method != method or head[ZIP_LOCAL.size:] != name:
+        return None
+    return ZIP_LOCAL.size + name_len + extra_len
+
+def _zip_states(reader, start, data, data_end, high, method):
+    """
+    Stato della decompressione dell'elemento diviso a ogni settore tra 'data'
+    e il primo byte che non si decomprime o chiude lo stream prima della
+    fine dei dati (o 'high'), leggendo il primo
+    frammento come se continuasse: (divisione, decompressore, crc, byte
+    prodotti) per gli ultimi ZIP_MAX_SPLITS settori.
+    """
+    states = deque(maxlen=ZIP_MAX_SPLITS)
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == ZIP_DEFLATED else None
+    crc = produced = 0
+    pos = data
+    stop = min(data_end, high)
+    while True:
+        if pos == data or pos % FRAGMENT_SECTOR == 0:
+            states.append((pos, decompressor.copy() if decompressor else None, crc, produced))
+        if pos >= stop:
+            return states
+        step = min(_align_up(pos + 1), stop) - pos
+        chunk = _read(reader, start + pos, step)
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk)
+            except zlib.error:
+                return states
+            if decompressor.eof and pos + step < data_end:
+                return states  # Fine dello stream deflate prima della fine dei dati: rumore
+        crc = zlib.crc32(chunk, crc)
+        produced += len(chunk)
+        pos += step
+
+def _zip_continues(reader, start, gap, entry, data_end, state):
+    """Vero se l'elemento diviso in state[0] si completa con il secondo frammento e ha il CRC della directory."""
+    split, decompressor, crc, produced = state
+    _, _, _, _, expected_crc, _, original = entry
+    if decompressor is not None:
+        decompressor = decompressor.copy()
+    pos = split
+    while pos < data_end:
+        chunk = _read(reader, start + gap + pos, min(EXTRACT_CHUNK_SIZE, data_end - pos))
+        if not chunk:
+            return False
+        pos += len(chunk)
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk)
+            except zlib.error:
+                return False
+        crc = zlib.crc32(chunk, crc)
+        produced += len(chunk)
+        if produced > original:
+            return False
+    if decompressor is not None and not (decompressor.eof and not decompressor.unused_data):
+        return False
+    return produced == original and crc == expected_crc
+
+def zip_fragments(reader, start, end, limit):
+    """
+    ZIP terminato in 'end' (dopo il record finale): frammenti dell'archivio
+    ricomposto, [] se frammentato ma non ricomponibile, None se la directory
+    centrale si trova dove dice il record finale (archivio contiguo).
+    """
+    tail_start = max(start, end - ZIP_EOCD.size - 0xFFFF)
+    tail = _read(reader, tail_start, end - tail_start)
+    eocd = tail.rfind(b"PK\x05\x06")
+    while eocd != -1 and (eocd + ZIP_EOCD.size > len(tail)
+                          or eocd + ZIP_EOCD.size + ZIP_EOCD.unpack_from(tail, eocd)[7] != len(tail)):
+        eocd = tail.rfind(b"PK\x05\x06", 0, eocd)
+    if eocd == -1:
+        return None
+    _, disk, cd_disk, _, count, cd_size, cd_offset, _ = ZIP_EOCD.unpack_from(tail, eocd)
+    eocd_pos = tail_start + eocd
+    gap = eocd_pos - start - (cd_offset + cd_size)
+    if gap == 0 or ZIP64_MARKER in (cd_size, cd_offset):
+        return None
+    if gap < 0 or gap % FRAGMENT_SECTOR or disk or cd_disk or not count:
+        return []
+    entries = _zip_central(_read(reader, eocd_pos - cd_size, cd_size), count)
+    if not entries or entries[0][0] != 0:
+        return []
+
+    # Elementi nel primo frammento, poi nel secondo: la divisione cade tra gli ultimi due
+    low = high = None  # Inizio dei dati dell'ultimo elemento del primo frammento, inizio del secondo
+    divided = None
+    for entry in entries:
+        offset = entry[0]
+        if high is None:
+            header = _zip_local(reader, start + offset, entry)
+            if header is not None:
+                low, divided = offset + header, entry
+                continue
+            high = offset
+        if _zip_local(reader, start + gap + offset, entry) is None:
+            return []
+    if divided is None:
+        return []
+    if high is None:
+        high = cd_offset
+    _, _, method, flags, _, compressed, _ = divided
+    if method not in (ZIP_STORED, ZIP_DEFLATED) or flags & 0x01:  # Cifrato: contenuto non verificabile
+        return []
+
+    data_end = low + compressed
+    for state in reversed(_zip_states(reader, start, low, data_end, high, method)):
+        split = state[0]
+        if split == data_end:
+            # Dati tutti nel primo frammento: la divisione cade dopo, al più nel
+            # descrittore dei dati, ed è verificabile solo se un settore è possibile
+            splits = range(_align_up(data_end), high + 1, FRAGMENT_SECTOR)
+            if len(splits) != 1:
+                continue
+            split = splits[0]
+        elif split % FRAGMENT_SECTOR:
+            continue
+        if not _zip_continues(reader, start, gap, divided, data_end, state):
+            continue
+        size = end - start - gap
+        return [(start, split), (start + split + gap, size - split)]
+    return []
+
+# Nome della ricomposizione (chiave 'fragments' delle firme) -> funzione
+REASSEMBLERS = {
+    "jpeg": jpeg_fragments,
+    "zip": zip_fragments,
+}
@@ -0,0 +1,155 @@
+"""
+Indice della scansione: i file trovati senza salvarli, per estrarli dopo.
+
+Una scansione con index_only=True legge la sorgente una volta sola e, invece
+di salvare i file, scrive nella cartella di output (INDEX_NAME) una voce di
+dimensione fissa per ogni file trovato: offset, lunghezza, frammenti, tipo e
+flag. L'estrazione (Carver.extract_index) legge poi dalla sorgente solo gli
+intervalli elencati, in ordine di offset, e si può ripetere con altri tipi o
+in altre cartelle senza scansionare di nuovo il disco.
+
+Il file è un'intestazione (_HEADER più un JSON con sorgente, dimensione e
+tipi) seguita dalle voci (_ENTRY, 36 byte l'una). Come per il registro, i
+checkpoint del cursore nell'intestazione permettono di riprendere una
+scansione interrotta; una voce troncata da un crash viene ignorata.
+"""
+import json
+import os
+import struct
+import time
+from collections import namedtuple
+
+from .journal import CHECKPOINT_INTERVAL
+
+INDEX_NAME = ".recoverflow_index"
+INDEX_MAGIC = b"RFINDEX\x01"
+# Voci lette per volta dal file dell'indice
+READ_ENTRIES = 64 * 1024
+
+# Intestazione: magic, offset fino a cui l'indice è completo, scansione finita, lunghezza del JSON
+_HEADER = struct.Struct("<8sQ?3xI")
+_CURSOR = struct.Struct("<Q?")
+# Voce: offset, lunghezza totale, lunghezza del primo frammento e offset del secondo
+# (entrambi 0 per i file contigui), numero del tipo, flag
+_ENTRY = struct.Struct("<QQQQHH")
+
+# Flag delle voci
+INDEX_VALIDATED = 1  # Ha superato il controllo strutturale della firma
+INDEX_AT_LIMIT = 2  # Senza footer, arriva a max_size o alla fine della sorgente (forse troncato)
+INDEX_REASSEMBLED = 4  # Ricomposto da due frammenti
+
+# Un file dell'indice; 'fragments' come in CarvedFile (None per i file contigui)
+IndexEntry = namedtuple("IndexEntry", "offset size file_type fragments flags")
+# Intestazione letta: sorgente e sua dimensione, estensioni per tipo, offset fino a
+# cui l'indice è completo, se la scansione è finita e numero di voci
+IndexState = namedtuple("IndexState", "source size extensions cursor done count")
+
+def index_path(path):
+    """Percorso dell'indice: 'path' stesso oppure INDEX_NAME se 'path' è una cartella."""
+    return os.path.join(path, INDEX_NAME) if os.path.isdir(path) else path
+
+class ScanIndex:
+    """
+    File dell'indice di una scansione: scritto in ordine di offset dalla
+    scansione con index_only=True, letto dall'estrazione. I tipi sono salvati
+    come numeri; i nomi e le estensioni stanno nell'intestazione, così
+    l'estrazione non ha bisogno del database di firme usato per la scansione.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._types = None  # Nome del tipo -> numero nelle voci
+        self._names = None
+        self._data_start = 0
+        self._size = 0
+        self._last_sync = 0.0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Legge l'intestazione: IndexState, oppure None se il file manca o non è un indice."""
+        try:
+            with open(self.path, "rb") as f:
+                magic, cursor, done, length = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return None
+                header = json.loads(f.read(length))
+                count = (os.fstat(f.fileno()).st_size - _HEADER.size - length) // _ENTRY.size
+        except (OSError, ValueError, struct.error):
+            return None
+        self._names = header["types"]
+        self._size = header["size"]
+        self._data_start = _HEADER.size + length
+        return IndexState(header["source"], header["size"], header["extensions"], cursor, done, count)
+
+    def entries(self, stop=None):
+        """Voci in ordine di offset (quelle prima di 'stop', se indicato), lette a gruppi."""
+        names = self._names
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start)
+            while chunk := f.read(READ_ENTRIES * _ENTRY.size):
+                whole = len(chunk) - len(chunk) % _ENTRY.size  # Una voce troncata da un crash
+                for offset, size, first, second, number, flags in _ENTRY.iter_unpack(chunk[:whole]):
+                    if stop is not None and offset >= stop:
+                        return
+                    fragments = [(offset, first), (second, size - first)] if first else None
+                    yield IndexEntry(offset, size, names[number], fragments, flags)
+                if whole < len(chunk):
+                    return
+
+    def start(self, source, size, extensions):
+        """Inizia un nuovo indice, sostituendo quello di un'eventuale altra scansione."""
+        self._names = sorted(extensions)
+        self._size = size
+        header = json.dumps({"source": source, "size": size, "types": self._names,
+                             "extensions": extensions}).encode()
+        self._types = {name: number for number, name in enumerate(self._names)}
+        self._file = open(self.path, "wb")
+        self._file.write(_HEADER.pack(INDEX_MAGIC, 0, False, len(header)) + header)
+        self._sync()
+
+    def resume(self, cursor):
+        """Continua l'indice letto con load(): le voci da 'cursor' in poi vengono eliminate."""
+        kept = sum(1 for _ in self.entries(cursor))
+        self._types = {name: number for number, name in enumerate(self._names)}
+        self._file = open(self.path, "r+b")
+        self._file.truncate(self._data_start + kept * _ENTRY.size)
+        self._file.seek(0, os.SEEK_END)
+
+    def add(self, record, flags=0):
+        """Aggiunge un CarvedFile (o un IndexEntry): le voci arrivano in ordine di offset."""
+        if record.fragments:
+            (_, first), (second, _) = record.fragments  # La ricomposizione dà sempre due frammenti
+        else:
+            first = second = 0
+        self._file.write(_ENTRY.pack(record.offset, record.size, first, second, self._types[record.file_type],
+                                     flags))
+
+    def checkpoint(self, cursor, force=False):
+        """Registra che l'indice è completo fino a 'cursor' (solo se è passato CHECKPOINT_INTERVAL)."""
+        if force or time.monotonic() - self._last_sync >= CHECKPOINT_INTERVAL:
+            self._write_cursor(cursor, False)
+
+    def finish(self):
+        self._write_cursor(self._size, True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_cursor(self, cursor, done):
+        # Le voci devono arrivare sul disco prima del cursore che le dichiara complete
+        self._sync()
+        end = self._file.tell()
+        self._file.seek(len(INDEX_MAGIC))
+        self._file.write(_CURSOR.pack(cursor, done))
+        self._file.seek(end)
+        self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
@@ -0,0 +1,109 @@
+"""Registro della scansione: permette di riprendere una scansione interrotta."""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+JOURNAL_NAME = ".recoverflow_journal"
+JOURNAL_VERSION = 1
+# Intervallo minimo in secondi tra due checkpoint (e quindi tra due fsync)
+CHECKPOINT_INTERVAL = 2.0
+
+# Stato letto dal registro: offset da cui riprendere, file recuperati
+# [offset, dimensione, tipo, nome, numero, frammenti o None], primo numero dei nomi e se la scansione è finita
+JournalState = namedtuple("JournalState", "cursor files first_number done")
+
+class ScanJournal:
+    """
+    Registro append-only nella cartella di output, una riga JSON per evento:
+    l'intestazione (sorgente, dimensione, primo numero dei nomi dei file), i
+    file recuperati, i checkpoint del cursore di scansione e la fine della
+    scansione. Un checkpoint 'cursor' garantisce che tutti i file che iniziano
+    prima del cursore sono già scritti e registrati.
+
+    Ogni riga arriva subito al sistema operativo (sopravvive a un crash del
+    processo), ma fsync viene chiamato solo ai checkpoint, al massimo ogni
+    CHECKPOINT_INTERVAL secondi. Una riga troncata da un crash viene ignorata.
+    """
+
+    def __init__(self, output_dir, source, size):
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        self.source = source
+        self.size = size
+        self._file = None
+        self._lock = threading.Lock()  # add_file viene chiamato dai thread di scrittura
+        self._last_sync = 0.0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Legge il registro di una scansione precedente della stessa sorgente: JournalState oppure None."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # Riga vuota o troncata
+        if not entries:
+            return None
+        header = entries[0]
+        if (header.get("journal") != JOURNAL_VERSION or header.get("source") != self.source
+                or header.get("size") != self.size):
+            return None
+        cursor = 0
+        files = {}  # Per nome: un file riscritto dopo una ripresa compare due volte
+        done = False
+        for entry in entries[1:]:
+            if "file" in entry:
+                # I file ricomposti hanno in più i frammenti [[offset, lunghezza], ...]
+                files[entry["file"][3]] = (entry["file"] + [None])[:6]
+            elif "cursor" in entry:
+                cursor = entry["cursor"]
+            elif "done" in entry:
+                done = True
+        return JournalState(cursor, list(files.values()), header["first"], done)
+
+    def start(self, first_number):
+        """Inizia un nuovo registro, sostituendo quello di un'eventuale altra scansione."""
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._append({"journal": JOURNAL_VERSION, "source": self.source, "size": self.size,
+                      "first": first_number}, sync=True)
+
+    def resume(self):
+        """Continua il registro esistente."""
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("\n")  # Chiude un'eventuale ultima riga troncata
+
+    def add_file(self, record, number):
+        entry = [record.offset, record.size, record.file_type, os.path.basename(record.path), number]
+        if record.fragments:
+            entry.append([list(fragment) for fragment in record.fragments])
+        self._append({"file": entry})
+
+    def checkpoint(self, cursor, force=False):
+        """Registra che la scansione può riprendere da 'cursor' (solo se è passato CHECKPOINT_INTERVAL)."""
+        if force or time.monotonic() - self._last_sync >= CHECKPOINT_INTERVAL:
+            self._append({"cursor": cursor}, sync=True)
+
+    def finish(self):
+        self._append({"done": True}, sync=True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append(self, entry, sync=False):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
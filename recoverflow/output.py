@@ -0,0 +1,249 @@
+"""Scrittura asincrona (write-behind) dei file recuperati."""
+import errno
+import hashlib
+import io
+import os
+import queue
+import threading
+import time
+
+from .readers import MIN_BLOCK_SIZE, BlockReader
+
+# Thread che scrivono i file recuperati (0 = scrittura sincrona nel thread della scansione)
+DEFAULT_WRITER_THREADS = 4
+# Limite dei dati in attesa di scrittura: oltre questa soglia la scansione si ferma
+# finché i thread di scrittura non recuperano (back-pressure)
+DEFAULT_WRITE_BACKLOG = 256 * 1024 * 1024
+MAX_PENDING_FILES = 1024
+# Con la deduplicazione i file fino a questa dimensione vengono letti in memoria
+# e scritti solo se nuovi; quelli più grandi vengono scritti mentre se ne
+# calcola l'hash ed eliminati se sono copie
+DEDUP_BUFFER_SIZE = 16 * 1024 * 1024
+# Byte copiati dal kernel per ogni chiamata a copy_file_range/sendfile
+KERNEL_COPY_CHUNK = 16 * 1024 * 1024
+# Errori con cui copy_file_range/sendfile segnalano che la copia tra questi file non è supportata
+_UNSUPPORTED_COPY = {errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF, errno.ENOTSUP,
+                     getattr(errno, "EOPNOTSUPP", errno.ENOTSUP)}
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset)
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+# Copie eseguite dal kernel, senza passare i dati in Python, in ordine di preferenza
+KERNEL_COPY_METHODS = [method for name, method in (("copy_file_range", _copy_file_range),
+                                                   ("sendfile", _sendfile)) if hasattr(os, name)]
+
+class FileWriter:
+    """
+    Coda di scrittura dei file recuperati. La scansione accoda solo
+    (offset, dimensione, percorso) e continua: un gruppo di thread copia i
+    byte direttamente dalla sorgente al file di destinazione, con
+    copy_file_range o sendfile quando il sistema li supporta (i dati non
+    passano da oggetti Python), altrimenti con un BlockReader per thread.
+
+    Se i dati in attesa superano 'backlog' byte (o MAX_PENDING_FILES file),
+    submit() attende che i thread liberino spazio. flush() attende che tutti
+    i file accodati siano scritti; close() chiude anche i thread. I percorsi
+    dei file non salvati finiscono in 'failed'; per quelli salvati viene
+    chiamata l'eventuale funzione 'on_saved' passata a submit().
+
+    Con 'dedup' (un dedup.DedupIndex) i byte passano da Python per
+    calcolarne lo SHA-256: un file già presente nell'indice non viene
+    scritto (modalità "skip") oppure diventa un collegamento fisico al primo
+    (modalità "link", per cui viene chiamata anche 'on_saved'). I percorsi
+    delle copie finiscono in 'duplicates' con il file che le contiene.
+
+    Con 'rescue' (un rescue.SectorRescue) un settore illeggibile non fa
+    fallire il file: la copia prosegue con il BlockReader, che lo sostituisce
+    con zeri.
+    """
+
+    def __init__(self, source_path, source_size, threads=DEFAULT_WRITER_THREADS,
+                 backlog=DEFAULT_WRITE_BACKLOG, log=None, instruments=None, dedup=None, rescue=None):
+        self.source_path = source_path
+        self.source_size = source_size
+        self.backlog = backlog
+        self.log = log or (lambda message: None)
+        self.instruments = instruments  # Se presente misura la fase 'write'
+        self.dedup = dedup
+        self.rescue = rescue
+        self.failed = set()
+        self.duplicates = {}  # Copia non scritta o collegata -> file con lo stesso contenuto
+        self._methods = list(KERNEL_COPY_METHODS)
+        self._pending_bytes = 0
+        self._pending_files = 0
+        self._pending_offsets = {}  # Offset nella sorgente -> file accodati o in scrittura
+        self._cond = threading.Condition()
+        self._queue = queue.SimpleQueue()
+        self._threads = [threading.Thread(target=self._run, name=f"recoverflow-writer-{i}", daemon=True)
+                         for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+        # Senza thread i file vengono scritti subito, con una sorgente aperta una volta sola
+        self._inline = None if self._threads else self._open_source()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, offset, size, path, on_saved=None, fragments=None):
+        """
+        Accoda la scrittura dei byte [offset, offset + size) della sorgente in
+        'path', oppure dei 'fragments' [(offset, lunghezza), ...] uno dopo
+        l'altro (file ricomposti; 'size' è allora la loro somma).
+        """
+        extents = fragments or [(offset, size)]
+        if self._inline:
+            self._write(*self._inline, extents, path, on_saved)
+            return
+        with self._cond:
+            # Un file più grande dell'intero limite passa comunque, ma da solo
+            while self._pending_files and (self._pending_bytes + size > self.backlog
+                                           or self._pending_files >= MAX_PENDING_FILES):
+                self._cond.wait()
+            self._pending_bytes += size
+            self._pending_files += 1
+            self._pending_offsets[offset] = self._pending_offsets.get(offset, 0) + 1
+        self._queue.put((extents, path, on_saved))
+
+    def pending_offset(self):
+        """Offset più basso tra i file non ancora scritti, oppure None."""
+        with self._cond:
+            return min(self._pending_offsets, default=None)
+
+    def flush(self):
+        """Attende che tutti i file accodati siano stati scritti."""
+        with self._cond:
+            while self._pending_files:
+                self._cond.wait()
+
+    def close(self):
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._inline:
+            self._inline[0].close()
+            self._inline = None
+
+    def _open_source(self):
+        src = open(self.source_path, "rb", buffering=0)
+        return src, BlockReader(src, self.source_size, MIN_BLOCK_SIZE, rescue=self.rescue)
+
+    def _run(self):
+        src, reader = self._open_source()
+        with src:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                extents, path, on_saved = job
+                offset = extents[0][0]
+                size = sum(length for _, length in extents)
+                try:
+                    self._write(src, reader, extents, path, on_saved)
+                finally:
+                    with self._cond:
+                        self._pending_bytes -= size
+                        self._pending_files -= 1
+                        self._pending_offsets[offset] -= 1
+                        if not self._pending_offsets[offset]:
+                            del self._pending_offsets[offset]
+                        self._cond.notify_all()
+
+    def _write(self, src, reader, extents, path, on_saved):
+        start = time.perf_counter()
+        try:
+            if self.dedup is None:
+                with open(path, "wb", buffering=0) as out_file:
+                    for offset, size in extents:
+                        self._copy(src, reader, out_file, offset, size)
+                existing = None
+            else:
+                existing = self._write_unique(reader, extents, path)
+            if self.instruments is not None:
+                self.instruments.add("write", time.perf_counter() - start, sum(size for _, size in extents))
+        except OSError as e:
+            self.failed.add(path)
+            self.log(f"ERRORE nel salvataggio di {path}: {e}")
+            if self.dedup is not None:
+                try:
+                    self.dedup.forget(path)
+                except OSError:
+                    pass
+            return
+        if existing is not None:
+            with self._cond:
+                self.duplicates[path] = existing
+            if self.instruments is not None:
+                self.instruments.count("duplicates")
+            if self.dedup.mode == "skip":
+                self.log(f"DUPLICATO di {existing}: non salvato")
+                return
+            self.log(f"DUPLICATO di {existing}: collegato in {path}")
+        else:
+            self.log(f"SALVATO: {path}")
+        if on_saved is not None:
+            on_saved()
+
+    def _write_unique(self, reader, extents, path):
+        """
+        Scrive il file solo se il suo contenuto non è nell'indice. Restituisce
+        None se è stato scritto, altrimenti il file con lo stesso contenuto
+        ('path' in quel caso è un collegamento a quel file oppure non esiste).
+        """
+        extents = [(offset, min(offset + size, self.source_size) - offset) for offset, size in extents]
+        size = sum(length for _, length in extents)
+        digest = hashlib.sha256()
+        if size <= DEDUP_BUFFER_SIZE:
+            data = io.BytesIO()
+            for offset, length in extents:
+                reader.copy_to(data, offset, length, digest)
+            # Il contenuto resta riservato finché il file non è scritto: una copia scritta insieme lo attende
+            with self.dedup.reserve(digest.digest(), size, path) as existing:
+                if existing is None:
+                    with open(path, "wb", buffering=0) as out_file:
+                        out_file.write(data.getbuffer())
+                    return None
+        else:
+            with open(path, "wb", buffering=0) as out_file:
+                for offset, length in extents:
+                    reader.copy_to(out_file, offset, length, digest)
+            existing = self.dedup.claim(digest.digest(), size, path)
+            if existing is None:
+                return None
+            os.remove(path)
+        if self.dedup.mode == "link" and not self.dedup.link(existing, path):
+            # Collegamenti non supportati dalla cartella di output: si salva una copia
+            self.log(f"Collegamento a {existing} non riuscito: salvo una copia.")
+            with open(path, "wb", buffering=0) as out_file:
+                for offset, length in extents:
+                    reader.copy_to(out_file, offset, length)
+            return None
+        return existing
+
+    def _copy(self, src, reader, out_file, offset, size):
+        end = min(offset + size, self.source_size)
+        while offset < end and self._methods:
+            method = self._methods[0]
+            try:
+                n = method(src.fileno(), out_file.fileno(), offset, min(end - offset, KERNEL_COPY_CHUNK))
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_COPY:
+                    if self.rescue is None:
+                        raise
+                    break  # Errore di lettura della sorgente: il resto passa dal lettore tollerante
+                # Non supportato per questa sorgente o destinazione: prova il metodo successivo
+                self._methods = [m for m in self._methods if m is not method]
+                continue
+            if n == 0:
+                break
+            offset += n
+        if offset < end:
+            reader.copy_to(out_file, offset, end - offset)
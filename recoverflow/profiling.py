@@ -0,0 +1,215 @@
+"""Strumentazione facoltativa del motore: tempi per fase, latenza delle letture e profiler a campionamento."""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Intervallo in secondi tra due istantanee scritte durante la scansione
+SNAPSHOT_INTERVAL = 10.0
+# Istogramma della latenza delle letture: il bucket i conta le letture sotto 2**i microsecondi
+LATENCY_BUCKETS = 24
+# Nomi dei file scritti nella cartella di output
+INSTRUMENTATION_NAME = "recoverflow_instrumentation.jsonl"
+PROFILE_NAME = "recoverflow_profile.txt"
+# Intervallo tra due campioni del profiler (5 ms)
+PROFILE_INTERVAL = 0.005
+
+class Instrumentation:
+    """
+    Tempi, chiamate e byte per ogni fase della scansione ('read', 'match',
+    'validate', 'footer', 'resolve', 'footerless', 'queue', 'write'), contatori e
+    istogramma della latenza delle letture. Il motore la usa solo se gli
+    viene passata: altrimenti ogni punto di misura costa un confronto con None.
+
+    Con 'path' le istantanee (summary()) vengono aggiunte al file come righe
+    JSON al più ogni 'interval' secondi, e finish() aggiunge il riepilogo
+    finale con "final": true. Le fasi possono essere misurate da più thread
+    (i thread di scrittura misurano 'write').
+    """
+
+    def __init__(self, path=None, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stages = {}  # Fase -> [chiamate, secondi, byte]
+        self.counters = Counter()
+        self.read_latency = [0] * LATENCY_BUCKETS
+        self.started = time.perf_counter()
+        self._last_snapshot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, nbytes=0):
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, nbytes)
+
+    def timed(self, iterable, stage):
+        """Inoltra gli elementi di 'iterable' misurando il tempo speso a produrli."""
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, clock() - start)
+                return
+            self.add(stage, clock() - start)
+            yield item
+
+    def timed_reads(self, reader):
+        """Come timed() per le finestre (offset, dati) di un lettore: registra anche byte e latenza."""
+        iterator = iter(reader)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                base, window = next(iterator)
+            except StopIteration:
+                return
+            elapsed = clock() - start
+            self.add("read", elapsed, len(window))
+            bucket = min(int(elapsed * 1e6).bit_length(), LATENCY_BUCKETS - 1)
+            with self._lock:
+                self.read_latency[bucket] += 1
+            yield base, window
+
+    def merge(self, other):
+        """Aggiunge le misure di un'altra scansione (es. una regione della scansione parallela)."""
+        with self._lock:
+            for stage, (calls, seconds, nbytes) in other.stages.items():
+                entry = self.stages.setdefault(stage, [0, 0.0, 0])
+                entry[0] += calls
+                entry[1] += seconds
+                entry[2] += nbytes
+            self.counters.update(other.counters)
+            self.read_latency = [a + b for a, b in zip(self.read_latency, other.read_latency)]
+
+    def summary(self):
+        """Riepilogo serializzabile in JSON."""
+        with self._lock:
+            stages = {
+                stage: {"calls": calls, "seconds": round(seconds, 6), "bytes": nbytes,
+                        "mb_per_s": round(nbytes / seconds / 1e6, 1) if nbytes and seconds else None}
+                for stage, (calls, seconds, nbytes) in self.stages.items()
+            }
+            latency = {f"<{1 << i}us": n for i, n in enumerate(self.read_latency) if n}
+            counters = dict(self.counters)
+        return {"elapsed": round(time.perf_counter() - self.started, 3), "stages": stages,
+                "counters": counters, "read_latency": latency}
+
+    def maybe_snapshot(self):
+        """Scrive un'istantanea se è passato 'interval' dall'ultima."""
+        if self.path is not None and time.monotonic() - self._last_snapshot >= self.interval:
+            self._last_snapshot = time.monotonic()
+            self._append(self.summary())
+
+    def finish(self, **extra):
+        """Scrive il riepilogo finale (con eventuali dati aggiuntivi) e lo restituisce."""
+        summary = dict(self.summary(), final=True, **extra)
+        if self.path is not None:
+            self._append(summary)
+        return summary
+
+    def _append(self, summary):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+
+    def __getstate__(self):
+        # Passa tra i processi della scansione parallela senza il lock
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+class SamplingProfiler:
+    """
+    Profiler a campionamento: un thread legge ogni 'interval' secondi lo
+    stack di tutti gli altri thread del processo (sys._current_frames) e
+    conta gli stack uguali. write() li salva nel formato "collassato" dei
+    flame graph (una riga per stack: 'thread;file:funzione;... campioni'),
+    leggibile con flamegraph.pl, speedscope o inferno. Il costo non dipende
+    dal numero di chiamate, a differenza di cProfile. Nella scansione
+    parallela vede solo il processo principale.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="recoverflow-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+def write_diagnostics(output_dir, stats, instruments=None, profiler=None):
+    """
+    Alla fine della scansione (anche interrotta): aggiunge il riepilogo
+    finale della strumentazione, con le statistiche della scansione, e
+    salva il profilo in 'output_dir'. Restituisce i percorsi scritti.
+    """
+    written = []
+    if instruments is not None:
+        instruments.finish(scan=stats.to_dict())
+        if instruments.path is not None:
+            written.append(instruments.path)
+    if profiler is not None:
+        profiler.stop()
+        path = os.path.join(output_dir, PROFILE_NAME)
+        profiler.write(path)
+        written.append(path)
+    return written
@@ -0,0 +1,441 @@
+"""Lettori della sorgente: a blocchi (readinto), con letture in coda (preadv) o mappati in memoria (mmap)."""
+import mmap
+import os
+import stat
+import sys
+from collections import deque
+
+from .rescue import RESCUE_SECTOR
+from .signatures import MAX_HEADER_LEN
+
+# --- LETTURA A BLOCCHI ---
+# Dimensione dei blocchi letti dal disco (configurabile tra 1 e 16 MB)
+MIN_BLOCK_SIZE = 1 * 1024 * 1024
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+# Le letture partono sempre da offset allineati al settore: i dischi fisici
+# aperti in modalità raw (es. \\.\PhysicalDrive0) rifiutano letture non allineate
+SECTOR_SIZE = 4096
+# Prima lettura durante l'estrazione: raddoppia a ogni giro fino a un blocco,
+# così i file piccoli non costano la lettura di un blocco intero
+EXTRACT_CHUNK_SIZE = 64 * 1024
+# Finestra massima mappata in memoria in modalità mmap: limita lo spazio di
+# indirizzamento usato anche su dispositivi più grandi della RAM. Le pagine
+# lette di una finestra restano nella memoria residente del processo (RSS)
+# finché la finestra è mappata, e le mappature sono due (scansione ed
+# estrazione): con finestre da 1 GB il picco superava i 2 GB
+DEFAULT_MAP_WINDOW = 128 * 1024 * 1024 if sys.maxsize > 2**32 else 64 * 1024 * 1024
+# Letture di un blocco tenute in corso contemporaneamente in modalità "queued"
+DEFAULT_QUEUE_DEPTH = 8
+# La modalità "queued" legge con os.preadv (Linux, BSD, macOS; non Windows)
+QUEUED_READS = hasattr(os, "preadv")
+SCAN_MODES = ("auto", "stream", "queued", "mmap")
+
+def _readinto_full(f, view):
+    """Riempie 'view' leggendo da 'f' finché possibile; restituisce i byte letti."""
+    filled = 0
+    while filled < len(view):
+        n = f.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+def _pread_full(fd, view, offset, size):
+    """
+    Riempie 'view' con i byte da 'offset' senza superare 'size' (la fine della
+    sorgente, oltre la quale O_DIRECT rifiuta le letture non allineate);
+    restituisce i byte letti.
+    """
+    filled = 0
+    while filled < len(view) and offset + filled < size:
+        n = os.preadv(fd, [view[filled:]], offset + filled)
+        if not n:
+            break
+        filled += n
+    return filled
+
+class SourceReader:
+    """
+    Base comune dei lettori della sorgente. Le sottoclassi implementano
+    __iter__ (finestre per la scansione) e _chunk (accesso per offset);
+    ricerca ed estrazione sono costruite sopra _chunk e non copiano i dati
+    in oggetti Python intermedi.
+
+    Con 'rescue' (un rescue.SectorRescue) i lettori che leggono con
+    _read_into (a blocchi e in coda) non sollevano errori sui settori
+    illeggibili ma li restituiscono pieni di zeri.
+    """
+
+    rescue_sector = RESCUE_SECTOR  # Granularità dei tentativi intorno a un errore di lettura
+
+    def __init__(self, f, size, block_size=DEFAULT_BLOCK_SIZE, overlap=MAX_HEADER_LEN, rescue=None):
+        if not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE or block_size % SECTOR_SIZE:
+            raise ValueError(f"Dimensione del blocco non valida: {block_size}")
+        self.f = f
+        self.size = size
+        self.block_size = block_size
+        self.overlap = overlap
+        self.rescue = rescue
+        self.position = 0  # Offset assoluto del prossimo blocco da scandire
+
+    def _read(self, view, offset):
+        """Riempie 'view' con i byte da 'offset'; restituisce i byte letti (meno solo a fine sorgente)."""
+        raise NotImplementedError
+
+    def _read_into(self, view, offset):
+        """Come _read, ma con 'rescue' i settori illeggibili diventano zeri invece di un OSError."""
+        if self.rescue is None:
+            return self._read(view, offset)
+        return self.rescue.read(self._read, view, offset, self.size, self.rescue_sector)
+
+    def _chunk(self, offset, size):
+        """
+        Rende disponibili fino a 'size' byte da 'offset' (al massimo un blocco).
+        Restituisce (buffer, inizio, lunghezza): 'buffer' supporta find() e memoryview.
+        """
+        raise NotImplementedError
+
+    def read_at(self, offset, size):
+        """
+        Restituisce una memoryview con fino a 'size' byte da 'offset' (al massimo
+        un blocco), valida fino all'accesso successivo; è più corta solo a fine disco.
+        """
+        buffer, start, length = self._chunk(offset, size)
+        return memoryview(buffer)[start:start + length]
+
+    def find(self, sub, start, end):
+        """
+        Cerca 'sub' interamente contenuto in [start, end) e ne restituisce
+        l'offset assoluto, oppure -1. Ogni byte viene esaminato una sola volta,
+        più una sovrapposizione di len(sub) - 1 byte tra un blocco e l'altro.
+        """
+        end = min(end, self.size)
+        pos = start
+        while pos < end:
+            buffer, base, length = self._chunk(pos, min(self.block_size, end - pos))
+            if length < len(sub):
+                return -1
+            found = buffer.find(sub, base, base + length)
+            if found != -1:
+                return pos + found - base
+            if pos + length >= end:
+                return -1
+            pos += length - len(sub) + 1
+        return -1
+
+    def copy_to(self, out_file, offset, size, digest=None):
+        """
+        Scrive in 'out_file' i byte [offset, offset + size) della sorgente;
+        se c'è 'digest' (un oggetto hashlib) vi aggiunge gli stessi byte.
+        """
+        end = min(offset + size, self.size)
+        while offset < end:
+            buffer, start, length = self._chunk(offset, min(self.block_size, end - offset))
+            if length == 0:
+                break
+            with memoryview(buffer) as view:
+                if digest is not None:
+                    digest.update(view[start:start + length])
+                out_file.write(view[start:start + length])
+            offset += length
+
+    def close(self):
+        """Libera le risorse del lettore (thread, descrittori); il file resta aperto."""
+
+class BlockReader(SourceReader):
+    """
+    Legge la sorgente in blocchi grandi con readinto su buffer preallocati
+    e riusati, senza creare nuovi oggetti bytes a ogni lettura.
+
+    Iterando si ottengono coppie (offset, finestra): 'finestra' è una
+    memoryview che inizia con gli ultimi 'overlap' byte della finestra
+    precedente, così gli header a cavallo di due blocchi non vanno persi.
+    Le memoryview restituite restano valide solo fino alla lettura successiva.
+    """
+
+    def __init__(self, f, size, block_size=DEFAULT_BLOCK_SIZE, overlap=MAX_HEADER_LEN, rescue=None):
+        super().__init__(f, size, block_size, overlap, rescue)
+        self._carry = 0  # Byte della finestra precedente riportati in testa
+        self._window = memoryview(bytearray(overlap + block_size))
+        self._scratch = bytearray(block_size + 2 * SECTOR_SIZE)
+
+    def seek(self, offset):
+        """Riprende la lettura da 'offset' (arrotondato al settore), scartando la sovrapposizione."""
+        self.position = offset - offset % SECTOR_SIZE
+        self._carry = 0
+
+    def __iter__(self):
+        while True:
+            start = self.position
+            n = self._read_into(self._window[self._carry:self._carry + self.block_size], start)
+            if n == 0:
+                return
+            self.position = start + n
+            length = self._carry + n
+            yield start - self._carry, self._window[:length]
+
+            if self.position != start + n:
+                continue  # seek() durante l'iterazione: niente sovrapposizione
+            # Sposta la coda della finestra in testa al buffer per il giro successivo
+            keep = min(self.overlap, length)
+            self._window[:keep] = self._window[length - keep:length]
+            self._carry = keep
+
+    def _chunk(self, offset, size):
+        size = min(size, self.block_size)
+        aligned = offset - offset % SECTOR_SIZE
+        skip = offset - aligned
+        length = skip + size
+        length += -length % SECTOR_SIZE
+        with memoryview(self._scratch) as view:
+            n = self._read_into(view[:length], aligned)
+        return self._scratch, skip, max(0, min(n, skip + size) - skip)
+
+    def _read(self, view, offset):
+        self.f.seek(offset)
+        return _readinto_full(self.f, view)
+
+class QueuedReader(SourceReader):
+    """
+    Legge la sorgente tenendo in corso fino a 'queue_depth' letture di un
+    blocco, con os.preadv in un gruppo di thread (che rilasciano il GIL):
+    mentre il riconoscitore esamina un blocco i successivi stanno già
+    arrivando. Una lettura alla volta lascia un SSD NVMe a una frazione della
+    sua banda; con più letture in coda il disco le serve in parallelo.
+
+    La scansione riceve i blocchi in ordine, con le stesse finestre e la
+    stessa sovrapposizione di BlockReader. Dopo un seek() le letture già in
+    corso dei blocchi successivi restano valide; quelle dei blocchi saltati
+    vengono lasciate finire e i loro buffer riusati. Anche le letture per
+    offset (footer, controlli) usano i blocchi già letti quando li contengono.
+
+    Con direct=True la sorgente viene riaperta con O_DIRECT e letta senza
+    passare dalla cache del sistema: buffer allineati alla pagina (mmap
+    anonimi), offset e lunghezze multipli di SECTOR_SIZE. Se il sistema o il
+    file system non lo permettono si legge normalmente ('direct' resta False).
+    """
+
+    def __init__(self, f, size, block_size=DEFAULT_BLOCK_SIZE, overlap=MAX_HEADER_LEN,
+                 queue_depth=DEFAULT_QUEUE_DEPTH, direct=False, rescue=None):
+        super().__init__(f, size, block_size, overlap, rescue)
+        self.queue_depth = max(1, queue_depth)
+        self.fd = f.fileno()
+        self.direct = False
+        self._direct_fd = None
+        if direct and hasattr(os, "O_DIRECT"):
+            try:
+                self._direct_fd = os.open(f.name, os.O_RDONLY | os.O_DIRECT)
+            except (OSError, TypeError):
+                pass  # O_DIRECT non supportato (es. tmpfs): letture normali
+            else:
+                self.fd = self._direct_fd
+                self.direct = True
+                self.rescue_sector = SECTOR_SIZE  # O_DIRECT rifiuta letture più piccole del settore fisico
+        # I dati di ogni blocco iniziano a '_pad' byte, allineati al settore: prima
+        # c'è spazio per la sovrapposizione con la finestra precedente
+        self._pad = overlap + (-overlap % SECTOR_SIZE)
+        # Un buffer per ogni lettura in coda più quello della finestra in scansione
+        self._buffers = [mmap.mmap(-1, self._pad + block_size) for _ in range(self.queue_depth + 1)]
+        self._views = [memoryview(buffer) for buffer in self._buffers]
+        self._free = list(range(len(self._buffers)))
+        self._pending = deque()  # (offset, buffer, future) delle letture in ordine di offset
+        self._draining = deque()  # (buffer, future) di letture non più utili ancora in corso
+        self._current = None  # (offset, buffer, byte letti) del blocco dell'ultima finestra
+        self._carry = 0  # Byte della finestra precedente riportati in testa
+        self._next = 0  # Offset della prossima lettura da mettere in coda
+        self._scratch = mmap.mmap(-1, block_size + 2 * SECTOR_SIZE)
+        self._pool = None
+
+    def seek(self, offset):
+        """Riprende la lettura da 'offset' (arrotondato al settore), scartando la sovrapposizione."""
+        self.position = offset - offset % SECTOR_SIZE
+        self._carry = 0
+        if self._pending and self._pending[0][0] <= self.position < self._next:
+            # Il blocco che contiene 'position' è già in coda: si tengono lui e i successivi
+            while self._pending[0][0] + self.block_size <= self.position:
+                self._discard(self._pending.popleft())
+        else:
+            while self._pending:
+                self._discard(self._pending.popleft())
+            self._next = self.position
+
+    def __iter__(self):
+        while True:
+            self._submit()
+            if not self._pending:
+                return
+            offset, buffer, future = self._pending[0]
+            n = future.result()
+            skip = self.position - offset  # Dopo un seek() dentro il blocco
+            if n <= skip:
+                return
+            self._pending.popleft()
+            start = self._pad + skip - self._carry
+            if self._carry:
+                _, previous, end = self._current
+                self._views[buffer][start:self._pad] = self._views[previous][end - self._carry:end]
+            self._release_current()
+            end = self._pad + n
+            self._current = (offset, buffer, end)
+            self.position = offset + n
+            yield offset + skip - self._carry, self._views[buffer][start:end]
+
+            if self.position != offset + n:
+                continue  # seek() durante l'iterazione: niente sovrapposizione
+            self._carry = min(self.overlap, end - start)
+
+    def read_at(self, offset, size):
+        buffer, start, length = self._chunk(offset, size, whole=True)
+        return memoryview(buffer)[start:start + length]
+
+    def _chunk(self, offset, size, whole=False):
+        size = min(size, self.block_size)
+        end = min(offset + size, self.size)
+        # Byte già letti (o in lettura) dalla scansione: nessuna seconda lettura
+        blocks = list(self._pending)
+        if self._current is not None:
+            current_offset, buffer, current_end = self._current
+            blocks.insert(0, (current_offset, buffer, None))
+        for block_offset, buffer, future in blocks:
+            if block_offset <= offset < block_offset + self.block_size:
+                available = block_offset + (future.result() if future else current_end - self._pad)
+                # find() e copy_to() proseguono da soli nel blocco successivo, read_at() no; un
+                # pezzo più corto di un settore farebbe credere a find() di essere a fine sorgente
+                if offset < available and (end <= available or (not whole and available - offset >= SECTOR_SIZE)):
+                    return self._buffers[buffer], self._pad + offset - block_offset, min(end, available) - offset
+                break
+        aligned = offset - offset % SECTOR_SIZE
+        skip = offset - aligned
+        length = skip + size
+        length += -length % SECTOR_SIZE
+        with memoryview(self._scratch) as view:
+            n = self._read_into(view[:length], aligned)
+        return self._scratch, skip, max(0, min(n, skip + size) - skip)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)  # Le letture scrivono nei buffer
+            self._pool = None
+        if self._direct_fd is not None:
+            os.close(self._direct_fd)
+            self._direct_fd = None
+            self.fd = self.f.fileno()
+
+    def _submit(self):
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor  # Importato solo qui, come in engine
+            self._pool = ThreadPoolExecutor(self.queue_depth, thread_name_prefix="recoverflow-read")
+        while len(self._pending) < self.queue_depth and self._next < self.size:
+            buffer = self._take_buffer()
+            future = self._pool.submit(self._read_block, buffer, self._next)
+            self._pending.append((self._next, buffer, future))
+            self._next += self.block_size
+
+    def _read_block(self, buffer, offset):
+        return self._read_into(self._views[buffer][self._pad:self._pad + self.block_size], offset)
+
+    def _read(self, view, offset):
+        return _pread_full(self.fd, view, offset, self.size)
+
+    def _take_buffer(self):
+        if not self._free:
+            # Tutti i buffer sono occupati: si attende la più vecchia lettura scartata
+            buffer, future = self._draining.popleft()
+            future.exception()
+            return buffer
+        return self._free.pop()
+
+    def _discard(self, block):
+        _, buffer, future = block
+        self._draining.append((buffer, future))
+
+    def _release_current(self):
+        if self._current is not None:
+            self._free.append(self._current[1])
+            self._current = None
+
+class MappedReader(SourceReader):
+    """
+    Modalità mmap per immagini disco e dispositivi a blocchi: la sorgente
+    viene vista come un unico buffer in memoria, mappato a finestre di
+    'map_window' byte, e scansione, ricerca del footer ed estrazione lavorano
+    direttamente su porzioni della mappatura, senza copie.
+
+    Le finestre di scansione restano lunghe un blocco (il riconoscitore
+    lavora su blocchi), ma la sovrapposizione è gratuita perché le finestre
+    consecutive sono porzioni contigue della stessa mappatura.
+    """
+
+    def __init__(self, f, size, block_size=DEFAULT_BLOCK_SIZE, overlap=MAX_HEADER_LEN,
+                 map_window=DEFAULT_MAP_WINDOW):
+        super().__init__(f, size, block_size, overlap)
+        granularity = mmap.ALLOCATIONGRANULARITY
+        # La finestra deve contenere almeno un blocco più la sovrapposizione
+        map_window = max(map_window, 2 * block_size)
+        self.map_window = map_window + (-map_window % granularity)
+        self._overlap_next = False
+        # Due mappature indipendenti: una per la scansione sequenziale e una per
+        # l'accesso per offset (footer, estrazione), così non si disturbano
+        self._maps = {"scan": (None, 0, 0), "extent": (None, 0, 0)}
+
+    def _map(self, slot, offset, end):
+        """Restituisce (mappatura, inizio) di una finestra che contiene [offset, end)."""
+        mapping, start, stop = self._maps[slot]
+        if mapping is None or offset < start or end > stop:
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            stop = min(start + self.map_window, self.size)
+            # La vecchia mappatura viene rilasciata quando non ci sono più memoryview che la usano
+            mapping = mmap.mmap(self.f.fileno(), stop - start, access=mmap.ACCESS_READ, offset=start)
+            self._maps[slot] = (mapping, start, stop)
+        return mapping, start
+
+    def seek(self, offset):
+        """Riprende la scansione da 'offset', scartando la sovrapposizione."""
+        self.position = offset
+        self._overlap_next = False
+
+    def __iter__(self):
+        while self.position < self.size:
+            start = self.position
+            window_start = max(0, start - self.overlap) if self._overlap_next else start
+            end = min(start + self.block_size, self.size)
+            mapping, map_start = self._map("scan", window_start, end)
+            self.position = end
+            self._overlap_next = True
+            with memoryview(mapping) as view:
+                yield window_start, view[window_start - map_start:end - map_start]
+
+    def _chunk(self, offset, size):
+        end = min(offset + min(size, self.block_size), self.size)
+        if offset >= end:
+            return b"", 0, 0
+        mapping, map_start = self._map("extent", offset, end)
+        return mapping, offset - map_start, end - offset
+
+def open_reader(f, size, scan_mode="auto", block_size=DEFAULT_BLOCK_SIZE, map_window=DEFAULT_MAP_WINDOW,
+                overlap=MAX_HEADER_LEN, queue_depth=DEFAULT_QUEUE_DEPTH, direct=False, rescue=None):
+    """
+    Sceglie il lettore per la sorgente. In modalità "auto" le immagini disco
+    (file regolari) vengono mappate in memoria, i dispositivi letti con più
+    letture in coda (a blocchi dove os.preadv manca): su un disco
+    danneggiato un errore di lettura dentro una mappatura terminerebbe il
+    processo invece di sollevare un'eccezione. Con 'direct' (O_DIRECT, solo
+    in modalità "queued") anche le immagini vengono lette con letture in coda.
+    'rescue' (un rescue.SectorRescue) vale per le modalità a blocchi e in
+    coda: in una mappatura un settore illeggibile non si può saltare.
+    """
+    if scan_mode not in SCAN_MODES:
+        raise ValueError(f"Modalità di scansione sconosciuta: {scan_mode}")
+    if scan_mode == "queued" and not QUEUED_READS:
+        raise ValueError("La modalità queued richiede os.preadv, non disponibile su questo sistema")
+    if scan_mode == "auto":
+        if stat.S_ISREG(os.fstat(f.fileno()).st_mode) and not (direct and QUEUED_READS):
+            scan_mode = "mmap"
+        else:
+            scan_mode = "queued" if QUEUED_READS else "stream"
+    if scan_mode == "mmap":
+        return MappedReader(f, size, block_size, overlap, map_window=map_window)
+    if scan_mode == "queued":
+        return QueuedReader(f, size, block_size, overlap, queue_depth, direct, rescue)
+    return BlockReader(f, size, block_size, overlap, rescue)
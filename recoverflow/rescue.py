@@ -0,0 +1,216 @@
+"""
+Letture tolleranti ai settori illeggibili e mappa degli errori.
+
+Su un disco danneggiato un solo settore illeggibile fa fallire la lettura
+dell'intero blocco. SectorRescue riprende da lì: rilegge il blocco a pezzi
+che partono da un settore e raddoppiano finché la lettura riesce (sulle
+zone sane si torna subito a letture grandi), riprova ogni settore
+illeggibile con attese crescenti e, se non si legge, lo riempie di zeri e
+prosegue. Se anche il settore successivo è illeggibile la zona è
+danneggiata: i byte seguenti vengono saltati senza leggerli, con un salto
+che raddoppia finché gli errori continuano, così un'area morta costa
+qualche lettura e non ore di tentativi. La scansione vede zeri, che non
+contengono header, e va avanti. Le zone già trovate illeggibili non vengono
+più lette: la ricerca del footer e la scrittura dei file, che rileggono
+gli stessi byte, le ricevono subito come zeri.
+
+Le zone illeggibili ('-') e quelle saltate ('?') finiscono nella mappa
+degli errori (ERROR_MAP_NAME nella cartella di output), nel formato delle
+mapfile di GNU ddrescue: la stessa mappa permette a ddrescue di ritentare
+solo quelle zone su una copia del disco.
+"""
+import bisect
+import os
+import threading
+import time
+
+ERROR_MAP_NAME = "recoverflow_errors.map"
+# Granularità dei tentativi intorno a un errore (il settore logico dei dischi)
+RESCUE_SECTOR = 512
+# Nuovi tentativi su un settore illeggibile, con attese che raddoppiano da RETRY_DELAY secondi
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 0.05
+# Salto dopo due settori illeggibili di fila: raddoppia finché gli errori continuano
+FIRST_SKIP = 64 * 1024
+MAX_SKIP = 16 * 1024 * 1024
+
+# Stati della mapfile di ddrescue usati qui
+FINISHED = "+"  # Letto (o non letto perché non serviva: la scansione salta file e zone vuote)
+BAD_SECTOR = "-"  # Illeggibile dopo tutti i tentativi
+NON_TRIED = "?"  # Saltato dentro una zona danneggiata
+
+class SectorRescue:
+    """
+    Lettura tollerante di un intervallo della sorgente, condivisa dai
+    lettori della scansione e da quelli che scrivono i file recuperati (anche
+    da più thread). 'ranges' raccoglie (offset, lunghezza, stato) delle zone
+    illeggibili e saltate; 'errors' conta gli errori di lettura incontrati.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, log=None, delay=RETRY_DELAY):
+        self.retries = retries
+        self.delay = delay
+        self.log = log or (lambda message: None)
+        self.ranges = []
+        self.errors = 0
+        # Zone già trovate illeggibili o saltate, in ordine di inizio
+        self._starts = []
+        self._ends = []
+        self._lock = threading.Lock()
+
+    def read(self, read, view, offset, size, sector=RESCUE_SECTOR):
+        """
+        Riempie 'view' con i byte da 'offset' chiamando read(view, offset), che
+        restituisce i byte letti (meno di len(view) solo a fine sorgente) o
+        solleva OSError. 'size' è la dimensione della sorgente, 'sector' la
+        granularità dei tentativi (multiplo dell'allineamento richiesto dalla
+        sorgente, es. SECTOR_SIZE con O_DIRECT). I byte illeggibili diventano
+        zeri; restituisce i byte disponibili come read().
+        """
+        length = min(len(view), size - offset)
+        if not self._known_end(offset) and self._next_known(offset) >= offset + length:
+            try:
+                return read(view, offset)
+            except OSError:
+                self._count_error()
+        return self._rescue(read, view, offset, length, sector)
+
+    def _rescue(self, read, view, offset, length, sector):
+        span = length + -length % sector  # O_DIRECT vuole lunghezze intere anche a fine sorgente
+        pos = 0
+        chunk = sector
+        skip = 0  # Prossimo salto se anche il settore successivo è illeggibile (0 = nessun errore)
+        while pos < length:
+            known_end = self._known_end(offset + pos)
+            if known_end:
+                # Già illeggibile: zeri senza leggere, fino al settore successivo alla zona
+                n = min(known_end - offset - pos + -(known_end - offset - pos) % sector, length - pos)
+                view[pos:pos + n] = bytes(n)
+                pos += n
+                continue
+            # I pezzi si fermano prima della prossima zona nota (ma leggono almeno un settore)
+            before_known = self._next_known(offset + pos) - offset - pos
+            step = min(chunk, span - pos, max(sector, before_known - before_known % sector))
+            try:
+                n = self._attempt(read, view[pos:pos + step], offset + pos, step <= sector)
+            except OSError:
+                if step > sector:
+                    chunk = sector  # Errore in un pezzo grande: si scende al settore
+                    continue
+                step = min(step, length - pos)
+                view[pos:pos + step] = bytes(step)
+                self._record(offset + pos, step, BAD_SECTOR)
+                pos += step
+                if skip:
+                    # Due settori illeggibili di fila: zona danneggiata, si salta avanti
+                    skipped = min(skip, length - pos)
+                    if skipped:
+                        view[pos:pos + skipped] = bytes(skipped)
+                        self._record(offset + pos, skipped, NON_TRIED)
+                        pos += skipped
+                    skip = min(2 * skip, MAX_SKIP)
+                else:
+                    skip = FIRST_SKIP
+                continue
+            pos += n
+            if n < step:
+                break  # Fine della sorgente
+            skip = 0
+            chunk = min(2 * chunk, span)  # Zona sana: si torna a letture grandi
+        return min(pos, length)
+
+    def _attempt(self, read, view, offset, retry):
+        """Legge 'view'; se 'retry' ritenta fino a 'retries' volte con attese crescenti."""
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.delay * 2 ** (attempt - 1))
+            try:
+                return read(view, offset)
+            except OSError:
+                self._count_error()
+                if attempt == attempts - 1:
+                    raise
+
+    def _count_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def _known_end(self, offset):
+        """Fine della zona nota che contiene 'offset', oppure 0."""
+        with self._lock:
+            i = bisect.bisect_right(self._starts, offset) - 1
+            return self._ends[i] if i >= 0 and self._ends[i] > offset else 0
+
+    def _next_known(self, offset):
+        """Inizio della prima zona nota dopo 'offset' (infinito se non ce ne sono)."""
+        with self._lock:
+            i = bisect.bisect_right(self._starts, offset)
+            return self._starts[i] if i < len(self._starts) else float("inf")
+
+    def _record(self, offset, length, status):
+        with self._lock:
+            self.ranges.append((offset, length, status))
+            i = bisect.bisect_right(self._starts, offset)
+            self._starts.insert(i, offset)
+            self._ends.insert(i, offset + length)
+        if status == BAD_SECTOR:
+            self.log(f"Settore illeggibile all'offset {offset}: {length} byte sostituiti da zeri.")
+        else:
+            self.log(f"Zona danneggiata: saltati {length} byte dall'offset {offset}.")
+
+def merge_ranges(ranges):
+    """Zone in ordine di offset, senza sovrapposizioni (vince la prima) e con le adiacenti dello stesso stato unite."""
+    merged = []
+    for offset, length, status in sorted(ranges):
+        if merged:
+            last_offset, last_length, last_status = merged[-1]
+            last_end = last_offset + last_length
+            if offset < last_end:
+                length -= last_end - offset
+                offset = last_end
+                if length <= 0:
+                    continue
+            if offset == last_end and status == last_status:
+                merged[-1] = (last_offset, last_length + length, status)
+                continue
+        merged.append((offset, length, status))
+    return merged
+
+def load_error_map(path):
+    """Zone illeggibili e saltate di una mappa degli errori ([] se manca o non è leggibile)."""
+    ranges = []
+    try:
+        with open(path, encoding="ascii") as f:
+            lines = [line.split() for line in f if line.strip() and not line.startswith("#")]
+    except (OSError, ValueError):
+        return []
+    for fields in lines[1:]:  # La prima riga è lo stato corrente
+        try:
+            if len(fields) >= 3 and fields[2] != FINISHED:
+                ranges.append((int(fields[0], 0), int(fields[1], 0), fields[2]))
+        except ValueError:
+            return []
+    return ranges
+
+def write_error_map(path, size, ranges):
+    """Scrive la mappa degli errori di una sorgente di 'size' byte: le zone non elencate sono FINISHED."""
+    lines = ["# Mapfile. Created by RecoverFlow (formato di GNU ddrescue)",
+             "# current_pos  current_status  current_pass",
+             f"0x{size:08X}     {FINISHED}               1",
+             "#      pos        size  status"]
+    pos = 0
+    for offset, length, status in merge_ranges(ranges):
+        length = min(offset + length, size) - offset
+        if length <= 0:
+            continue
+        if offset > pos:
+            lines.append(f"0x{pos:08X}  0x{offset - pos:08X}  {FINISHED}")
+        lines.append(f"0x{offset:08X}  0x{length:08X}  {status}")
+        pos = offset + length
+    if pos < size:
+        lines.append(f"0x{pos:08X}  0x{size - pos:08X}  {FINISHED}")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="ascii") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
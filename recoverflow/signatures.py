@@ -0,0 +1,70 @@
+"""Firme dei tipi di file riconosciuti dal motore di carving."""
+
+# --- DEFINIZIONE DELLE FIRME DEI FILE ---
+# Dizionario delle firme dei file. 'footer' è opzionale: per i file senza footer
+# 'resolver' indica come calcolare la dimensione dalla struttura del file
+# (vedi sizing.SIZE_RESOLVERS). Per i file con footer 'last_footer' fa valere
+# l'ultimo footer invece del primo e 'footer_resolver' calcola la fine del
+# record aperto dal footer (vedi sizing.FOOTER_RESOLVERS). 'validator' controlla
+# la struttura dei primi byte prima del recupero (vedi validators.VALIDATORS),
+# 'fragments' ricompone i file divisi in due frammenti (vedi fragments.REASSEMBLERS).
+FILE_SIGNATURES = {
+    "jpg": {
+        "header": b'\xff\xd8\xff', # Header più generico per JPG/JPEG
+        "footer": b'\xff\xd9',
+        "validator": "jpeg", # Sequenza dei segmenti fino all'inizio dei dati (SOS)
+        "fragments": "jpeg", # Marcatori e sequenza dei RST nei dati compressi
+        "max_size": 20 * 1024 * 1024 # 20 MB
+    },
+    "png": {
+        "header": b'\x89PNG\r\n\x1a\n',
+        "footer": b'IEND\xaeB`\x82',
+        "validator": "png", # IHDR e CRC dei primi chunk
+        "max_size": 20 * 1024 * 1024 # 20 MB
+    },
+    "pdf": {
+        "header": b'%PDF-',
+        "footer": b'%%EOF',
+        "footer_resolver": "pdf_eof", # %%EOF preceduto da startxref, più la fine riga
+        "last_footer": True, # Ogni aggiornamento incrementale aggiunge un %%EOF
+        "validator": "pdf", # Versione e primo oggetto
+        "max_size": 50 * 1024 * 1024 # 50 MB
+    },
+    "mp4": {
+        "header": b'\x00\x00\x00\x18ftypmp42', # Una delle firme comuni per MP4
+        "footer": None, # I file MP4 non hanno un footer semplice e affidabile
+        "resolver": "mp4", # Somma dei box di primo livello
+        "max_size": 500 * 1024 * 1024 # 500 MB, i video possono essere grandi
+    },
+    "mp3": {
+        "header": b'ID3', # L'header più comune per i file MP3 con metadati
+        "footer": None, # Non hanno un footer standard affidabile
+        "resolver": "mp3", # Tag ID3 più i frame MPEG
+        "max_size": 25 * 1024 * 1024 # 25 MB
+    },
+    "wav": {
+        "header": b'RIFF', # L'header per i file WAV (e altri, come AVI)
+        "footer": None, # La dimensione è nell'header
+        "resolver": "riff",
+        "validator": "wave", # Forma WAVE e chunk 'fmt ' coerente (scarta AVI e altri RIFF)
+        "max_size": 100 * 1024 * 1024 # 100 MB per audio non compresso
+    },
+    "doc": {
+        "header": b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', # Header per file OLE (DOC, XLS, PPT)
+        "footer": None,
+        "resolver": "ole", # Numero di settori in uso secondo la FAT
+        "max_size": 30 * 1024 * 1024 # 30 MB
+    },
+    "docx": {
+        "header": b'PK\x03\x04', # Header per file ZIP (usato da DOCX, XLSX, etc.)
+        "footer": b'PK\x05\x06', # Footer del record della directory centrale ZIP
+        "footer_resolver": "zip_eocd", # Il record è lungo 22 byte più il commento
+        "validator": "zip", # Campi del primo header locale
+        "fragments": "zip", # Directory centrale, header locali e CRC dell'elemento diviso
+        "max_size": 50 * 1024 * 1024 # 50 MB
+    }
+}
+
+# Calcola la lunghezza massima dell'header una sola volta per ottimizzare
+# e prevenire crash se il dizionario è vuoto.
+MAX_HEADER_LEN = max(len(s["header"]) for s in FILE_SIGNATURES.values()) if FILE_SIGNATURES else 0
@@ -0,0 +1,236 @@
+"""
+Calcolo della dimensione dei file a partire dalla loro struttura.
+
+Per i file senza footer ogni funzione riceve il lettore della sorgente, l'offset dell'header e il
+limite oltre il quale non cercare (max_size o fine del disco) e restituisce
+l'offset assoluto a cui il file termina, oppure None se i dati dopo l'header
+non hanno la struttura attesa (falso positivo). L'offset restituito può
+superare 'limit' se il file è troncato: il chiamante lo riporta entro il limite.
+"""
+import struct
+
+from .readers import EXTRACT_CHUNK_SIZE
+
+# --- RIFF (WAV, AVI) ---
+
+def riff_end(reader, start, limit):
+    """RIFF: la dimensione del contenuto è scritta nell'header, subito dopo 'RIFF'."""
+    head = bytes(reader.read_at(start, 16))
+    if len(head) < 16:
+        return None
+    size, = struct.unpack_from("<I", head, 4)
+    # Tipo del contenuto (es. 'WAVE') e primo chunk (es. 'fmt '): quattro caratteri ASCII stampabili
+    if size < 8 or not all(0x20 <= b <= 0x7E for b in head[8:16]):
+        return None
+    return start + 8 + size + (size & 1)  # I chunk sono allineati a 2 byte
+
+# --- MP4 / QuickTime ---
+
+# Box che possono comparire al primo livello di un file MP4
+MP4_TOP_LEVEL_BOXES = {
+    b"ftyp", b"styp", b"moov", b"mdat", b"moof", b"mfra", b"free", b"skip", b"wide",
+    b"pdin", b"meta", b"uuid", b"sidx", b"ssix", b"prft", b"emsg", b"udta", b"pnot",
+}
+# Senza almeno uno di questi box il file non contiene né indice né dati video
+MP4_CONTENT_BOXES = {b"moov", b"mdat", b"moof"}
+
+def mp4_end(reader, start, limit):
+    """MP4: percorre i box di primo livello (dimensione + tipo) finché sono validi."""
+    pos = start
+    has_content = False
+    while pos < limit:
+        head = reader.read_at(pos, 16)
+        if len(head) < 8:
+            break
+        size, box_type = struct.unpack_from(">I4s", head)
+        header_size = 8
+        if size == 1:  # Dimensione a 64 bit subito dopo il tipo
+            if len(head) < 16:
+                break
+            size, = struct.unpack_from(">Q", head, 8)
+            header_size = 16
+        elif size == 0:  # L'ultimo box si estende fino alla fine del file
+            size = limit - pos
+        if box_type not in MP4_TOP_LEVEL_BOXES or size < header_size:
+            break
+        has_content = has_content or box_type in MP4_CONTENT_BOXES
+        pos += size
+    return pos if has_content else None
+
+# --- MP3 (tag ID3v2 + frame MPEG) ---
+
+# Bitrate in kbit/s per indice: (MPEG-1, layer) -> tabella; layer 3 = Layer I, 2 = Layer II, 1 = Layer III
+_MPEG_BITRATES = {
+    (True, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Frequenze di campionamento per versione: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+_MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+# Bit dell'header che devono restare uguali in tutti i frame: versione, layer e frequenza
+_MPEG_CONSTANT_BITS = 0xFE0C
+ID3V1_TAG_SIZE = 128
+
+def mpeg_frame_length(b1, b2):
+    """Lunghezza del frame MPEG audio dai byte 1 e 2 dell'header, oppure 0 se l'header non è valido."""
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if (b1 & 0xE0) != 0xE0 or version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0  # Niente sincronismo, valori riservati o bitrate libero
+    mpeg1 = version == 3
+    bitrate = _MPEG_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 3:
+        return (12 * bitrate // sample_rate + padding) * 4
+    samples = 1152 if layer == 2 or mpeg1 else 576
+    return samples // 8 * bitrate // sample_rate + padding
+
+def mpeg_frames_end(reader, pos, limit):
+    """
+    Percorre i frame MPEG audio consecutivi a partire da 'pos'.
+    Restituisce (fine dell'ultimo frame valido, numero di frame).
+    """
+    frames = 0
+    constant = None
+    chunk_size = EXTRACT_CHUNK_SIZE
+    while pos < limit:
+        data = bytes(reader.read_at(pos, min(chunk_size, limit - pos)))
+        if len(data) < 4:
+            break
+        offset = 0
+        while offset + 4 <= len(data):
+            b1, b2 = data[offset + 1], data[offset + 2]
+            length = mpeg_frame_length(b1, b2) if data[offset] == 0xFF else 0
+            if constant is None and length:
+                constant = (b1 << 8 | b2) & _MPEG_CONSTANT_BITS
+            if not length or (b1 << 8 | b2) & _MPEG_CONSTANT_BITS != constant:
+                return pos + offset, frames
+            offset += length
+            frames += 1
+        pos += offset
+        chunk_size = min(2 * chunk_size, reader.block_size)
+    return pos, frames
+
+def mp3_end(reader, start, limit):
+    """MP3: tag ID3v2 (dimensione in formato syncsafe), poi i frame MPEG e l'eventuale tag ID3v1."""
+    head = bytes(reader.read_at(start, 10))
+    if len(head) < 10 or head[3] not in (2, 3, 4) or head[4] == 0xFF or any(b & 0x80 for b in head[6:10]):
+        return None
+    tag_size = head[6] << 21 | head[7] << 14 | head[8] << 7 | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    pos, frames = mpeg_frames_end(reader, start + 10 + tag_size + footer, limit)
+    if frames == 0:
+        return None
+    if reader.read_at(pos, 3) == b"TAG":
+        pos += ID3V1_TAG_SIZE
+    return pos
+
+# --- OLE / Compound File Binary (DOC, XLS, PPT) ---
+
+CFB_HEADER_DIFAT_ENTRIES = 109
+CFB_FREE_SECTOR = 0xFFFFFFFF
+CFB_MAX_REGULAR_SECTOR = 0xFFFFFFFA
+
+def ole_end(reader, start, limit):
+    """
+    OLE: il file è una sequenza di settori preceduta dall'header. La FAT
+    indica quali settori sono in uso: il file termina dopo l'ultimo.
+    Vengono lette solo le ultime parti della FAT, a partire dalla fine.
+    """
+    head = bytes(reader.read_at(start, 512))
+    if len(head) < 512:
+        return None
+    major, byte_order, sector_shift = struct.unpack_from("<HHH", head, 0x1A)
+    if byte_order != 0xFFFE or (major, sector_shift) not in ((3, 9), (4, 12)):
+        return None
+    sector_size = 1 << sector_shift
+    fat_count, = struct.unpack_from("<I", head, 0x2C)
+    difat_sector, difat_count = struct.unpack_from("<II", head, 0x44)
+    max_sectors = (limit - start) // sector_size
+    if fat_count == 0 or fat_count > max_sectors:
+        return None
+
+    def sector_offset(sector):
+        return start + (sector + 1) * sector_size  # Il settore 0 segue l'header
+
+    # Posizioni dei settori della FAT: le prime 109 nell'header, le altre nella catena DIFAT
+    fat_sectors = list(struct.unpack_from(f"<{CFB_HEADER_DIFAT_ENTRIES}I", head, 0x4C))[:fat_count]
+    per_sector = sector_size // 4
+    for _ in range(difat_count):
+        if len(fat_sectors) >= fat_count or difat_sector > CFB_MAX_REGULAR_SECTOR:
+            break
+        data = bytes(reader.read_at(sector_offset(difat_sector), sector_size))
+        if len(data) < sector_size:
+            break
+        entries = struct.unpack_from(f"<{per_sector}I", data)
+        fat_sectors.extend(entries[:-1][:fat_count - len(fat_sectors)])
+        difat_sector = entries[-1]
+    if len(fat_sectors) < fat_count or any(s > CFB_MAX_REGULAR_SECTOR for s in fat_sectors):
+        return None
+
+    # L'ultimo settore in uso è l'ultima voce non libera della FAT
+    for index in range(fat_count - 1, -1, -1):
+        data = bytes(reader.read_at(sector_offset(fat_sectors[index]), sector_size))
+        if len(data) < sector_size:
+            continue  # Settore della FAT oltre la fine del disco
+        used = len(data.rstrip(b"\xff"))  # Le voci libere valgono 0xFFFFFFFF
+        if used:
+            return sector_offset(index * per_sector + (used - 1) // 4 + 1)
+    return None
+
+# Nome del calcolo della dimensione (chiave 'resolver' in FILE_SIGNATURES) -> funzione
+SIZE_RESOLVERS = {
+    "riff": riff_end,
+    "mp4": mp4_end,
+    "mp3": mp3_end,
+    "ole": ole_end,
+}
+
+# --- FINE DEI FILE CON FOOTER ---
+# Queste funzioni ricevono anche la posizione del footer trovato e restituiscono
+# (fine del file, coerente): un footer non coerente non chiude questo file
+# (es. quello di un archivio annidato) ma resta il ripiego se non se ne trovano altri.
+
+ZIP_EOCD_SIZE = 22
+ZIP64_MARKER = 0xFFFFFFFF
+
+def zip_eocd_end(reader, start, footer_pos):
+    """
+    ZIP: 'PK\\x05\\x06' apre il record di fine della directory centrale, lungo
+    22 byte più il commento. Il record è coerente se la directory centrale
+    che descrive termina esattamente dove inizia il record.
+    """
+    record = bytes(reader.read_at(footer_pos, ZIP_EOCD_SIZE))
+    if len(record) < ZIP_EOCD_SIZE:
+        return footer_pos + len(record), False
+    cd_size, cd_offset, comment_len = struct.unpack_from("<IIH", record, 12)
+    # Negli archivi ZIP64 i valori reali sono in un altro record
+    consistent = ZIP64_MARKER in (cd_size, cd_offset) or cd_offset + cd_size == footer_pos - start
+    return footer_pos + ZIP_EOCD_SIZE + comment_len, consistent
+
+# Distanza massima tra 'startxref' e il %%EOF che lo segue (c'è solo l'offset della tabella xref)
+PDF_STARTXREF_WINDOW = 1024
+
+def pdf_eof_end(reader, start, footer_pos):
+    """
+    PDF: il file termina dopo '%%EOF' e l'eventuale fine riga. Il %%EOF è
+    coerente se poco prima c'è 'startxref', il puntatore alla tabella xref
+    (o allo stream xref) che lo precede sempre in un PDF completo.
+    """
+    window_start = max(start, footer_pos - PDF_STARTXREF_WINDOW)
+    consistent = b"startxref" in bytes(reader.read_at(window_start, footer_pos - window_start))
+    tail = bytes(reader.read_at(footer_pos + 5, 2))
+    eol = 2 if tail == b"\r\n" else 1 if tail[:1] in (b"\r", b"\n") else 0
+    return footer_pos + 5 + eol, consistent
+
+# Nome del calcolo della fine (chiave 'footer_resolver' in FILE_SIGNATURES) -> funzione
+FOOTER_RESOLVERS = {
+    "zip_eocd": zip_eocd_end,
+    "pdf_eof": pdf_eof_end,
+}
@@ -0,0 +1,59 @@
+"""Zone vuote della sorgente: blocchi uniformi (es. tutti zero) e buchi dei file sparsi."""
+import errno
+import os
+from functools import lru_cache
+
+# Granularità con cui vengono cercate le zone uniformi nelle finestre di scansione
+UNIFORM_BLOCK = 64 * 1024
+
+@lru_cache(maxsize=8)
+def _fill_block(fill):
+    return bytes((fill,)) * UNIFORM_BLOCK
+
+def uniform_runs(data, start, end, excluded=()):
+    """
+    Restituisce, in ordine, le zone (inizio, fine) di data[start:end] fatte
+    di un solo byte ripetuto, a blocchi di UNIFORM_BLOCK byte a partire da
+    'start'. I byte in 'excluded' (quelli con cui si può scrivere un intero
+    header) non formano zone. Ogni blocco costa una copia e un confronto
+    in C; i dati non uniformi vengono scartati già dal primo e dall'ultimo byte.
+    """
+    run_start = run_fill = None
+    pos = start
+    while pos + UNIFORM_BLOCK <= end:
+        fill = data[pos]
+        uniform = (fill not in excluded and data[pos + UNIFORM_BLOCK - 1] == fill
+                   and bytes(data[pos:pos + UNIFORM_BLOCK]) == _fill_block(fill))
+        if run_start is not None and not (uniform and fill == run_fill):
+            yield run_start, pos
+            run_start = None
+        if uniform and run_start is None:
+            run_start, run_fill = pos, fill
+        pos += UNIFORM_BLOCK
+    if run_start is not None:
+        yield run_start, pos
+
+class HoleFinder:
+    """
+    Buchi di un file sparso (immagini disco create con dd conv=sparse,
+    truncate, qemu-img...): si leggono come zeri ma non occupano spazio,
+    e lseek(SEEK_DATA) indica dove ricominciano i dati senza leggerli.
+    Sui sistemi o file system che non lo supportano non trova nessun buco.
+    """
+
+    def __init__(self, f, size):
+        self.f = f
+        self.size = size
+        self.supported = hasattr(os, "SEEK_DATA")
+
+    def data_after(self, pos):
+        """Offset dei primi dati da 'pos' in poi: 'pos' stesso se non è in un buco."""
+        if not self.supported or pos >= self.size:
+            return pos
+        try:
+            return min(os.lseek(self.f.fileno(), pos, os.SEEK_DATA), self.size)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                return self.size  # Solo buchi fino alla fine del file
+            self.supported = False  # Es. EINVAL: non supportato da questo file system o dispositivo
+            return pos
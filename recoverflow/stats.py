@@ -0,0 +1,165 @@
+"""Statistiche della scansione e consegna a frequenza limitata di messaggi e avanzamento."""
+import threading
+import time
+from collections import Counter
+
+from .rescue import BAD_SECTOR, NON_TRIED, merge_ranges
+
+# Intervallo minimo in secondi tra due consegne di messaggi e avanzamento (10 al secondo)
+REPORT_INTERVAL = 0.1
+# Messaggi tenuti per consegna: se ne arrivano di più vengono tenuti gli ultimi
+MAX_BATCH_LINES = 500
+
+class ScanStats:
+    """
+    Stato della scansione aggiornato dal motore: byte da analizzare e
+    analizzati, byte saltati, header trovati, scartati dai controlli
+    strutturali, file frammentati ricomposti e non, file recuperati e copie
+    di file già recuperati per tipo, zone illeggibili della sorgente, byte
+    esclusi perché fuori dalle zone da scandire (vedi volumes).
+    Velocità e tempo rimanente vengono calcolati da qui, senza dover
+    interpretare i messaggi di log.
+    """
+
+    def __init__(self, total=0):
+        self.total = total  # Byte da analizzare in questa esecuzione
+        self.done = 0  # Byte analizzati (compresi quelli di una scansione ripresa)
+        self.resumed_from = 0  # Byte già analizzati prima della ripresa
+        self.skipped = 0  # Byte saltati senza cercarvi header (zone vuote, buchi)
+        self.excluded = 0  # Byte fuori dallo spazio scelto (es. cluster allocati), né letti né scanditi
+        self.saved = 0.0  # Secondi risparmiati (stima) non scandendo i byte esclusi
+        self.hits = Counter()  # Header trovati per tipo
+        self.rejected = Counter()  # Header scartati dai controlli strutturali (validators) per tipo
+        self.reassembled = Counter()  # File divisi in due frammenti e ricomposti per tipo
+        self.fragmented = Counter()  # File frammentati non ricomponibili (recuperati contigui) per tipo
+        self.recovered = Counter()  # File recuperati per tipo
+        self.duplicates = Counter()  # Copie di contenuti già recuperati (saltate o collegate) per tipo
+        self.read_errors = 0  # Errori di lettura della sorgente (tentativi compresi)
+        self.bad_ranges = []  # (offset, lunghezza, stato) delle zone illeggibili e saltate (vedi rescue)
+        self.started = time.monotonic()
+
+    def merge(self, other):
+        """
+        Aggiunge header trovati e scartati, file frammentati e byte saltati di
+        un'altra scansione (una regione o una riscansione); i file recuperati
+        li conta chi li accetta.
+        """
+        self.skipped += other.skipped
+        self.read_errors += other.read_errors
+        self.bad_ranges.extend(other.bad_ranges)
+        self.hits.update(other.hits)
+        self.rejected.update(other.rejected)
+        self.reassembled.update(other.reassembled)
+        self.fragmented.update(other.fragmented)
+
+    def snapshot(self):
+        """Copia indipendente, da passare a un altro thread mentre la scansione continua."""
+        copy = ScanStats(self.total)
+        copy.__dict__.update(self.__dict__, hits=Counter(self.hits),
+                               rejected=Counter(self.rejected), reassembled=Counter(self.reassembled),
+                               fragmented=Counter(self.fragmented), recovered=Counter(self.recovered),
+                               duplicates=Counter(self.duplicates), bad_ranges=list(self.bad_ranges))
+        return copy
+
+    def to_dict(self):
+        """Riepilogo serializzabile in JSON."""
+        return {"total": self.total, "done": self.done, "resumed_from": self.resumed_from,
+                "skipped": self.skipped, "hits": dict(self.hits), "rejected": dict(self.rejected),
+                "reassembled": dict(self.reassembled), "fragmented": dict(self.fragmented),
+                "recovered": dict(+self.recovered), "duplicates": dict(self.duplicates),
+                "read_errors": self.read_errors, "unreadable": self.unreadable, "unread": self.unread,
+                "excluded": self.excluded, "saved_s": round(self.saved, 3),
+                "elapsed": round(self.elapsed, 3), "bytes_per_s": round(self.rate)}
+
+    @property
+    def unreadable(self):
+        """Byte illeggibili dopo tutti i tentativi, sostituiti da zeri."""
+        return sum(length for _, length, status in merge_ranges(self.bad_ranges) if status == BAD_SECTOR)
+
+    @property
+    def unread(self):
+        """Byte saltati senza leggerli dentro le zone danneggiate, sostituiti da zeri."""
+        return sum(length for _, length, status in merge_ranges(self.bad_ranges) if status == NON_TRIED)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """Byte analizzati al secondo in questa esecuzione."""
+        elapsed = self.elapsed
+        return (self.done - self.resumed_from) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def percent(self):
+        return min(100, self.done * 100 // self.total) if self.total else 0
+
+    @property
+    def eta(self):
+        """Secondi stimati alla fine della scansione, oppure None se non ancora stimabile."""
+        rate = self.rate
+        return (self.total - self.done) / rate if rate > 0 else None
+
+def format_duration(seconds):
+    """Durata leggibile: '1:02:03' oppure '2:03'; '--:--' se non nota."""
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+def format_counts(counter):
+    """Conteggi per tipo in ordine decrescente, es. 'jpg 12, pdf 3'."""
+    return ", ".join(f"{file_type} {count}" for file_type, count in counter.most_common() if count > 0)
+
+class ThrottledReporter:
+    """
+    Sta tra il motore e chi mostra messaggi e avanzamento (la GUI): log()
+    e progress() possono essere chiamati molte volte al secondo e da più
+    thread, ma 'on_log' riceve le righe raccolte in un'unica lista e
+    'on_progress' l'ultimo avanzamento al più una volta ogni 'interval'
+    secondi. flush() consegna subito quello che è in attesa e va chiamato
+    alla fine della scansione.
+    """
+
+    def __init__(self, on_log, on_progress, interval=REPORT_INTERVAL, max_lines=MAX_BATCH_LINES):
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.interval = interval
+        self.max_lines = max_lines
+        self._lines = []
+        self._dropped = 0
+        self._done = None
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def log(self, message):
+        with self._lock:
+            self._lines.append(message)
+            if len(self._lines) > self.max_lines:
+                del self._lines[0]
+                self._dropped += 1
+        self._maybe_flush()
+
+    def progress(self, done):
+        self._done = done
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        # Consegna sotto il lock: i gruppi di righe arrivano nell'ordine in cui sono stati raccolti
+        with self._lock:
+            self._last = time.monotonic()
+            lines, self._lines = self._lines, []
+            if self._dropped:
+                lines.insert(0, f"... {self._dropped} messaggi omessi ...")
+                self._dropped = 0
+            done, self._done = self._done, None
+            if lines:
+                self.on_log(lines)
+            if done is not None:
+                self.on_progress(done)
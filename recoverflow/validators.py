@@ -0,0 +1,188 @@
+"""
+Controlli strutturali dei file trovati, eseguiti prima di recuperarli.
+
+Ogni funzione riceve il lettore della sorgente, l'offset dell'header e il
+limite oltre il quale il file non può continuare (max_size o fine del disco)
+e restituisce True se i dati dopo l'header hanno la struttura attesa,
+altrimenti False (falso positivo). Una firma sceglie il suo controllo con la
+chiave 'validator'.
+
+I controlli leggono solo i primi VALIDATE_BYTES byte (i segmenti JPEG che
+proseguono oltre vengono seguiti con letture di pochi byte): costano molto
+meno della ricerca del footer e della scrittura che evitano. Gli header
+corti come 'ID3', 'RIFF', 'PK\\x03\\x04' e '\\xff\\xd8\\xff' compaiono spesso
+dentro altri file.
+"""
+import re
+import struct
+import zlib
+
+# Byte letti dall'inizio del file per i controlli
+VALIDATE_BYTES = 4096
+
+# --- JPEG ---
+
+# Marcatori senza lunghezza: TEM e RST0-RST7
+JPEG_STANDALONE = frozenset([0x01, *range(0xD0, 0xD8)])
+# Marcatori SOF (inizio del frame), esclusi DHT (C4), JPG (C8) e DAC (CC)
+JPEG_FRAMES = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Segmenti seguiti al massimo prima di SOS
+JPEG_MAX_SEGMENTS = 64
+
+def jpeg_valid(reader, start, limit):
+    """
+    JPEG: dopo SOI una sequenza di segmenti (0xFF, marcatore, lunghezza) che
+    arriva a SOS (inizio dei dati compressi) passando per un SOF. Un EOI o un
+    secondo SOI prima di SOS, un byte diverso da 0xFF dove deve iniziare un
+    segmento o un segmento oltre il limite sono falsi positivi.
+    """
+    head = bytes(reader.read_at(start, VALIDATE_BYTES))
+    pos = 2
+    seen_frame = False
+    for _ in range(JPEG_MAX_SEGMENTS):
+        if pos + 4 <= len(head):
+            segment = head[pos:pos + 4]
+        else:  # Segmenti lunghi (es. EXIF con miniatura): si leggono solo i 4 byte che servono
+            segment = bytes(reader.read_at(start + pos, 4))
+            if len(segment) < 4:
+                return False
+        if segment[0] != 0xFF:
+            return False
+        marker = segment[1]
+        if marker == 0xFF:  # Byte di riempimento prima del marcatore
+            pos += 1
+        elif marker in JPEG_STANDALONE:
+            pos += 2
+        elif marker in (0x00, 0xD8, 0xD9):
+            return False
+        elif marker == 0xDA:
+            return seen_frame
+        else:
+            length = segment[2] << 8 | segment[3]
+            if length < 2:
+                return False
+            seen_frame = seen_frame or marker in JPEG_FRAMES
+            pos += 2 + length
+            if start + pos >= limit:
+                return False
+    return False
+
+# --- PNG ---
+
+PNG_BIT_DEPTHS = {0: (1, 2, 4, 8, 16), 2: (8, 16), 3: (1, 2, 4, 8), 4: (8, 16), 6: (8, 16)}
+
+def png_valid(reader, start, limit):
+    """
+    PNG: il primo chunk è IHDR con campi ammessi e CRC corretto; i chunk che
+    seguono nei primi VALIDATE_BYTES byte hanno un tipo di quattro lettere e,
+    se vi sono contenuti per intero, il CRC corretto.
+    """
+    head = bytes(reader.read_at(start, VALIDATE_BYTES))
+    if len(head) < 33 or head[8:16] != b"\x00\x00\x00\x0dIHDR":
+        return False
+    width, height, depth, color, compression, filtering, interlace = struct.unpack_from(">IIBBBBB", head, 16)
+    if (not 0 < width < 1 << 31 or not 0 < height < 1 << 31 or depth not in PNG_BIT_DEPTHS.get(color, ())
+            or compression or filtering or interlace > 1):
+        return False
+    pos = 8
+    while pos + 12 <= len(head):
+        length, kind = struct.unpack_from(">I4s", head, pos)
+        if length >= 1 << 31 or not kind.isalpha():
+            return False
+        end = pos + 12 + length
+        if end > len(head):
+            break
+        crc, = struct.unpack_from(">I", head, end - 4)
+        if zlib.crc32(head[pos + 4:end - 4]) != crc:
+            return False
+        if kind == b"IEND":
+            break
+        pos = end
+    return True
+
+# --- PDF ---
+
+_PDF_HEADER = re.compile(rb"%PDF-[12]\.\d")
+_PDF_OBJECT = re.compile(rb"\d+\s+\d+\s+obj\b")
+
+def pdf_valid(reader, start, limit):
+    """
+    PDF: versione nell'header e un oggetto ('N G obj') nei primi byte, dove
+    ogni PDF inizia il corpo. La presenza della tabella xref viene
+    controllata sul footer (sizing.pdf_eof_end).
+    """
+    head = bytes(reader.read_at(start, VALIDATE_BYTES))
+    return bool(_PDF_HEADER.match(head)) and _PDF_OBJECT.search(head) is not None
+
+# --- ZIP (DOCX, XLSX, EPUB, ODT...) ---
+
+# Metodi di compressione: store, shrink, deflate, deflate64, bzip2, LZMA, zstd, MP3, xz, PPMd, AES
+ZIP_METHODS = frozenset([0, 1, 6, 8, 9, 12, 14, 93, 94, 95, 98, 99])
+# Bit dei flag riservati dalla specifica
+ZIP_RESERVED_FLAGS = 0xD780
+ZIP_MAX_NAME = 1024
+
+def zip_valid(reader, start, limit):
+    """
+    ZIP: campi del primo header locale plausibili (versione, flag riservati
+    a zero, metodo noto, data e ora DOS valide, nome di 1-1024 byte senza
+    caratteri di controllo, dimensioni uguali per i file non compressi).
+    """
+    head = bytes(reader.read_at(start, 30 + ZIP_MAX_NAME))
+    if len(head) < 30:
+        return False
+    (version, flags, method, mtime, mdate, _, compressed, uncompressed,
+     name_len, _) = struct.unpack_from("<HHHHHIIIHH", head, 4)
+    if (version & 0xFF) > 63 or version >> 8 > 19 or flags & ZIP_RESERVED_FLAGS or method not in ZIP_METHODS:
+        return False
+    if mdate or mtime:
+        day, month = mdate & 0x1F, mdate >> 5 & 0x0F
+        seconds, minutes, hours = (mtime & 0x1F) * 2, mtime >> 5 & 0x3F, mtime >> 11
+        if not (1 <= day <= 31 and 1 <= month <= 12 and seconds < 60 and minutes < 60 and hours < 24):
+            return False
+    if not 1 <= name_len <= ZIP_MAX_NAME or 30 + name_len > len(head):
+        return False
+    if any(b < 0x20 for b in head[30:30 + name_len]):
+        return False
+    # Senza descrittore dei dati (flag 3) le dimensioni sono nell'header
+    return bool(flags & 0x08) or method != 0 or compressed == uncompressed
+
+# --- RIFF WAVE ---
+
+# Formati PCM e IEEE float: block_align e byte_rate si ricavano dagli altri campi
+WAVE_PCM_FORMATS = (1, 3)
+
+def wave_valid(reader, start, limit):
+    """
+    WAV: forma 'WAVE' e, tra i primi chunk, un chunk 'fmt ' con canali,
+    frequenza e bit per campione ammessi e, per PCM, coerenti tra loro.
+    """
+    head = bytes(reader.read_at(start, VALIDATE_BYTES))
+    if len(head) < 12 or head[8:12] != b"WAVE":
+        return False
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, size = struct.unpack_from("<4sI", head, pos)
+        if not all(0x20 <= b <= 0x7E for b in chunk_id):
+            return False
+        if chunk_id == b"fmt ":
+            if size < 16 or pos + 24 > len(head):
+                return False
+            fmt, channels, rate, byte_rate, block_align, bits = struct.unpack_from("<HHIIHH", head, pos + 8)
+            if not (fmt and 1 <= channels <= 64 and 1 <= rate <= 1_000_000 and byte_rate):
+                return False
+            if fmt in WAVE_PCM_FORMATS:
+                return (1 <= bits <= 64 and block_align == channels * ((bits + 7) // 8)
+                        and byte_rate == rate * block_align)
+            return True
+        pos += 8 + size + (size & 1)
+    return False
+
+# Nome del controllo (chiave 'validator' delle firme) -> funzione
+VALIDATORS = {
+    "jpeg": jpeg_valid,
+    "png": png_valid,
+    "pdf": pdf_valid,
+    "zip": zip_valid,
+    "wave": wave_valid,
+}
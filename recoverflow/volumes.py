@@ -0,0 +1,488 @@
+"""
+Partizioni e spazio non allocato dei file system: le zone da scandire.
+
+Un disco con file system contiene, oltre ai file cancellati, tutti i file
+ancora presenti, che non serve recuperare: scandirli moltiplica tempo e
+file salvati. Qui vengono lette la tabella delle partizioni (MBR con le
+partizioni logiche, oppure GPT) e, per i file system FAT12/16/32, exFAT e
+NTFS, la mappa dei cluster occupati (la FAT, la bitmap di allocazione di
+exFAT, il file $Bitmap di NTFS). Ne risulta una ScanScope: gli intervalli
+della sorgente in cui cercare gli header, cioè lo spazio non allocato
+(cluster liberi, spazio fuori dalle partizioni) oppure una sola partizione.
+
+Le partizioni con un file system non riconosciuto (o danneggiato) vengono
+scandite per intero: meglio un file di troppo che uno perso. Una sorgente
+senza tabella delle partizioni ma con un file system riconosciuto (es.
+/dev/sdb1 o l'immagine di una chiavetta) è trattata come una partizione sola.
+"""
+import bisect
+import re
+import struct
+import uuid
+import zlib
+from collections import namedtuple
+
+from .readers import SECTOR_SIZE, _readinto_full
+
+# Le LBA dell'MBR sono sempre in settori da 512 byte; la GPT può usare settori da 4096
+MBR_SECTOR = 512
+# Tipi MBR delle partizioni estese, che contengono la catena delle partizioni logiche
+MBR_EXTENDED = {0x05, 0x0F, 0x85}
+MBR_PROTECTIVE = 0xEE
+MBR_TYPES = {0x01: "FAT12", 0x04: "FAT16", 0x06: "FAT16", 0x07: "NTFS/exFAT", 0x0B: "FAT32", 0x0C: "FAT32 LBA",
+             0x0E: "FAT16 LBA", 0x27: "Windows RE", 0x82: "Linux swap", 0x83: "Linux", 0x8E: "Linux LVM",
+             0xEF: "EFI"}
+GPT_TYPES = {
+    "c12a7328-f81f-11d2-ba4b-00a0c93ec93b": "EFI System",
+    "e3c9e316-0b5c-4db8-817d-f92df00215ae": "Microsoft reserved",
+    "ebd0a0a2-b9e5-4433-87c0-68b6b72699c7": "Microsoft basic data",
+    "de94bba4-06d1-4d40-a16a-bfd50179d6ac": "Windows recovery",
+    "0fc63daf-8483-4772-8e79-3d69d8477de4": "Linux filesystem",
+    "0657fd6d-a4ab-43c4-84e5-0933c84b4f4f": "Linux swap",
+    "48465300-0000-11aa-aa11-00306543ecac": "Apple HFS+",
+    "7c3457ef-0000-11aa-aa11-00306543ecac": "Apple APFS",
+}
+# Limite alle partizioni logiche seguite nella catena degli EBR (una catena ciclica non finisce)
+MAX_LOGICAL_PARTITIONS = 128
+# Byte della mappa di allocazione (FAT o bitmap) elaborati per volta
+MAP_CHUNK = 1024 * 1024
+
+# Una partizione: numero (da 1, come nei nomi dei dispositivi), offset e dimensione in byte,
+# schema ("MBR", "GPT" o "volume" se la sorgente non ha tabella), descrizione del tipo,
+# file system riconosciuto (FileSystem) oppure None
+Partition = namedtuple("Partition", "number start size scheme kind filesystem")
+
+_ZERO_RUN = re.compile(rb"\x00+")
+# _BIT_TABLES[k] traduce ogni byte nel suo bit k (0 o 1)
+_BIT_TABLES = [bytes((value >> k) & 1 for value in range(256)) for k in range(8)]
+# Le voci FAT32 usano solo i 28 bit bassi: del byte più alto contano i 4 bit bassi
+_FAT32_HIGH = bytes(value & 0x0F for value in range(256))
+
+def _read(f, offset, length):
+    """Legge [offset, offset + length) con letture allineate al settore, come richiesto dai dischi raw."""
+    aligned = offset - offset % SECTOR_SIZE
+    end = offset + length
+    end += -end % SECTOR_SIZE
+    buffer = bytearray(end - aligned)
+    f.seek(aligned)
+    n = _readinto_full(f, memoryview(buffer))
+    return bytes(buffer[offset - aligned:min(n, offset - aligned + length)])
+
+def _zero_runs(byte_map, first):
+    """(primo, numero) delle sequenze di byte zero di 'byte_map', il cui byte i è l'elemento first + i."""
+    for match in _ZERO_RUN.finditer(byte_map):
+        yield first + match.start(), match.end() - match.start()
+
+def _bitmap_map(bitmap):
+    """Un byte per bit della bitmap (bit meno significativo per primo): 0 libero, 1 occupato."""
+    out = bytearray(len(bitmap) * 8)
+    for k, table in enumerate(_BIT_TABLES):
+        out[k::8] = bitmap.translate(table)
+    return out
+
+def _or_bytes(*parts):
+    """OR byte per byte di sequenze della stessa lunghezza (in C, tramite interi grandi)."""
+    value = 0
+    for part in parts:
+        value |= int.from_bytes(part, "little")
+    return value.to_bytes(len(parts[0]), "little")
+
+class FileSystem:
+    """
+    File system di una partizione: 'name', offset e dimensione in byte,
+    dimensione del cluster. free_ranges() restituisce in ordine gli
+    intervalli (inizio, fine) assoluti dei cluster liberi e dello spazio
+    della partizione dopo l'ultimo cluster.
+    """
+
+    name = None
+
+    def __init__(self, f, start, size, cluster_size, first_cluster, cluster_count, heap_start):
+        self.f = f
+        self.start = start
+        self.size = size
+        self.cluster_size = cluster_size
+        self.first_cluster = first_cluster  # Numero del primo cluster dell'area dati
+        self.cluster_count = cluster_count
+        self.heap_start = heap_start  # Offset assoluto del primo cluster
+
+    def free_ranges(self):
+        first, end = self.first_cluster, self.first_cluster + self.cluster_count
+        for cluster, count in self._free_clusters():
+            cluster, last = max(cluster, first), min(cluster + count, end)
+            if cluster < last:
+                yield self._offset(cluster), self._offset(last)
+        heap_end = self._offset(end)
+        if heap_end < self.start + self.size:
+            yield heap_end, self.start + self.size
+
+    def free_bytes(self):
+        return sum(end - start for start, end in self.free_ranges())
+
+    def _offset(self, cluster):
+        return self.heap_start + (cluster - self.first_cluster) * self.cluster_size
+
+    def _free_clusters(self):
+        """(primo cluster, numero) delle sequenze di cluster liberi."""
+        raise NotImplementedError
+
+class FatFileSystem(FileSystem):
+    """FAT12, FAT16 e FAT32: un cluster è libero se la sua voce nella prima FAT è 0."""
+
+    def __init__(self, f, start, size, boot):
+        bytes_per_sector, sectors_per_cluster, reserved, fats, root_entries, total16, fat16 = \
+            struct.unpack_from("<HBHBHH", boot, 11) + struct.unpack_from("<H", boot, 22)
+        total = total16 or struct.unpack_from("<I", boot, 32)[0]
+        self.fat_size = (fat16 or struct.unpack_from("<I", boot, 36)[0]) * bytes_per_sector
+        root_sectors = -(-root_entries * 32 // bytes_per_sector)
+        data_sector = reserved + fats * self.fat_size // bytes_per_sector + root_sectors
+        count = (total - data_sector) // sectors_per_cluster
+        self.name = "FAT12" if count < 4085 else "FAT16" if count < 65525 else "FAT32"
+        self.fat_start = start + reserved * bytes_per_sector
+        super().__init__(f, start, min(size, total * bytes_per_sector), sectors_per_cluster * bytes_per_sector,
+                         2, count, start + data_sector * bytes_per_sector)
+
+    def _free_clusters(self):
+        entries = self.first_cluster + self.cluster_count
+        if self.name == "FAT12":
+            fat = _read(self.f, self.fat_start, min(self.fat_size, -(-entries * 3 // 2)))
+            values = bytearray(b"\x01") * entries  # Le voci oltre la fine della FAT letta restano occupate
+            for cluster in range(entries):
+                pos = cluster * 3 // 2
+                if pos + 1 >= len(fat):
+                    break
+                pair = fat[pos] | fat[pos + 1] << 8
+                values[cluster] = ((pair >> 4) if cluster & 1 else (pair & 0xFFF)) != 0
+            yield from _zero_runs(values, 0)
+            return
+        width = 2 if self.name == "FAT16" else 4
+        length = min(self.fat_size, entries * width)
+        chunk = MAP_CHUNK - MAP_CHUNK % width
+        for pos in range(0, length, chunk):
+            data = _read(self.f, self.fat_start + pos, min(chunk, length - pos))
+            data = data[:len(data) - len(data) % width]
+            parts = [data[k::width] for k in range(width)]
+            if width == 4:
+                parts[3] = parts[3].translate(_FAT32_HIGH)
+            yield from _zero_runs(_or_bytes(*parts), pos // width)
+
+class ExfatFileSystem(FileSystem):
+    """exFAT: la bitmap di allocazione è un file della directory radice (voce 0x81)."""
+
+    name = "exFAT"
+
+    def __init__(self, f, start, size, boot):
+        fat_offset, _, heap_offset, count, self.root_cluster = struct.unpack_from("<IIIII", boot, 80)
+        self.sector_size = 1 << boot[108]
+        cluster_size = self.sector_size << boot[109]
+        volume = struct.unpack_from("<Q", boot, 72)[0] * self.sector_size
+        self.fat_start = start + fat_offset * self.sector_size
+        super().__init__(f, start, min(size, volume), cluster_size, 2, count,
+                         start + heap_offset * self.sector_size)
+
+    def _chain(self, cluster, length):
+        """Cluster di un file lungo 'length' byte: dalla FAT, oppure contigui dove la catena non c'è (voce 0)."""
+        clusters = []
+        for _ in range(-(-length // self.cluster_size)):
+            if not 2 <= cluster < 2 + self.cluster_count:
+                break
+            clusters.append(cluster)
+            following = struct.unpack("<I", _read(self.f, self.fat_start + 4 * cluster, 4))[0]
+            if following >= 0xFFFFFFF7:
+                break  # Fine della catena (o cluster danneggiato)
+            cluster = following if following >= 2 else cluster + 1
+        return clusters
+
+    def _read_file(self, cluster, length):
+        for cluster in self._chain(cluster, length):
+            data = _read(self.f, self._offset(cluster), min(self.cluster_size, length))
+            length -= len(data)
+            yield data
+
+    def _free_clusters(self):
+        bitmap = None
+        root = b"".join(self._read_file(self.root_cluster, 64 * self.cluster_size))
+        for pos in range(0, len(root) - 31, 32):
+            entry_type = root[pos]
+            if entry_type == 0x00:
+                break
+            if entry_type == 0x81 and not root[pos + 1] & 1:  # La prima bitmap (la seconda è di TexFAT)
+                bitmap = struct.unpack_from("<IQ", root, pos + 20)
+                break
+        if bitmap is None:
+            raise ValueError("bitmap di allocazione exFAT non trovata")
+        first = 0
+        length = min(bitmap[1], -(-self.cluster_count // 8))
+        for data in self._read_file(bitmap[0], length):
+            yield from _zero_runs(_bitmap_map(data), self.first_cluster + first)
+            first += len(data) * 8
+
+class NtfsFileSystem(FileSystem):
+    """NTFS: i cluster occupati sono i bit a 1 del file $Bitmap (record 6 della MFT)."""
+
+    name = "NTFS"
+    BITMAP_RECORD = 6
+
+    def __init__(self, f, start, size, boot):
+        sector_size = struct.unpack_from("<H", boot, 11)[0]
+        per_cluster = boot[13] if boot[13] <= 0x80 else 1 << (256 - boot[13])
+        cluster_size = sector_size * per_cluster
+        total = struct.unpack_from("<Q", boot, 40)[0]
+        self.mft_start = start + struct.unpack_from("<Q", boot, 48)[0] * cluster_size
+        record = struct.unpack_from("<b", boot, 64)[0]
+        self.record_size = record * cluster_size if record > 0 else 1 << -record
+        super().__init__(f, start, min(size, total * sector_size), cluster_size, 0, total // per_cluster, start)
+
+    def _record(self, number):
+        """Record della MFT con le correzioni della sequenza di aggiornamento applicate."""
+        record = bytearray(_read(self.f, self.mft_start + number * self.record_size, self.record_size))
+        if record[:4] != b"FILE":
+            raise ValueError(f"record {number} della MFT non valido")
+        usa_offset, usa_count = struct.unpack_from("<HH", record, 4)
+        for i in range(1, usa_count):
+            end = i * 512  # Le correzioni valgono ogni 512 byte, qualunque sia il settore
+            if end > len(record):
+                break
+            if record[end - 2:end] != record[usa_offset:usa_offset + 2]:
+                raise ValueError(f"record {number} della MFT incompleto")
+            record[end - 2:end] = record[usa_offset + 2 * i:usa_offset + 2 * i + 2]
+        return bytes(record)
+
+    def _data(self):
+        """Contenuto di $Bitmap, a pezzi: l'attributo $DATA senza nome, residente o con la lista delle run."""
+        record = self._record(self.BITMAP_RECORD)
+        pos = struct.unpack_from("<H", record, 20)[0]
+        while pos + 16 <= len(record):
+            attribute, length, non_resident, name_length = struct.unpack_from("<IIBB", record, pos)
+            if attribute == 0xFFFFFFFF or length == 0:
+                break
+            if attribute == 0x80 and name_length == 0:
+                if not non_resident:
+                    value_length, value_offset = struct.unpack_from("<IH", record, pos + 16)
+                    yield record[pos + value_offset:pos + value_offset + value_length]
+                    return
+                runs_offset = struct.unpack_from("<H", record, pos + 32)[0]
+                remaining = struct.unpack_from("<Q", record, pos + 48)[0]
+                for lcn, count in _runlist(record, pos + runs_offset, pos + length):
+                    for first in range(0, count * self.cluster_size, MAP_CHUNK):
+                        if remaining <= 0:
+                            return
+                        length_read = min(MAP_CHUNK, count * self.cluster_size - first, remaining)
+                        data = (bytes(length_read) if lcn is None
+                                else _read(self.f, self.start + lcn * self.cluster_size + first, length_read))
+                        remaining -= len(data)
+                        yield data
+                return
+            pos += length
+        raise ValueError("attributo $DATA di $Bitmap non trovato")
+
+    def _free_clusters(self):
+        first = 0
+        for data in self._data():
+            yield from _zero_runs(_bitmap_map(data), first)
+            first += len(data) * 8
+
+def _runlist(record, pos, end):
+    """(LCN, numero di cluster) delle run di un attributo non residente; LCN None per le run sparse."""
+    lcn = 0
+    while pos < end and record[pos]:
+        length_size, offset_size = record[pos] & 0x0F, record[pos] >> 4
+        count = int.from_bytes(record[pos + 1:pos + 1 + length_size], "little")
+        if offset_size:
+            lcn += int.from_bytes(record[pos + 1 + length_size:pos + 1 + length_size + offset_size], "little",
+                                  signed=True)
+            yield lcn, count
+        else:
+            yield None, count
+        pos += 1 + length_size + offset_size
+
+def detect_filesystem(f, start, size):
+    """Il FileSystem che inizia a 'start', oppure None se non è FAT, exFAT o NTFS (o non è valido)."""
+    try:
+        boot = _read(f, start, 512)
+        if len(boot) < 512 or boot[510:512] != b"\x55\xaa":
+            return None
+        oem = boot[3:11]
+        if oem == b"EXFAT   ":
+            if 9 <= boot[108] <= 12 and boot[108] + boot[109] <= 25:
+                return ExfatFileSystem(f, start, size, boot)
+            return None
+        bytes_per_sector, sectors_per_cluster, reserved, fats = struct.unpack_from("<HBHB", boot, 11)
+        if (bytes_per_sector not in (512, 1024, 2048, 4096) or boot[0] not in (0xEB, 0xE9)):
+            return None
+        if oem == b"NTFS    ":
+            return NtfsFileSystem(f, start, size, boot)
+        fat_sectors = struct.unpack_from("<H", boot, 22)[0] or struct.unpack_from("<I", boot, 36)[0]
+        total = struct.unpack_from("<H", boot, 19)[0] or struct.unpack_from("<I", boot, 32)[0]
+        if (sectors_per_cluster and not sectors_per_cluster & (sectors_per_cluster - 1) and reserved
+                and fats in (1, 2) and fat_sectors and total > reserved + fats * fat_sectors):
+            return FatFileSystem(f, start, size, boot)
+    except (OSError, ValueError, struct.error):
+        pass
+    return None
+
+def _mbr_partitions(f, size, sector):
+    """Partizioni primarie e logiche dell'MBR 'sector' (tipo, inizio, dimensione in byte)."""
+    partitions = []
+    for i in range(4):
+        status, kind, first, count = struct.unpack_from("<B3xB3xII", sector, 446 + 16 * i)
+        if status not in (0x00, 0x80) or not kind or not count:
+            continue
+        if kind in MBR_EXTENDED:
+            partitions.extend(_logical_partitions(f, size, first))
+        else:
+            partitions.append((kind, first * MBR_SECTOR, count * MBR_SECTOR))
+    return partitions
+
+def _logical_partitions(f, size, extended):
+    """Partizioni della catena di EBR che inizia al settore 'extended' (i link sono relativi a lui)."""
+    partitions = []
+    ebr = extended
+    for _ in range(MAX_LOGICAL_PARTITIONS):
+        sector = _read(f, ebr * MBR_SECTOR, MBR_SECTOR)
+        if len(sector) < MBR_SECTOR or sector[510:512] != b"\x55\xaa":
+            break
+        kind, first, count = struct.unpack_from("<4xB3xII", sector, 446)
+        if kind and count:
+            partitions.append((kind, (ebr + first) * MBR_SECTOR, count * MBR_SECTOR))
+        link_kind, link = struct.unpack_from("<4xB3xI", sector, 462)
+        if link_kind not in MBR_EXTENDED or not link or (extended + link) * MBR_SECTOR >= size:
+            break
+        ebr = extended + link
+    return partitions
+
+def _gpt_partitions(f, size):
+    """Partizioni GPT (descrizione, inizio, dimensione in byte), oppure None se l'intestazione non è valida."""
+    for sector_size in (512, 4096):
+        header = _read(f, sector_size, 92)
+        if header[:8] != b"EFI PART":
+            continue
+        header_size = struct.unpack_from("<I", header, 12)[0]
+        header = _read(f, sector_size, header_size)
+        crc = struct.unpack_from("<I", header, 16)[0]
+        if zlib.crc32(header[:16] + b"\0\0\0\0" + header[20:]) != crc:
+            return None
+        entries_lba, count, entry_size, entries_crc = struct.unpack_from("<QIII", header, 72)
+        entries = _read(f, entries_lba * sector_size, count * entry_size)
+        if zlib.crc32(entries) != entries_crc:
+            return None
+        partitions = []
+        for pos in range(0, len(entries), entry_size):
+            kind, first, last = uuid.UUID(bytes_le=entries[pos:pos + 16]), *struct.unpack_from("<QQ", entries, pos + 32)
+            if kind.int == 0:
+                continue
+            name = entries[pos + 56:pos + 128].decode("utf-16-le", "replace").rstrip("\0")
+            description = GPT_TYPES.get(str(kind), str(kind))
+            partitions.append((f"{description} ({name})" if name else description,
+                               first * sector_size, (last - first + 1) * sector_size))
+        return partitions
+    return None
+
+def read_partitions(f, size):
+    """
+    Partizioni della sorgente in ordine di offset, con il file system
+    riconosciuto. Una sorgente senza tabella delle partizioni ma con un file
+    system all'inizio è una partizione sola ("volume"); altrimenti [].
+    """
+    sector = _read(f, 0, MBR_SECTOR)
+    filesystem = detect_filesystem(f, 0, size)
+    if filesystem is not None:
+        # Il settore di avvio di un file system ha la stessa firma 55 AA dell'MBR
+        return [Partition(1, 0, size, "volume", filesystem.name, filesystem)]
+    if len(sector) < MBR_SECTOR or sector[510:512] != b"\x55\xaa":
+        return []
+    found, scheme = None, "MBR"
+    if any(sector[446 + 16 * i + 4] == MBR_PROTECTIVE for i in range(4)):
+        found, scheme = _gpt_partitions(f, size), "GPT"
+    if found is None:
+        scheme = "MBR"
+        found = [(MBR_TYPES.get(kind, f"0x{kind:02X}"), start, length)
+                 for kind, start, length in _mbr_partitions(f, size, sector) if kind != MBR_PROTECTIVE]
+    partitions = []
+    for number, (kind, start, length) in enumerate(sorted(found, key=lambda p: p[1]), 1):
+        if start >= size:
+            continue
+        length = min(length, size - start)
+        partitions.append(Partition(number, start, length, scheme, kind, detect_filesystem(f, start, length)))
+    return partitions
+
+def format_partition(partition):
+    """Descrizione di una riga, es. 'Partizione 1 (GPT): EFI System, offset 1048576, 100 MB, FAT32'."""
+    filesystem = partition.filesystem.name if partition.filesystem is not None else "file system non riconosciuto"
+    return (f"Partizione {partition.number} ({partition.scheme}): {partition.kind}, offset {partition.start}, "
+            f"{partition.size / 1024**2:.0f} MB, {filesystem}")
+
+class ScanScope:
+    """
+    Zone della sorgente in cui cercare gli header: intervalli [inizio, fine)
+    ordinati e disgiunti. Gli header devono iniziare dentro una zona; i file
+    possono proseguire oltre (un file cancellato può finire in cluster già
+    riassegnati). 'description' serve ai messaggi.
+    """
+
+    def __init__(self, ranges, description):
+        merged = []
+        for start, end in sorted(ranges):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.ranges = [tuple(r) for r in merged]
+        self._starts = [start for start, _ in self.ranges]
+        self.description = description
+
+    def covered(self, start, end):
+        """Byte di [start, end) dentro le zone."""
+        return sum(max(0, min(b, end) - max(a, start)) for a, b in self.clip(start, end))
+
+    def next_start(self, pos, default):
+        """Primo offset da 'pos' in poi dentro una zona ('pos' stesso se vi è già), oppure 'default'."""
+        i = bisect.bisect_right(self._starts, pos) - 1
+        if i >= 0 and pos < self.ranges[i][1]:
+            return pos
+        return self._starts[i + 1] if i + 1 < len(self._starts) else default
+
+    def clip(self, start, end):
+        """Parti delle zone dentro [start, end), in ordine."""
+        i = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        while i < len(self.ranges) and self.ranges[i][0] < end:
+            a, b = self.ranges[i]
+            if b > start:
+                yield max(a, start), min(b, end)
+            i += 1
+
+def unallocated_scope(f, size, partitions, log=None):
+    """
+    ScanScope dello spazio non allocato: fuori dalle partizioni, cluster
+    liberi dei file system riconosciuti, partizioni non riconosciute intere.
+    """
+    log = log or (lambda message: None)
+    ranges = []
+    pos = 0
+    for partition in partitions:
+        if partition.start > pos:
+            ranges.append((pos, partition.start))
+        pos = max(pos, partition.start + partition.size)
+        ranges.extend(partition_ranges(partition, unallocated=True, log=log))
+    if pos < size:
+        ranges.append((pos, size))
+    return ScanScope(ranges, "spazio non allocato")
+
+def partition_ranges(partition, unallocated=False, log=None):
+    """Intervalli da scandire di una partizione: tutta, oppure (con 'unallocated') i suoi cluster liberi."""
+    log = log or (lambda message: None)
+    end = partition.start + partition.size
+    if not unallocated:
+        return [(partition.start, end)]
+    if partition.filesystem is None:
+        log(f"Partizione {partition.number} ({partition.kind}): file system non riconosciuto, scandita per intero.")
+        return [(partition.start, end)]
+    # Lo spazio prima del primo cluster (settore di avvio, FAT, directory radice di FAT12/16) è del file system
+    try:
+        return [(start, min(stop, end)) for start, stop in partition.filesystem.free_ranges() if start < end]
+    except (OSError, ValueError, struct.error) as e:
+        log(f"Partizione {partition.number}: mappa di allocazione {partition.filesystem.name} illeggibile ({e}), "
+            f"scandita per intero.")
+        return [(partition.start, end)]
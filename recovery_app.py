@@ -1,15 +1,39 @@
 import sys
 import os
+import multiprocessing
 import platform  # Per distinguere il sistema operativo
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QComboBox, QPushButton, QLineEdit, QLabel, QTextEdit, QFileDialog,
-    QStatusBar, QMessageBox, QProgressBar
+    QComboBox, QPushButton, QLineEdit, QLabel, QPlainTextEdit, QFileDialog,
+    QStatusBar, QMessageBox, QProgressBar, QSpinBox
 )
 from PySide6.QtCore import QThread, Signal, Qt
 from PySide6.QtGui import QPixmap, QIcon, QPainter, QBrush, QPalette
 
+# Il motore di carving è nel pacchetto 'recoverflow', che non dipende dalla GUI
+from recoverflow import (
+    Carver, CarvingError, ThrottledReporter, DEFAULT_BLOCK_SIZE, DEFAULT_MAP_WINDOW, DEFAULT_REGION_SIZE,
+    format_counts, format_duration, Instrumentation, SamplingProfiler, write_diagnostics, INSTRUMENTATION_NAME,
+    load_signatures, DEDUP_MODES, ERROR_MAP_NAME
+)
+
+# Righe tenute nel log di scansione: le più vecchie vengono eliminate
+MAX_LOG_LINES = 5000
+# Diagnostica facoltativa, attivata dall'ambiente (es. RECOVERFLOW_INSTRUMENT=1):
+# tempi per fase e profilo a campionamento salvati nella cartella di output
+INSTRUMENT = bool(os.environ.get("RECOVERFLOW_INSTRUMENT"))
+PROFILE = bool(os.environ.get("RECOVERFLOW_PROFILE"))
+# Database JSON di firme da aggiungere a quelle predefinite (vedi recoverflow.database)
+SIGNATURES_PATH = os.environ.get("RECOVERFLOW_SIGNATURES")
+# Copie di file già recuperati: "skip" non le salva, "link" le collega al primo file
+DEDUP = os.environ.get("RECOVERFLOW_DEDUP", "off")
+if DEDUP not in DEDUP_MODES:
+    DEDUP = "off"
+# Con RECOVERFLOW_INDEX_ONLY=1 la scansione scrive solo l'indice dei file trovati, da cui
+# salvarli in seguito con la riga di comando (python -m recoverflow ... --from-index)
+INDEX_ONLY = bool(os.environ.get("RECOVERFLOW_INDEX_ONLY"))
+
 # Su Windows, importa la libreria WMI se disponibile
 if platform.system() == "Windows":
     try:
@@ -30,55 +54,6 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-# --- DEFINIZIONE DELLE FIRME DEI FILE ---
-# Dizionario delle firme dei file. 'footer' è opzionale.
-FILE_SIGNATURES = {
-    "jpg": {
-        "header": b'\xff\xd8\xff', # Header più generico per JPG/JPEG
-        "footer": b'\xff\xd9',
-        "max_size": 20 * 1024 * 1024 # 20 MB
-    },
-    "png": {
-        "header": b'\x89PNG\r\n\x1a\n',
-        "footer": b'IEND\xaeB`\x82',
-        "max_size": 20 * 1024 * 1024 # 20 MB
-    },
-    "pdf": {
-        "header": b'%PDF-',
-        "footer": b'%%EOF',
-        "max_size": 50 * 1024 * 1024 # 50 MB
-    },
-    "mp4": {
-        "header": b'\x00\x00\x00\x18ftypmp42', # Una delle firme comuni per MP4
-        "footer": None, # I file MP4 non hanno un footer semplice e affidabile
-        "max_size": 500 * 1024 * 1024 # 500 MB, i video possono essere grandi
-    },
-    "mp3": {
-        "header": b'ID3', # L'header più comune per i file MP3 con metadati
-        "footer": None, # Non hanno un footer standard affidabile
-        "max_size": 25 * 1024 * 1024 # 25 MB
-    },
-    "wav": {
-        "header": b'RIFF', # L'header per i file WAV (e altri, come AVI)
-        "footer": None, # La dimensione è nel header, ma per semplicità usiamo una dimensione massima
-        "max_size": 100 * 1024 * 1024 # 100 MB per audio non compresso
-    },
-    "doc": {
-        "header": b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', # Header per file OLE (DOC, XLS, PPT)
-        "footer": None,
-        "max_size": 30 * 1024 * 1024 # 30 MB
-    },
-    "docx": {
-        "header": b'PK\x03\x04', # Header per file ZIP (usato da DOCX, XLSX, etc.)
-        "footer": b'PK\x05\x06', # Footer del record della directory centrale ZIP
-        "max_size": 50 * 1024 * 1024 # 50 MB
-    }
-}
-
-# Calcola la lunghezza massima dell'header una sola volta per ottimizzare
-# e prevenire crash se il dizionario è vuoto.
-MAX_HEADER_LEN = max(len(s["header"]) for s in FILE_SIGNATURES.values()) if FILE_SIGNATURES else 0
-
 # --- FOGLIO DI STILE (QSS) PER LA GUI ---
 STYLE_SHEET = """
     /* Stile generale della finestra */
@@ -94,7 +69,7 @@ STYLE_SHEET = """
     }
 
     /* Stile per i campi di testo e aree di log */
-    QLineEdit, QTextEdit {
+    QLineEdit, QPlainTextEdit, QSpinBox {
         background-color: #34495e; /* Blu più scuro */
         color: #ecf0f1;
         border: 1px solid #566573;
@@ -136,148 +111,83 @@ STYLE_SHEET = """
     QPushButton#stopButton { background-color: #27ae60; } /* Verde */
     QPushButton#browseButton, QPushButton#refreshButton { background-color: #3498db; } /* Azzurro */
 """
-
 # --- CLASSE WORKER PER LA SCANSIONE ---
 class ScanWorker(QThread):
-    progress_update = Signal(str)
-    progress_percentage = Signal(int)
-    scan_finished = Signal(str)  # Invia un messaggio finale (successo o errore)
-
-    def __init__(self, disk_path, output_dir):
+    # Messaggi e statistiche arrivano alla GUI a gruppi, al più 10 volte al secondo:
+    # un segnale per ogni messaggio o blocco letto bloccherebbe l'interfaccia
+    log_batch = Signal(list)
+    stats_update = Signal(object)  # ScanStats
+    scan_finished = Signal(str, bool)  # Messaggio finale e True se la scansione è arrivata alla fine
+
+    def __init__(self, disk_path, output_dir, block_size=DEFAULT_BLOCK_SIZE, scan_mode="auto",
+                 map_window=DEFAULT_MAP_WINDOW, workers=1, region_size=DEFAULT_REGION_SIZE, alignment=0,
+                 instrument=False, profile=False, signatures=None, dedup="off", index_only=False):
         super().__init__()
         self.disk_path = disk_path
         self.output_dir = output_dir
-        self.is_running = True
+        self.reporter = ThrottledReporter(self.log_batch.emit, self.on_progress)
+        instruments = Instrumentation(os.path.join(output_dir, INSTRUMENTATION_NAME)) if instrument else None
+        self.profiler = SamplingProfiler() if profile else None
+        self.carver = Carver(disk_path, output_dir, block_size, scan_mode, map_window, workers, region_size,
+                             log=self.reporter.log, progress=self.reporter.progress, alignment=alignment,
+                             instruments=instruments, signatures=signatures, dedup=dedup, index_only=index_only)
 
     def run(self):
-        """
-        Logica di recupero file (File Carving).
-        Legge il disco settore per settore alla ricerca di firme di file.
-        """
-        self.progress_update.emit(f"Avvio scansione su {self.disk_path}...")
-        file_count = 0
-        
-        total_size = 0
+        """Esegue la scansione con il motore di carving e ne riporta l'esito."""
+        self.reporter.log(f"Avvio scansione su {self.disk_path}...")
         try:
-            with open(self.disk_path, "rb") as f:
-                # Calcola la dimensione totale del disco per la progress bar
-                f.seek(0, os.SEEK_END)
-                total_size = f.tell()
-                f.seek(0)
-                if total_size == 0:
-                    self.scan_finished.emit("ERRORE: Impossibile determinare la dimensione del disco.")
-                    return
-
-                # Leggiamo il disco in blocchi più grandi per migliorare le prestazioni
-                # ma manteniamo un buffer scorrevole per non perdere gli header
-                chunk_size = 4096
-                buffer = b''
-                while self.is_running:
-                    new_data = f.read(chunk_size)
-                    if not new_data:
-                        break  # Fine del disco
-                    
-                    buffer += new_data
-
-                    # Aggiorna la barra di progresso
-                    current_pos = f.tell()
-                    self.progress_percentage.emit(int((current_pos * 100) / total_size))
-
-                    # --- Logica di Scansione Migliorata ---
-                    found_pos = -1
-                    found_type = None
-
-                    # 1. Trova la prima occorrenza di QUALSIASI header nel buffer
-                    for file_type, sigs in FILE_SIGNATURES.items():
-                        pos = buffer.find(sigs["header"])
-                        if pos != -1 and (found_pos == -1 or pos < found_pos):
-                            found_pos = pos
-                            found_type = file_type
-                    
-                    if found_type:
-                        sigs = FILE_SIGNATURES[found_type]
-                        header_pos = f.tell() - len(buffer) + found_pos
-                        self.progress_update.emit(f"Trovato potenziale header {found_type.upper()} alla posizione: {header_pos}")
-                        
-                        # Estrai i dati a partire dall'header trovato
-                        file_data = bytearray(buffer[found_pos:])
-                        
-                        # Se il file ha un footer definito, cercalo
-                        if sigs["footer"]:
-                            while sigs["footer"] not in file_data:
-                                if len(file_data) > sigs["max_size"]:
-                                    self.progress_update.emit(f"File {found_type.upper()} troppo grande o footer non trovato, scarto.")
-                                    file_data = None
-                                    break
-                                
-                                next_chunk = f.read(chunk_size)
-                                if not next_chunk:
-                                    file_data = None
-                                    break
-                                file_data.extend(next_chunk)
-                            
-                            if file_data:
-                                end_index = file_data.find(sigs["footer"]) + len(sigs["footer"])
-                                self.save_file(file_data[:end_index], found_type, file_count)
-                                file_count += 1
-                                # 3. Consuma il buffer fino alla fine del file recuperato
-                                buffer = buffer[found_pos + end_index:]
-                                continue # Riavvia il ciclo di ricerca dal buffer rimanente
-
-                        else: # 2. Logica migliorata per file senza footer
-                            end_pos = -1
-                            while len(file_data) < sigs["max_size"]:
-                                # Controlla se nel frattempo è iniziato un altro file
-                                for other_type, other_sigs in FILE_SIGNATURES.items():
-                                    # Cerca altri header, ma non all'inizio (che è il nostro file)
-                                    pos = file_data.find(other_sigs["header"], 1)
-                                    if pos != -1 and (end_pos == -1 or pos < end_pos):
-                                        end_pos = pos
-                                
-                                if end_pos != -1:
-                                    self.progress_update.emit(f"Trovato header di un altro file, termino recupero di {found_type.upper()}.")
-                                    break # Trovato un altro file, fermati
-
-                                next_chunk = f.read(chunk_size)
-                                if not next_chunk: break
-                                file_data.extend(next_chunk)
-                            
-                            # Determina la fine del file
-                            final_size = end_pos if end_pos != -1 else min(len(file_data), sigs["max_size"])
-                            self.save_file(file_data[:final_size], found_type, file_count)
-                            file_count += 1
-                            # 3. Consuma il buffer
-                            buffer = buffer[found_pos + final_size:]
-                            continue
-
-                    # Se non viene trovato nessun header, svuota il buffer tranne l'ultima parte
-                    # Mantieni solo l'ultima parte del buffer per cercare header a cavallo di due letture
-                    buffer = buffer[-MAX_HEADER_LEN:]
-            
-            if self.is_running:
-                self.scan_finished.emit(f"Scansione completata. Trovati {file_count} file.")
+            if self.profiler is not None:
+                self.profiler.start()
+            records = self.carver.carve()
+            if self.carver.is_running:
+                message = f"Scansione completata. Trovati {len(records)} file."
+                if self.carver.index_only:
+                    message += (" I file non sono stati salvati ma elencati nell'indice della cartella di output: "
+                                "salvali con 'python -m recoverflow SORGENTE CARTELLA --from-index INDICE'.")
+                if self.carver.stats.duplicates:
+                    message += f" Copie di file già recuperati: {format_counts(self.carver.stats.duplicates)}."
+                if self.carver.stats.reassembled:
+                    message += f" File frammentati ricomposti: {format_counts(self.carver.stats.reassembled)}."
+                if self.carver.stats.rejected:
+                    message += f" Scartati dai controlli strutturali: {format_counts(self.carver.stats.rejected)}."
+                if self.carver.stats.excluded:
+                    message += (f" Spazio escluso ({self.carver.scope.description}): "
+                                f"{self.carver.stats.excluded / 1024**2:.0f} MB.")
+                if self.carver.stats.skipped:
+                    message += f" Zone vuote saltate: {self.carver.stats.skipped / 1024**2:.0f} MB."
+                if self.carver.stats.bad_ranges:
+                    message += (f" Settori illeggibili sostituiti da zeri: {self.carver.stats.unreadable} byte "
+                                f"(più {self.carver.stats.unread} byte saltati nelle zone danneggiate), "
+                                f"elencati in {ERROR_MAP_NAME}.")
+                self.scan_finished.emit(message, True)
             else:
-                self.scan_finished.emit("Scansione interrotta dall'utente.")
+                self.scan_finished.emit("Scansione interrotta dall'utente. Avviala di nuovo con la stessa "
+                                        "cartella di output per riprenderla da dove si è fermata.", False)
+        except CarvingError as e:
+            self.scan_finished.emit(f"ERRORE: {e}", False)
         except PermissionError:
-            self.scan_finished.emit("ERRORE: Permesso negato. Esegui l'applicazione come amministratore/root.")
+            self.scan_finished.emit("ERRORE: Permesso negato. Esegui l'applicazione come amministratore/root.",
+                                    False)
         except FileNotFoundError:
-            self.scan_finished.emit(f"ERRORE: Disco '{self.disk_path}' non trovato.")
+            self.scan_finished.emit(f"ERRORE: Disco '{self.disk_path}' non trovato.", False)
         except Exception as e:
-            self.scan_finished.emit(f"Si è verificato un errore imprevisto: {e}")
-
-    def save_file(self, data, file_type, file_count):
-        """Salva i dati recuperati in un file."""
-        filename = os.path.join(self.output_dir, f"recuperato_{file_count + 1}.{file_type}")
-        try:
-            with open(filename, "wb") as out_file:
-                out_file.write(data)
-            self.progress_update.emit(f"SALVATO: {filename}")
-        except IOError as e:
-            self.progress_update.emit(f"ERRORE nel salvataggio di {filename}: {e}")
+            self.scan_finished.emit(f"Si è verificato un errore imprevisto: {e}", False)
+        finally:
+            try:
+                for path in write_diagnostics(self.output_dir, self.carver.stats, self.carver.instruments,
+                                              self.profiler):
+                    self.reporter.log(f"Diagnostica salvata in {path}")
+            except OSError as e:
+                self.reporter.log(f"Impossibile salvare la diagnostica: {e}")
+            self.reporter.flush()
+
+    def on_progress(self, done):
+        # Una copia: la scansione continua ad aggiornare le statistiche
+        self.stats_update.emit(self.carver.stats.snapshot())
 
     def stop(self):
-        self.progress_update.emit("Interruzione della scansione in corso...")
-        self.is_running = False
+        self.reporter.log("Interruzione della scansione in corso...")
+        self.carver.stop()
 
 # --- FINESTRA DI AVVIO (MAIN MENU) ---
 class MainMenu(QMainWindow):
@@ -366,6 +276,23 @@ class RecoveryWindow(QMainWindow):
         disk_layout.addWidget(refresh_btn)
         main_layout.addLayout(disk_layout)
 
+        # Numero di processi per la scansione parallela
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Processi:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(1) # Su un disco meccanico più processi rallentano la lettura
+        workers_layout.addWidget(self.workers_spin)
+        # Allineamento degli header: sui file system i file iniziano a inizio settore o cluster
+        workers_layout.addWidget(QLabel("Cerca header:"))
+        self.alignment_combo = QComboBox()
+        self.alignment_combo.addItem("A ogni byte", userData=0)
+        self.alignment_combo.addItem("A inizio settore (512 B)", userData=512)
+        self.alignment_combo.addItem("A inizio cluster (4 KB)", userData=4096)
+        workers_layout.addWidget(self.alignment_combo)
+        workers_layout.addStretch()
+        main_layout.addLayout(workers_layout)
+
 
         # Selezione output
         output_layout = QHBoxLayout()
@@ -381,9 +308,10 @@ class RecoveryWindow(QMainWindow):
 
         # Log dei risultati
         main_layout.addWidget(QLabel("Log di Scansione:"))
-        self.log_area = QTextEdit()
+        self.log_area = QPlainTextEdit()
         self.log_area.setObjectName("logArea") # Assegna un nome per lo stile
         self.log_area.setReadOnly(True)
+        self.log_area.setMaximumBlockCount(MAX_LOG_LINES)
         
         # **LA MODIFICA CHIAVE È QUI**
         # Rendiamo il viewport del log_area trasparente.
@@ -461,7 +389,7 @@ class RecoveryWindow(QMainWindow):
         try:
             drives = self.get_available_drives()
             if not drives:
-                self.log_area.setText("Nessun disco fisico trovato o permessi insufficienti.")
+                self.log_area.setPlainText("Nessun disco fisico trovato o permessi insufficienti.")
             for path, name in drives:
                 self.disk_combo.addItem(name, userData=path) # Salva il percorso in userData
             self.statusBar().showMessage("Pronto.")
@@ -485,12 +413,23 @@ class RecoveryWindow(QMainWindow):
             QMessageBox.warning(self, "Attenzione", "Seleziona una cartella di output.")
             return
 
+        signatures = None
+        if SIGNATURES_PATH:
+            try:
+                signatures = load_signatures(SIGNATURES_PATH)
+            except (OSError, ValueError) as e:
+                QMessageBox.critical(self, "Errore", f"Database delle firme non valido:\n{e}")
+                return
+
         self.log_area.clear()
         self.toggle_controls(is_scanning=True)
 
-        self.scan_thread = ScanWorker(disk_path, output_dir)
-        self.scan_thread.progress_update.connect(self.log_area.append)
-        self.scan_thread.progress_percentage.connect(self.progress_bar.setValue)
+        self.scan_thread = ScanWorker(disk_path, output_dir, workers=self.workers_spin.value(),
+                                      alignment=self.alignment_combo.currentData(),
+                                      instrument=INSTRUMENT, profile=PROFILE, signatures=signatures,
+                                      dedup=DEDUP, index_only=INDEX_ONLY)
+        self.scan_thread.log_batch.connect(self.on_log_batch)
+        self.scan_thread.stats_update.connect(self.on_stats)
         self.scan_thread.scan_finished.connect(self.on_scan_finished)
         self.scan_thread.start()
 
@@ -499,10 +438,20 @@ class RecoveryWindow(QMainWindow):
             self.scan_thread.stop()
             self.toggle_controls(is_scanning=False)
 
-    def on_scan_finished(self, message):
+    def on_log_batch(self, lines):
+        self.log_area.appendPlainText("\n".join(lines))
+
+    def on_stats(self, stats):
+        self.progress_bar.setValue(stats.percent)
+        message = f"{stats.rate / 1024**2:.0f} MB/s - tempo rimanente {format_duration(stats.eta)}"
+        if stats.recovered:
+            message += f" - file: {format_counts(stats.recovered)}"
+        self.statusBar().showMessage(message)
+
+    def on_scan_finished(self, message, completed):
         self.statusBar().showMessage(message)
         self.toggle_controls(is_scanning=False)
-        self.progress_bar.setValue(100 if "completata" in message else 0)
+        self.progress_bar.setValue(100 if completed else 0)
         QMessageBox.information(self, "Scansione Terminata", message)
 
     def toggle_controls(self, is_scanning):
@@ -510,12 +459,15 @@ class RecoveryWindow(QMainWindow):
         self.start_button.setEnabled(not is_scanning)
         self.stop_button.setEnabled(is_scanning)
         self.disk_combo.setEnabled(not is_scanning)
+        self.workers_spin.setEnabled(not is_scanning)
+        self.alignment_combo.setEnabled(not is_scanning)
         self.progress_bar.setValue(0)
         self.statusBar().showMessage("Scansione in corso..." if is_scanning else "Pronto.")
 
     def closeEvent(self, event):
         if self.scan_thread and self.scan_thread.isRunning():
             self.scan_thread.stop()
+            # wait() attende anche la scrittura dei file già trovati e ancora in coda
             self.scan_thread.wait()
         event.accept()
 
@@ -549,6 +501,9 @@ class RecoveryWindow(QMainWindow):
             print(f"Errore nell'impostare lo sfondo del log: {e}")
 
 if __name__ == "__main__":
+    # Nell'eseguibile PyInstaller i processi della scansione parallela ("spawn") rilanciano
+    # l'eseguibile: qui eseguono la loro regione ed escono invece di riaprire la GUI
+    multiprocessing.freeze_support()
     # Su Windows, controlla i privilegi e, se necessario, riavvia come amministratore.
     if platform.system() == "Windows":
         import ctypes